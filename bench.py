@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""
+bench.py
+
+Мікробенчмарки гарячих функцій bot.py та daily_report.build_daily.
+
+Запуск:
+  python bench.py run [--filter REGEX] [--save bench/baseline.json]
+  python bench.py run --compare bench/baseline.json [--threshold 15]
+  python bench.py compare bench/baseline.json bench/new.json [--threshold 15]
+  python bench.py startup [--runs 5] [--json]
+
+Кожен кейс калібрується так, щоб один раунд тривав >= --min-time секунд,
+далі виконується --rounds раундів; у JSON пишемо ns/op (min та median).
+compare повертає код 1, якщо median погіршився більше ніж на --threshold %.
+startup у чистих підпроцесах міряє час імпорту bot:app, RSS після імпорту та
+які важкі модулі (pandas/numpy) потрапили у воркер.
+"""
+
+import argparse
+import atexit
+import contextlib
+import json
+import os
+import platform
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+# bot.py читає ENV під час імпорту — ізолюємо логи та вимикаємо торгівлю
+_BENCH_DIR = tempfile.mkdtemp(prefix="bench_logs_")
+os.environ["LOG_DIR"] = _BENCH_DIR
+atexit.register(shutil.rmtree, _BENCH_DIR, True)
+os.environ["TRADING_ENABLED"] = "false"
+os.environ.setdefault("WEBHOOK_SECRET", "bench-secret")
+
+with open(os.devnull, "w") as _null, contextlib.redirect_stdout(_null):
+    import bot
+
+try:
+    import pandas as pd
+    import daily_report as DR
+except Exception:
+    pd = None
+    DR = None
+
+CASES = []
+
+def case(name):
+    def deco(fn):
+        CASES.append((name, fn))
+        return fn
+    return deco
+
+class _FakeReq:
+    """Мінімальний інтерфейс flask.Request, який потрібен valid_sig."""
+    def __init__(self, body: bytes, sig: str):
+        self._body = body
+        self.headers = {"X-Signature": sig}
+    def get_data(self, cache=True, as_text=False):
+        return self._body
+
+def _payload(i=0, pad=0):
+    d = {"signal":"entry","symbol":"BTCUSDT.P","time":str(1_700_000_000_000 + i),
+         "side":"long","pattern":bot.ALLOW_PATTERN,"entry":"42000.5","tp":"42500","sl":"41800"}
+    if pad:
+        d["note"] = "x" * pad
+    return d
+
+# ====== CASES ======
+for _size in (256, 4096, 65536):
+    @case(f"calc_sig[{_size}B]")
+    def _calc_sig(size=_size):
+        raw = json.dumps(_payload(pad=size)).encode()[:size]
+        return lambda: bot.calc_sig(raw)
+
+    @case(f"valid_sig[{_size}B]")
+    def _valid_sig(size=_size):
+        raw = json.dumps(_payload(pad=size)).encode()[:size]
+        req = _FakeReq(raw, bot.calc_sig(raw))
+        return lambda: bot.valid_sig(req)
+
+@case("validate_payload[ok]")
+def _validate_ok():
+    d = _payload()
+    return lambda: bot.validate_payload(d)
+
+@case("normalize_signal[ok]")
+def _normalize_ok():
+    d = _payload()
+    return lambda: bot.normalize_signal(d)
+
+@case("validate_payload[missing]")
+def _validate_missing():
+    d = {"signal":"entry","symbol":"BTCUSDT"}
+    return lambda: bot.validate_payload(d)
+
+for _label, _val in (("epoch_ms", "1700000000000"), ("epoch_s", "1700000000"),
+                     ("iso", "2024-05-01T12:00:00Z"), ("garbage", "not-a-time")):
+    @case(f"to_iso8601[{_label}]")
+    def _to_iso(val=_val):
+        return lambda: bot.to_iso8601(val)
+
+@case("build_id")
+def _build_id():
+    return lambda: bot.build_id("BTCUSDT", "inside", "long", "1700000000000", 42000.5, 42500.0, 41800.0)
+
+for _size in (100, 2000, 20000):
+    @case(f"dedup_seen[{_size}]")
+    def _dedup(size=_size):
+        bot.DEDUP.max_keys = size
+        bot.DEDUP.clear()
+        for i in range(size):
+            bot.dedup_seen(f"BTCUSDT|inside|long|pre{i}|e:1|tp:2|sl:3")
+        n = [0]
+        def run():
+            n[0] += 1
+            bot.dedup_seen(f"BTCUSDT|inside|long|k{n[0]}|e:1|tp:2|sl:3")
+        return run
+
+for _size in (100, 1000, 10000):
+    @case(f"rate_limit_check[{_size}keys]")
+    def _rl(size=_size):
+        # прийняті запити по size різних символах/IP: вартість не залежить від size
+        bot.MAX_WEBHOOKS_PER_MIN = 10**9
+        bot.MAX_WEBHOOKS_PER_MIN_PER_IP = 10**9
+        bot.MIN_SEC_BETWEEN_TRADES_PER_SYMBOL = 1e-9
+        syms = [f"SYM{i}USDT" for i in range(size)]
+        ips = [f"10.0.{i >> 8 & 255}.{i & 255}" for i in range(size)]
+        n = [0]
+        def run():
+            i = n[0] = (n[0] + 1) % size
+            bot._rate_limit_check(syms[i], ips[i])
+        return run
+
+    @case(f"rate_limit_flood[{_size}keys]")
+    def _rl_flood(size=_size):
+        # флуд понад глобальний ліміт: усі запити відхиляються, пам'ять обмежена RL_MAX_KEYS
+        bot.MAX_WEBHOOKS_PER_MIN = 120
+        bot.MAX_WEBHOOKS_PER_MIN_PER_IP = 10**9
+        bot.MIN_SEC_BETWEEN_TRADES_PER_SYMBOL = 1.5
+        syms = [f"SYM{i}USDT" for i in range(size)]
+        for i in range(200):
+            bot._rate_limit_check(syms[i % size], "10.0.0.1")
+        n = [0]
+        def run():
+            i = n[0] = (n[0] + 1) % size
+            bot._rate_limit_check(syms[i], "10.0.0.1")
+        return run
+
+@case("q_floor_to_step")
+def _q_floor():
+    return lambda: bot.q_floor_to_step(0.123456789, 0.001)
+
+@case("p_floor_to_tick")
+def _p_floor():
+    return lambda: bot.p_floor_to_tick(42000.123456, 0.1)
+
+@case("techlog")
+def _techlog():
+    return lambda: bot.techlog({"level":"info","msg":"bench","symbol":"BTCUSDT","id":"x"})
+
+@case("exec_log")
+def _exec_log():
+    return lambda: bot.exec_log("sig", "OPEN_MARKET", "2024-05-01T12:00:00Z", 42000.5, 0.01,
+                                0.02, "USDT", None, "BTCUSDT", "long", 123456)
+
+@case("metrics_counter_inc")
+def _mx_inc():
+    return lambda: bot.M_WEBHOOK.inc("ok")
+
+@case("metrics_render")
+def _mx_render():
+    for ep in ("new_order", "get_order", "position_risk", "mark_price"):
+        bot.M_REST.inc(ep); bot.M_REST_SEC.observe(0.05, ep)
+    return bot.METRICS.render
+
+def _daily_frames(n):
+    base = pd.Timestamp("2024-05-01 00:00", tz=DR.KYIV)
+    ids = [f"s{i}" for i in range(n)]
+    st = [base + pd.Timedelta(seconds=i * 80000 // max(n, 1)) for i in range(n)]
+    signals = pd.DataFrame({
+        "signal_id": ids, "signal_time": st, "symbol": "BTCUSDT", "side": "long",
+        "pattern": "inside", "indicator_entry": 42000.0, "indicator_sl": 41800.0,
+        "indicator_tp": 42500.0, "amount": pd.NA,
+    })
+    rows = []
+    for i, t in zip(ids, st):
+        rows.append((i, "OPEN", t + pd.Timedelta(milliseconds=350), 42001.0, 0.01, 0.02, "USDT", None))
+        rows.append((i, "CLOSE", t + pd.Timedelta(minutes=5), 42400.0, 0.01, 0.02, "USDT", 4.0))
+    execs = pd.DataFrame(rows, columns=["signal_id","event","time","price","qty",
+                                        "commission","commission_asset","realized_pnl"])
+    execs["symbol"] = "BTCUSDT"; execs["side"] = "long"; execs["order_id"] = 1
+    return signals, execs
+
+if DR is not None:
+    for _size in (100, 1000, 2500):
+        @case(f"build_daily[{_size}]")
+        def _build_daily(size=_size):
+            signals, execs = _daily_frames(size)
+            return lambda: DR.build_daily(signals, execs, "2024-05-01")
+
+# ====== RUNNER ======
+def _measure(fn, min_time, rounds):
+    number = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        dt = time.perf_counter() - t0
+        if dt >= min_time or number >= 1 << 24:
+            break
+        number *= 2 if dt <= 0 else max(2, min(10, int(min_time / dt) + 1))
+    per_op = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        per_op.append((time.perf_counter() - t0) / number * 1e9)
+    return {"ns_per_op_min": min(per_op), "ns_per_op_median": statistics.median(per_op),
+            "iterations": number, "rounds": rounds}
+
+def _snapshot_state():
+    return (bot.DEDUP.max_keys, bot.MAX_WEBHOOKS_PER_MIN, bot.MAX_WEBHOOKS_PER_MIN_PER_IP,
+            bot.MIN_SEC_BETWEEN_TRADES_PER_SYMBOL)
+
+def _restore_state(s):
+    (bot.DEDUP.max_keys, bot.MAX_WEBHOOKS_PER_MIN, bot.MAX_WEBHOOKS_PER_MIN_PER_IP,
+     bot.MIN_SEC_BETWEEN_TRADES_PER_SYMBOL) = s
+    bot.DEDUP.clear(); bot.RATE_LIMITER.clear()
+
+def run(args):
+    pat = re.compile(args.filter) if args.filter else None
+    results = {}
+    for name, setup in CASES:
+        if pat and not pat.search(name):
+            continue
+        saved = _snapshot_state()
+        try:
+            with open(os.devnull, "w") as null, contextlib.redirect_stdout(null):
+                fn = setup()
+                res = _measure(fn, args.min_time, args.rounds)
+        finally:
+            _restore_state(saved)
+        results[name] = res
+        print(f"{name:32s} {res['ns_per_op_median']:14.1f} ns/op  (min {res['ns_per_op_min']:.1f}, n={res['iterations']})")
+    doc = {
+        "meta": {
+            "time": datetime.now(timezone.utc).isoformat().replace("+00:00","Z"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "min_time": args.min_time, "rounds": args.rounds,
+        },
+        "results": results,
+    }
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(doc, f, indent=2, sort_keys=True)
+        print(f"Saved: {args.save}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            base = json.load(f)
+        return _compare(base, doc, args.threshold)
+    return 0
+
+def _compare(base, new, threshold):
+    b = base.get("results", {}); n = new.get("results", {})
+    regressions = 0
+    print(f"{'case':32s} {'base ns':>12s} {'new ns':>12s} {'delta':>9s}")
+    for name in sorted(set(b) | set(n)):
+        if name not in b or name not in n:
+            print(f"{name:32s} {'-' if name not in b else '':>12s} {'-' if name not in n else '':>12s}   (only in one side)")
+            continue
+        bv = b[name]["ns_per_op_median"]; nv = n[name]["ns_per_op_median"]
+        delta = (nv - bv) / bv * 100.0 if bv else 0.0
+        flag = ""
+        if delta > threshold:
+            flag = "  REGRESSION"; regressions += 1
+        elif delta < -threshold:
+            flag = "  faster"
+        print(f"{name:32s} {bv:12.1f} {nv:12.1f} {delta:+8.1f}%{flag}")
+    if regressions:
+        print(f"[FAIL] {regressions} regression(s) over {threshold:.1f}%")
+        return 1
+    print(f"[OK] no regressions over {threshold:.1f}%")
+    return 0
+
+def compare(args):
+    with open(args.base, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.new, "r", encoding="utf-8") as f:
+        new = json.load(f)
+    return _compare(base, new, args.threshold)
+
+_STARTUP_PROBE = r"""
+import contextlib, io, json, sys, time
+t0 = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    from bot import app
+dt = time.perf_counter() - t0
+rss_kb = None
+try:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                rss_kb = int(line.split()[1])
+except OSError:
+    import resource
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+heavy = sorted(m for m in ("pandas", "numpy", "daily_report", "binance") if m in sys.modules)
+print(json.dumps({"import_sec": dt, "rss_mb": (rss_kb or 0) / 1024.0, "modules": len(sys.modules), "heavy": heavy}))
+"""
+
+def startup(args):
+    env = dict(os.environ)
+    env.pop("LOG_DIR", None)
+    runs = []
+    for _ in range(max(1, args.runs)):
+        d = tempfile.mkdtemp(prefix="bench_startup_")
+        try:
+            env["LOG_DIR"] = d
+            cp = subprocess.run([sys.executable, "-c", _STARTUP_PROBE], env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+                                capture_output=True, text=True, timeout=120)
+        finally:
+            shutil.rmtree(d, True)
+        if cp.returncode != 0:
+            print(cp.stderr.strip(), file=sys.stderr)
+            return 1
+        runs.append(json.loads(cp.stdout.strip().splitlines()[-1]))
+    res = {
+        "import_sec_median": statistics.median(r["import_sec"] for r in runs),
+        "import_sec_min": min(r["import_sec"] for r in runs),
+        "rss_mb_median": statistics.median(r["rss_mb"] for r in runs),
+        "modules": runs[-1]["modules"],
+        "heavy_modules": runs[-1]["heavy"],
+        "runs": len(runs),
+    }
+    if args.json:
+        print(json.dumps(res, indent=2, sort_keys=True))
+    else:
+        print(f"import bot:app  {res['import_sec_median']*1000:8.1f} ms median (min {res['import_sec_min']*1000:.1f} ms, n={res['runs']})")
+        print(f"RSS after import {res['rss_mb_median']:7.1f} MB   modules={res['modules']}   heavy={','.join(res['heavy_modules']) or '-'}")
+    return 0
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    r = sub.add_parser("run", help="Запустити бенчмарки")
+    r.add_argument("--filter", default=None, help="Regex по назві кейсу")
+    r.add_argument("--min-time", type=float, default=0.2, help="Мінімальна тривалість одного раунду, с")
+    r.add_argument("--rounds", type=int, default=5)
+    r.add_argument("--save", default=None, help="Куди зберегти JSON з результатами")
+    r.add_argument("--compare", default=None, help="Baseline JSON для порівняння після запуску")
+    r.add_argument("--threshold", type=float, default=15.0, help="Допустиме погіршення, %%")
+    r.set_defaults(func=run)
+    c = sub.add_parser("compare", help="Порівняти два JSON-результати")
+    c.add_argument("base"); c.add_argument("new")
+    c.add_argument("--threshold", type=float, default=15.0, help="Допустиме погіршення, %%")
+    c.set_defaults(func=compare)
+    st = sub.add_parser("startup", help="Час імпорту та RSS bot:app у чистому процесі")
+    st.add_argument("--runs", type=int, default=5)
+    st.add_argument("--json", action="store_true")
+    st.set_defaults(func=startup)
+    args = ap.parse_args()
+    sys.exit(args.func(args))
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,18 @@
 # -*- coding: utf-8 -*-
-import os, json, csv, hmac, hashlib, threading, time, re
-from datetime import datetime, timezone
+import os, sys, math, random, json, csv, hmac, hashlib, base64, threading, time, re, atexit, struct, glob, gzip, shutil, fnmatch, signal
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
 from decimal import Decimal, ROUND_DOWN
 from collections import OrderedDict, deque
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
+try:
+    import fcntl
+except ImportError:          # не-POSIX: без блокування журналу між процесами
+    fcntl = None
+import metrics as MX
+import profiler as PROF
+import logindex as LI
 
 # ====== CONFIG FROM ENV ======
 BINANCE_ENABLED = os.environ.get("TRADING_ENABLED", "false").lower() == "true"
@@ -11,6 +20,11 @@ BINANCE_ENABLED = os.environ.get("TRADING_ENABLED", "false").lower() == "true"
 API_KEY_MAIN    = os.environ.get("BINANCE_API_KEY", "")
 API_SECRET_MAIN = os.environ.get("BINANCE_API_SECRET", "")
 
+# Додаткові акаунти: JSON-список у ACCOUNTS або файл ACCOUNTS_FILE, напр.
+# [{"name":"sub1","key_env":"SUB1_KEY","secret_env":"SUB1_SECRET","risk_pct":0.5,"leverage":5}]
+ACCOUNTS_JSON = os.environ.get("ACCOUNTS", "")
+ACCOUNTS_FILE = os.environ.get("ACCOUNTS_FILE", "")
+
 LEVERAGE   = int(os.environ.get("LEVERAGE", "10"))
 RISK_MODE  = os.environ.get("RISK_MODE", "margin").lower()     # margin | notional
 RISK_PCT   = float(os.environ.get("RISK_PCT", "1.0"))
@@ -18,6 +32,8 @@ RISK_PCT   = float(os.environ.get("RISK_PCT", "1.0"))
 # дефолт патерну = inside
 ALLOW_PATTERN = os.environ.get("ALLOW_PATTERN", "inside").lower()
 REPRICE_ATOMIC = os.environ.get("REPLACE_ON_NEW", "false").lower() == "true"
+# префікс newClientOrderId: <prefix>-<tag сигналу>-<роль><спроба>; ордери без нього — не наші
+CID_PREFIX = re.sub(r"[^A-Za-z0-9]", "", os.environ.get("CID_PREFIX", "tb"))[:6] or "tb"
 
 IN_POSITION_POLICY = os.environ.get("IN_POSITION_POLICY", "ignore").lower()
 PRESET_SYMBOLS = [x.strip().upper() for x in os.environ.get("PRESET_SYMBOLS","").split(",") if x.strip()]
@@ -35,20 +51,61 @@ ALLOW_FUTURE_SKEW_SEC  = int(os.environ.get("ALLOW_FUTURE_SKEW_SEC", "10"))
 # Анти-флуд
 MAX_WEBHOOKS_PER_MIN = int(os.environ.get("MAX_WEBHOOKS_PER_MIN", "120"))
 MIN_SEC_BETWEEN_TRADES_PER_SYMBOL = float(os.environ.get("MIN_SEC_BETWEEN_TRADES_PER_SYMBOL", "1.5"))
+MAX_WEBHOOKS_PER_MIN_PER_IP = int(os.environ.get("MAX_WEBHOOKS_PER_MIN_PER_IP", "0"))   # 0 = вимкнено
+RL_MAX_KEYS = int(os.environ.get("RL_MAX_KEYS", "4096"))   # LRU-ліміт станів per-symbol / per-IP
+PROXY_HOPS  = int(os.environ.get("PROXY_HOPS", "1"))        # довірених проксі перед app (Heroku router = 1); 0 — без X-Forwarded-For
+MAX_BATCH     = int(os.environ.get("MAX_BATCH", "50"))       # макс. сигналів у /webhook/batch
+BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", "8"))
+COALESCE_MS   = float(os.environ.get("COALESCE_MS", "0"))    # вікно злиття сигналів символу; 0 = вимкнено
 
 LOG_DIR   = os.environ.get("LOG_DIR", "logs")
 LOG_FILE  = os.environ.get("LOG_FILE", "inside.csv")
 TECH_LOG  = os.environ.get("TECH_LOG", "tech.jsonl")
 EXEC_LOG  = os.environ.get("EXEC_LOG", "executions.csv")
-ROTATE_BYTES = int(os.environ.get("ROTATE_BYTES", str(5*1024*1024)))
-KEEP_FILES   = int(os.environ.get("KEEP_FILES", "3"))
+ROTATE_BYTES = int(os.environ.get("ROTATE_BYTES", str(5*1024*1024)))    # 0 = без ротації за розміром
+ROTATE_DAILY = os.environ.get("ROTATE_DAILY", "true").lower() == "true"  # ротація при зміні доби (UTC)
+ROTATE_CHECK_SEC   = float(os.environ.get("ROTATE_CHECK_SEC", "30"))
+ROTATE_COMPRESS    = os.environ.get("ROTATE_COMPRESS", "gzip").lower()   # gzip | none
+LOG_RETENTION_DAYS = float(os.environ.get("LOG_RETENTION_DAYS", "30"))  # 0 = зберігати все
+LOG_INDEX     = os.environ.get("LOG_INDEX", "logindex.sqlite")   # індекс подій за signal id/символом; "" = вимкнено
+LOG_INDEX_SEC = float(os.environ.get("LOG_INDEX_SEC", "2"))
 MAX_KEYS     = int(os.environ.get("DEDUP_CACHE", "2000"))
+DEDUP_STATE        = os.environ.get("DEDUP_STATE", "dedup.bin")
+DEDUP_SNAPSHOT_SEC = float(os.environ.get("DEDUP_SNAPSHOT_SEC", "2"))
+JOURNAL_FILE  = os.environ.get("JOURNAL_FILE", "journal.jsonl")     # write-ahead журнал ордерів; "" = вимкнено
+JOURNAL_FSYNC = os.environ.get("JOURNAL_FSYNC", "true").lower() == "true"
+JOURNAL_COMPACT_BYTES = int(os.environ.get("JOURNAL_COMPACT_BYTES", str(1024*1024)))
+DRAIN_TIMEOUT_SEC = float(os.environ.get("DRAIN_TIMEOUT_SEC", "10"))   # SIGTERM: скільки чекати передачі in-flight входів
+HANDOFF_WAIT_SEC  = float(os.environ.get("HANDOFF_WAIT_SEC", "20"))    # наступник: скільки чекати, доки попередник віддасть журнал
 
 # Моніторинг/прибирання
-BRACKET_POLL_SEC = float(os.environ.get("BRACKET_POLL_SEC", "2"))
+BRACKET_POLL_SEC = float(os.environ.get("BRACKET_POLL_SEC", "2"))          # інтервал, поки волатильність невідома
+BRACKET_POLL_MIN_SEC = float(os.environ.get("BRACKET_POLL_MIN_SEC", "0.5"))  # біля TP/SL
+BRACKET_POLL_MAX_SEC = float(os.environ.get("BRACKET_POLL_MAX_SEC", "15"))   # далеко від TP/SL
+BRACKET_POLL_SAFETY  = float(os.environ.get("BRACKET_POLL_SAFETY", "0.1"))   # частка очікуваного часу до тригера
+MONITOR_WORKERS  = int(os.environ.get("MONITOR_WORKERS", "4"))
+MARK_REFRESH_SEC = float(os.environ.get("MARK_REFRESH_SEC", "1"))
 CANCEL_ORPHANS   = os.environ.get("CANCEL_ORPHANS", "true").lower() == "true"
 ORPHAN_SWEEP_SEC = float(os.environ.get("ORPHAN_SWEEP_SEC", "10"))
 CANCEL_RETRIES   = int(os.environ.get("CANCEL_RETRIES", "3"))
+CANCEL_WORKERS   = int(os.environ.get("CANCEL_WORKERS", "4"))
+CANCEL_BACKOFF_MS     = float(os.environ.get("CANCEL_BACKOFF_MS", "100"))    # база експоненційного backoff
+CANCEL_BACKOFF_MAX_MS = float(os.environ.get("CANCEL_BACKOFF_MAX_MS", "2000"))
+CANCEL_WAIT_SEC  = float(os.environ.get("CANCEL_WAIT_SEC", "10"))            # скільки чекати підтвердження
+
+# Годинник біржі: зсув локального часу для підписаних запитів і перевірки свіжості
+CLOCK_SYNC_SEC       = float(os.environ.get("CLOCK_SYNC_SEC", "60"))      # фонова синхронізація; 0 — лише на старті/по -1021
+CLOCK_SAMPLES        = int(os.environ.get("CLOCK_SAMPLES", "3"))          # замірів за синхронізацію, береться найкоротший RTT
+CLOCK_RESYNC_MIN_SEC = float(os.environ.get("CLOCK_RESYNC_MIN_SEC", "2")) # -1021 частіше не пересинхронізує
+CLOCK_LOG_DRIFT_MS   = float(os.environ.get("CLOCK_LOG_DRIFT_MS", "50"))  # periodic-синхронізація логується від такої зміни
+
+# Watchdog фонових циклів
+WATCHDOG_SEC     = float(os.environ.get("WATCHDOG_SEC", "5"))
+WORKER_STALL_SEC = float(os.environ.get("WORKER_STALL_SEC", "60"))    # ітерація/простій довше -> stalled
+HEALTHZ_FAIL_ON_STALL = os.environ.get("HEALTHZ_FAIL_ON_STALL", "true").lower() == "true"
+
+# Метрики: /metrics закритий ADMIN_TOKEN, якщо не METRICS_PUBLIC=true
+METRICS_PUBLIC = os.environ.get("METRICS_PUBLIC", "false").lower() == "true"
 
 # ====== РЕЖИМ ВХОДУ ======
 ENTRY_MODE = os.environ.get("ENTRY_MODE", "market").lower()          # market | limit | maker_chase
@@ -64,6 +121,11 @@ MAX_WAIT_SEC       = float(os.environ.get("MAX_WAIT_SEC", "3"))
 MAX_DEVIATION_BPS  = float(os.environ.get("MAX_DEVIATION_BPS", "10"))
 FALLBACK = os.environ.get("FALLBACK", "market").lower()               # none | market | limit_ioc
 
+# Профілі виконання по символах/glob поверх глобальних значень вище, перший збіг виграє:
+# [{"match":"BTCUSDT,ETHUSDT","entry_mode":"market"},{"match":"1000*","chase_ms":900,"chase_steps":4}]
+EXEC_PROFILES_JSON = os.environ.get("EXEC_PROFILES", "")
+EXEC_PROFILES_FILE = os.environ.get("EXEC_PROFILES_FILE", "")
+
 # ====== Звіти ======
 REPORT_DIR = os.path.join(LOG_DIR, "reports")
 os.makedirs(LOG_DIR, exist_ok=True)
@@ -72,6 +134,8 @@ os.makedirs(REPORT_DIR, exist_ok=True)
 CSV_PATH  = os.path.join(LOG_DIR, LOG_FILE)
 TECH_PATH = os.path.join(LOG_DIR, TECH_LOG)
 EXEC_PATH = os.path.join(LOG_DIR, EXEC_LOG)
+DEDUP_PATH = os.path.join(LOG_DIR, DEDUP_STATE)
+JOURNAL_PATH = os.path.join(LOG_DIR, JOURNAL_FILE) if JOURNAL_FILE else ""
 
 # SMTP із ENV
 SMTP_HOST  = os.environ.get("SMTP_HOST", "")
@@ -99,82 +163,427 @@ if BINANCE_ENABLED:
             BINANCE_ENABLED = False
 
 BINANCE = None
-ONEWAY_SET = False
 LEVERAGE_SET = set()
 SYMBOL_CACHE = {}
 
 # ====== APP ======
 app = Flask(__name__)
+if PROXY_HOPS > 0:
+    # remote_addr — адреса, яку дописав найближчий довірений проксі, а не клієнтський лівий край X-Forwarded-For
+    from werkzeug.middleware.proxy_fix import ProxyFix
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_HOPS, x_proto=0, x_host=0, x_port=0, x_prefix=0)
 
 # ====== STATE ======
-DEDUP = OrderedDict()
-BRACKETS = {}
+# Життєвий цикл bracket: entered (вхід виконано) -> protected (TP/SL виставлені)
+# -> closing (спрацював вихід / примусове закриття) -> closed (прибрано з книги)
+BR_ENTERED, BR_PROTECTED, BR_CLOSING, BR_CLOSED = "entered", "protected", "closing", "closed"
+
+class Bracket:
+    """
+    Запис bracket одного символу. Час — monotonic (t_open/t_state), стіна рахується лише
+    для відображення; символи інтерновані, тож ключі книги й поля ділять один об'єкт.
+    """
+    __slots__ = ("symbol", "id", "side", "state", "tp_id", "sl_id", "open_order_id", "t_open", "t_state",
+                 "tp", "sl", "next_poll", "inflight", "mark", "mark_t", "var")
+
+    def __init__(self, symbol, signal_id, side, state=BR_ENTERED, tp_id=None, sl_id=None,
+                 open_order_id=0, t_open=None, tp=None, sl=None):
+        self.symbol = sys.intern(symbol)
+        self.id = signal_id
+        self.side = side
+        self.state = state
+        self.tp_id = tp_id; self.sl_id = sl_id
+        self.open_order_id = open_order_id or 0
+        self.t_open = self.t_state = time.monotonic() if t_open is None else t_open
+        # планувальник монітора: тригерні ціни, наступне опитування, EWMA дисперсії log-доходності/сек
+        self.tp = tp; self.sl = sl
+        self.next_poll = 0.0
+        self.inflight = False
+        self.mark = None; self.mark_t = 0.0; self.var = None
+
+    def set_state(self, state):
+        self.state = state; self.t_state = time.monotonic()
+
+    def age(self) -> float:
+        return time.monotonic() - self.t_open
+
+    def public(self) -> dict:
+        wall = time.time() - self.age()
+        return {"symbol":self.symbol,"id":self.id,"side":self.side,"state":self.state,
+                "tp_id":self.tp_id,"sl_id":self.sl_id,"open_order_id":self.open_order_id,
+                "ts":datetime.fromtimestamp(wall, timezone.utc).isoformat().replace("+00:00","Z"),
+                "age_sec":round(self.age(), 1),"tp":self.tp,"sl":self.sl,
+                "next_poll_in":round(max(0.0, self.next_poll - time.monotonic()), 2)}
+
+class BracketBook:
+    """
+    symbol -> Bracket, copy-on-write: запис (рідко, раз на угоду) під BR_LOCK підміняє мапу цілком,
+    а читачі (монітор, /healthz) беруть поточну мапу без локу й без копіювання.
+    """
+    __slots__ = ("_map",)
+
+    def __init__(self):
+        self._map = {}
+
+    def snapshot(self) -> dict:
+        """Незмінна (за домовленістю) мапа на цей момент."""
+        return self._map
+
+    def items(self):
+        return self._map.items()
+
+    def get(self, symbol):
+        return self._map.get(symbol)
+
+    def __contains__(self, symbol):
+        return symbol in self._map
+
+    def __len__(self):
+        return len(self._map)
+
+    def put(self, b: "Bracket"):
+        with BR_LOCK:
+            m = dict(self._map); m[b.symbol] = b; self._map = m
+
+    def pop(self, symbol):
+        with BR_LOCK:
+            if symbol not in self._map:
+                return None
+            m = dict(self._map); b = m.pop(symbol); self._map = m
+        b.set_state(BR_CLOSED)
+        return b
+
+    def clear(self):
+        with BR_LOCK:
+            self._map = {}
+
+BRACKETS = BracketBook()
 BR_LOCK = threading.RLock()
 
 # Anti-flood state
-WEBHOOK_TIMESTAMPS = deque(maxlen=10000)
-LAST_SYMBOL_ACCEPT = {}
 RL_LOCK = threading.RLock()
 
-# ====== ROTATION (safe) ======
-def rotate_if_needed(path: str):
+# ====== ACCOUNTS ======
+class Account:
+    """
+    Торговий акаунт: власний клієнт, ризик-параметри (None -> глобальні з ENV/config),
+    власні BRACKETS, кеш плечей та exec-лог. Поточний акаунт потоку — _acct().
+    """
+    __slots__ = ("name", "key", "secret", "client", "risk_mode", "risk_pct", "leverage",
+                 "brackets", "leverage_set", "oneway_set", "exec_path", "handoffs")
+
+    def __init__(self, name, key="", secret="", risk_mode=None, risk_pct=None, leverage=None,
+                 brackets=None, leverage_set=None, exec_path=None):
+        self.name = name
+        self.key = key; self.secret = secret
+        self.client = None
+        self.risk_mode = risk_mode; self.risk_pct = risk_pct; self.leverage = leverage
+        self.brackets = brackets if brackets is not None else BracketBook()
+        self.leverage_set = leverage_set if leverage_set is not None else set()
+        self.oneway_set = False
+        self.handoffs = {}         # symbol -> запис handoff із журналу (chase попереднього процесу)
+        self.exec_path = exec_path or os.path.join(LOG_DIR, "accounts", name, EXEC_LOG)
+        os.makedirs(os.path.dirname(self.exec_path) or ".", exist_ok=True)
+
+    def eff_risk_mode(self): return self.risk_mode or RISK_MODE
+    def eff_risk_pct(self):  return self.risk_pct if self.risk_pct is not None else RISK_PCT
+    def eff_leverage(self):  return self.leverage if self.leverage is not None else LEVERAGE
+
+    def public(self) -> dict:
+        return {"name":self.name,"risk_mode":self.eff_risk_mode(),"risk_pct":self.eff_risk_pct(),
+                "leverage":self.eff_leverage(),"brackets":len(self.brackets),"client":self.client is not None}
+
+def _load_account_specs() -> list:
+    raw = ACCOUNTS_JSON
+    if ACCOUNTS_FILE:
+        try:
+            with open(ACCOUNTS_FILE, "r", encoding="utf-8") as f:
+                raw = f.read()
+        except Exception as e:
+            print("[WARN] Cannot read ACCOUNTS_FILE:", repr(e), flush=True)
+    if not raw.strip():
+        return []
     try:
-        if not os.path.exists(path) or os.path.getsize(path) < ROTATE_BYTES:
-            return
-        for i in range(KEEP_FILES, 0, -1):
-            src = f"{path}.{i}"
-            dst = f"{path}.{i+1}"
-            if os.path.exists(src):
-                if i == KEEP_FILES:
-                    os.remove(src)
-                else:
-                    os.rename(src, dst)
-        os.rename(path, f"{path}.1")
+        specs = json.loads(raw)
     except Exception as e:
-        try:
-            print("[TECH] " + json.dumps(
-                {"level":"warn","msg":"rotate_failed","err":str(e),"path":path},
-                ensure_ascii=False
-            ), flush=True)
-        except Exception:
-            pass
+        print("[WARN] Bad ACCOUNTS json:", repr(e), flush=True)
+        return []
+    return [x for x in specs if isinstance(x, dict) and x.get("name") and x.get("enabled", True)]
+
+MAIN_ACCOUNT = Account("main", API_KEY_MAIN, API_SECRET_MAIN,
+                       brackets=BRACKETS, leverage_set=LEVERAGE_SET, exec_path=EXEC_PATH)
+ACCOUNTS = OrderedDict([("main", MAIN_ACCOUNT)])
+for _spec in _load_account_specs():
+    _name = str(_spec["name"]).strip()
+    if _name in ACCOUNTS:
+        continue
+    _rm = str(_spec["risk_mode"]).lower() if _spec.get("risk_mode") else None
+    ACCOUNTS[_name] = Account(
+        _name,
+        key=_spec.get("key") or os.environ.get(_spec.get("key_env",""), ""),
+        secret=_spec.get("secret") or os.environ.get(_spec.get("secret_env",""), ""),
+        risk_mode=_rm if _rm in ("margin","notional") else None,
+        risk_pct=float(_spec["risk_pct"]) if _spec.get("risk_pct") is not None else None,
+        leverage=int(_spec["leverage"]) if _spec.get("leverage") is not None else None,
+    )
+
+_CTX = threading.local()
+
+def _acct() -> Account:
+    return getattr(_CTX, "acct", None) or MAIN_ACCOUNT
+
+@contextmanager
+def _use_account(acct: Account):
+    prev = getattr(_CTX, "acct", None)
+    _CTX.acct = acct
+    try:
+        yield acct
+    finally:
+        _CTX.acct = prev
+
+@contextmanager
+def _use_signal(signal_id):
+    """Прив'язує техлоги потоку до сигналу (для /lifecycle: виходи, chase, cancel, close)."""
+    prev = getattr(_CTX, "sig", None)
+    _CTX.sig = signal_id or prev
+    try:
+        yield
+    finally:
+        _CTX.sig = prev
+
+class _AccountClient:
+    """BINANCE: делегує виклики клієнту поточного акаунта потоку."""
+    def __getattr__(self, name):
+        c = _acct().client
+        if c is None:
+            raise AttributeError(name)
+        return getattr(c, name)
+
+    def __bool__(self):
+        return _acct().client is not None
+
+# фонові дрібниці (дочитування трейдів для exec-логу тощо), щоб не тримати гарячий шлях
+BG_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="bg")
+
+def _submit_bg(fn, *args):
+    acct = _acct(); sig = getattr(_CTX, "sig", None)
+    def run():
+        with _use_account(acct), _use_signal(sig):
+            try:
+                fn(*args)
+            except Exception as e:
+                techlog({"level":"warn","msg":"bg_task_failed","fn":fn.__name__,"err":str(e)})
+    return BG_POOL.submit(run)
+
+# fan-out по акаунтах іде з потоку запиту і з кожного batch-воркера одночасно: потік на акаунт
+# для кожного з них, інакше batch по N символах виконується майже послідовно.
+# HTTP-сесія (keep-alive пул) — всередині клієнта акаунта
+BATCH_POOL = ThreadPoolExecutor(max_workers=max(1, BATCH_WORKERS), thread_name_prefix="batch")
+ACCOUNT_POOL = ThreadPoolExecutor(max_workers=(max(1, BATCH_WORKERS) + 1) * len(ACCOUNTS),
+                                  thread_name_prefix="acct") if len(ACCOUNTS) > 1 else None
+
+# ====== METRICS ======
+METRICS = MX.Registry()
+M_WEBHOOK       = METRICS.counter("bot_webhook_requests_total", "Webhook requests by outcome", ("outcome",))
+M_WEBHOOK_SEC   = METRICS.histogram("bot_webhook_duration_seconds", "Webhook handling time")
+M_REST          = METRICS.counter("bot_rest_calls_total", "Binance REST calls by endpoint", ("endpoint",))
+M_REST_ERR      = METRICS.counter("bot_rest_errors_total", "Binance REST calls that raised", ("endpoint",))
+M_REST_SEC      = METRICS.histogram("bot_rest_duration_seconds", "Binance REST call latency", ("endpoint",))
+M_CHASE_STEPS   = METRICS.histogram("bot_chase_steps", "Reprice steps per maker-chase entry",
+                                    buckets=(1, 2, 3, 5, 8, 13, 21, 34))
+M_CHASE_FILL    = METRICS.histogram("bot_chase_fill_ratio", "Maker-filled share of qty before fallback",
+                                    buckets=(0.0, 0.25, 0.5, 0.75, 0.99, 1.0))
+M_MONITOR_SEC   = METRICS.histogram("bot_bracket_monitor_loop_seconds", "Bracket monitor poll duration (one symbol)")
+M_POLL_DELAY    = METRICS.histogram("bot_bracket_poll_interval_seconds", "Scheduled delay until the next bracket poll",
+                                    buckets=(0.5, 1.0, 2.0, 3.0, 5.0, 8.0, 12.0, 15.0, 30.0))
+M_CANCEL        = METRICS.counter("bot_cancels_total", "Cancel requests by result", ("result",))
+M_CANCEL_SEC    = METRICS.histogram("bot_cancel_duration_seconds", "Cancel submit-to-done time incl. retries")
+M_CLOCK_SYNC    = METRICS.counter("bot_clock_syncs_total", "Exchange clock syncs by reason", ("reason",))
+M_SUPERSEDED    = METRICS.counter("bot_signals_superseded_total", "Accepted signals replaced by a newer one in the coalescing window")
+M_SWEEPER_SEC   = METRICS.histogram("bot_orphan_sweeper_loop_seconds", "Orphan sweeper pass duration")
+M_LOG_SEC       = METRICS.histogram("bot_log_write_seconds", "Log write latency", ("log",),
+                                    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05, 0.25))
+M_JOURNAL_SEC   = METRICS.histogram("bot_journal_commit_seconds", "Journal group commit (write+fsync) latency",
+                                    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05, 0.25))
+METRICS.gauge_fn("bot_brackets", "Tracked brackets", lambda: {n: len(a.brackets) for n, a in ACCOUNTS.items()}, label="account")
+METRICS.gauge_fn("bot_dedup_keys", "Keys in dedup cache", lambda: len(DEDUP))
+METRICS.gauge_fn("bot_rate_limit_keys", "Rate limiter per-key states", lambda: RATE_LIMITER.key_counts(), label="tier")
+METRICS.gauge_fn("bot_cancels_pending", "Cancels queued or in retry", lambda: CANCELS.pending())
+METRICS.gauge_fn("bot_clock_offset_ms", "Exchange server time minus local time", lambda: round(CLOCK.offset_ms, 1))
+METRICS.gauge_fn("bot_clock_rtt_ms", "RTT of the sample used for the clock offset", lambda: CLOCK.rtt_ms or 0.0)
+METRICS.gauge_fn("bot_threads", "Live Python threads", threading.active_count)
+METRICS.gauge_fn("bot_worker_lag_seconds", "Seconds a worker loop is stuck in or overdue for an iteration",
+                 lambda: {n: round(w.lag(time.monotonic()), 3) for n, w in WORKERS.items()}, label="worker")
+METRICS.gauge_fn("bot_worker_last_iteration_seconds", "Duration of the last worker loop iteration",
+                 lambda: {n: w.last_dur for n, w in WORKERS.items()}, label="worker")
+METRICS.gauge_fn("bot_worker_restarts", "Worker restarts by the watchdog",
+                 lambda: {n: w.restarts for n, w in WORKERS.items()}, label="worker")
+
+class _MeteredClient:
+    """Проксі над UMFutures: рахує виклики/помилки/латентність по назві методу."""
+    def __init__(self, client):
+        self._client = client
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+        def once(*a, **kw):
+            t0 = time.perf_counter()
+            try:
+                return attr(*a, **kw)
+            except Exception:
+                M_REST_ERR.inc(name)
+                raise
+            finally:
+                M_REST.inc(name)
+                M_REST_SEC.observe(time.perf_counter() - t0, name)
+        def call(*a, **kw):
+            try:
+                return once(*a, **kw)
+            except Exception as e:
+                # -1021: запит відкинуто до обробки — пересинхронізуємо годинник і повторюємо один раз
+                if name == "time" or not _is_clock_error(e) or not CLOCK.sync(self, "recv_window", CLOCK_RESYNC_MIN_SEC):
+                    raise
+            return once(*a, **kw)
+        self.__dict__[name] = call
+        return call
+
+# ====== EXCHANGE CLOCK ======
+def _is_clock_error(e) -> bool:
+    """-1021: timestamp поза recvWindow / попереду серверного часу."""
+    if getattr(e, "error_code", None) == -1021:
+        return True
+    msg = str(e)
+    return "-1021" in msg or "recvWindow" in msg
+
+class ExchangeClock:
+    """
+    Зсув серверного часу біржі відносно локального: serverTime - (відправка + RTT/2) за
+    замір із найкоротшим RTT. Підписані запити (timestamp конектора) і свіжість сигналів
+    рахуються від цього годинника, тож дрейф годинника дино не дає -1021.
+    """
+    def __init__(self):
+        self.offset_ms = 0.0
+        self.rtt_ms = None
+        self.synced_at = None         # monotonic
+        self.syncs = 0
+        self.fails = 0
+        self._lock = threading.Lock()
+        self._last_try = 0.0
+
+    def now_ms(self) -> int:
+        return int(time.time() * 1000.0 + self.offset_ms)
+
+    def now(self) -> float:
+        return time.time() + self.offset_ms / 1000.0
+
+    def sync(self, client, reason="periodic", min_gap=0.0) -> bool:
+        """Кілька замірів client.time(). Одночасні -1021 зливаються в одну синхронізацію (min_gap)."""
+        with self._lock:
+            mono = time.monotonic()
+            if min_gap and mono - self._last_try < min_gap:
+                return self.synced_at is not None
+            self._last_try = mono
+            best, err = None, None
+            for _ in range(max(1, CLOCK_SAMPLES)):
+                t0 = time.time(); p0 = time.perf_counter()
+                try:
+                    server_ms = float(client.time()["serverTime"])
+                except Exception as e:
+                    err = e
+                    continue
+                rtt = (time.perf_counter() - p0) * 1000.0
+                if best is None or rtt < best[1]:
+                    best = (server_ms - (t0 * 1000.0 + rtt / 2.0), rtt)
+            if best is None:
+                self.fails += 1
+                techlog({"level":"warn","msg":"clock_sync_failed","reason":reason,"err":str(err)})
+                return False
+            prev = self.offset_ms
+            self.offset_ms, self.rtt_ms = best[0], round(best[1], 1)
+            self.synced_at = time.monotonic(); self.syncs += 1
+        M_CLOCK_SYNC.inc(reason)
+        if reason != "periodic" or abs(self.offset_ms - prev) >= CLOCK_LOG_DRIFT_MS:
+            techlog({"level":"info" if reason != "recv_window" else "warn","msg":"clock_synced","reason":reason,
+                     "offset_ms":round(self.offset_ms, 1),"prev_offset_ms":round(prev, 1),"rtt_ms":self.rtt_ms})
+        return True
+
+    def status(self) -> dict:
+        return {"offset_ms": round(self.offset_ms, 1), "rtt_ms": self.rtt_ms, "syncs": self.syncs, "fails": self.fails,
+                "age_sec": round(time.monotonic() - self.synced_at, 1) if self.synced_at is not None else None}
+
+CLOCK = ExchangeClock()
+
+def _install_exchange_clock():
+    """timestamp підписаних запитів конектора -> CLOCK (спільно для всіх акаунтів)."""
+    try:
+        import binance.api as _BA
+        _BA.get_timestamp = CLOCK.now_ms
+        return True
+    except Exception as e:
+        print("[WARN] exchange clock not installed:", repr(e), flush=True)
+        return False
+
+def _clock_syncer():
+    w = WORKERS["clock_sync"]
+    while w.current():
+        with w.iteration():
+            accts = _live_accounts()
+            if accts:
+                CLOCK.sync(accts[0].client, "periodic")
+        time.sleep(max(5.0, CLOCK_SYNC_SEC))
 
 # ====== UTIL ======
 def techlog(entry: dict):
-    rotate_if_needed(TECH_PATH)
+    t0 = time.perf_counter()
+    acct = getattr(_CTX, "acct", None)
+    if acct is not None and acct is not MAIN_ACCOUNT:
+        entry.setdefault("acct", acct.name)
+    sig = getattr(_CTX, "sig", None)
+    if sig and "signal_id" not in entry:
+        entry["signal_id"] = sig
     entry["ts"] = datetime.now(timezone.utc).isoformat().replace("+00:00","Z")
     with open(TECH_PATH, "a", encoding="utf-8") as f:
         f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    M_LOG_SEC.observe(time.perf_counter() - t0, "tech")
     print("[TECH] " + json.dumps(entry, ensure_ascii=False), flush=True)
 
-def _ensure_exec_header():
-    if not os.path.exists(EXEC_PATH) or os.path.getsize(EXEC_PATH) == 0:
-        with open(EXEC_PATH, "w", newline="", encoding="utf-8") as f:
+def _ensure_exec_header(path=EXEC_PATH):
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        with open(path, "w", newline="", encoding="utf-8") as f:
             csv.writer(f).writerow(
                 ["signal_id","event","time","price","qty","commission","commission_asset","realized_pnl","symbol","side","order_id"]
             )
 
 def exec_log(signal_id, event, iso_time, price, qty, commission, commission_asset, realized_pnl, symbol, side, order_id):
-    rotate_if_needed(EXEC_PATH); _ensure_exec_header()
-    with open(EXEC_PATH, "a", newline="", encoding="utf-8") as f:
+    t0 = time.perf_counter()
+    path = _acct().exec_path
+    _ensure_exec_header(path)
+    with open(path, "a", newline="", encoding="utf-8") as f:
         csv.writer(f).writerow([signal_id,event,iso_time,price or "",qty or "",commission or "",commission_asset or "",
                                 realized_pnl if realized_pnl is not None else "",symbol,side,order_id])
+    M_LOG_SEC.observe(time.perf_counter() - t0, "exec")
 
 def to_float(x):
     try: return float(x)
     except: return None
 
-def to_iso8601(ts):
+def _signal_dt(ts) -> datetime:
+    """Час сигналу: epoch ms / epoch s / ISO-8601 -> aware UTC; нерозбірне -> зараз."""
     s=str(ts)
     try:
         v=float(s); iv=int(v)
-        if iv>10_000_000_000: return datetime.fromtimestamp(iv/1000, tz=timezone.utc).isoformat().replace("+00:00","Z")
-        if iv>1_000_000_000:  return datetime.fromtimestamp(iv, tz=timezone.utc).isoformat().replace("+00:00","Z")
+        if iv>10_000_000_000: return datetime.fromtimestamp(iv/1000, tz=timezone.utc)
+        if iv>1_000_000_000:  return datetime.fromtimestamp(iv, tz=timezone.utc)
     except: pass
     try:
         if s.endswith("Z"): s=s[:-1]+"+00:00"
-        return datetime.fromisoformat(s).astimezone(timezone.utc).isoformat().replace("+00:00","Z")
-    except: return datetime.now(timezone.utc).isoformat().replace("+00:00","Z")
+        return datetime.fromisoformat(s).astimezone(timezone.utc)
+    except: return datetime.now(timezone.utc)
+
+def to_iso8601(ts):
+    return _signal_dt(ts).isoformat().replace("+00:00","Z")
 
 def parse_iso8601_to_dt(iso_str: str) -> datetime:
     s = iso_str
@@ -202,7 +611,7 @@ def valid_sig(req):
     if not sig:
         return False
     try:
-        expected = calc_sig(req.get_data(cache=False, as_text=False))
+        expected = calc_sig(req.get_data(cache=True, as_text=False))
         return hmac.compare_digest(sig, expected)
     except Exception:
         return False
@@ -210,6 +619,16 @@ def valid_sig(req):
 def tv_to_binance_symbol(tv_symbol: str) -> str:
     return re.sub(r"\.P$", "", str(tv_symbol)).upper()
 
+_SYMBOL_MAP = {}          # TV-символ -> Binance; набір символів алертів малий і сталий
+
+def binance_symbol(tv_symbol: str) -> str:
+    s = _SYMBOL_MAP.get(tv_symbol)
+    if s is None:
+        if len(_SYMBOL_MAP) >= 10000:
+            _SYMBOL_MAP.clear()
+        s = _SYMBOL_MAP[tv_symbol] = sys.intern(tv_to_binance_symbol(tv_symbol))
+    return s
+
 def q_floor_to_step(qty: float, step: float) -> float:
     if step<=0: return qty
     from decimal import Decimal as D
@@ -253,24 +672,26 @@ def get_best_bid_ask(symbol):
     return bid, ask
 
 def ensure_oneway_mode():
-    global ONEWAY_SET
-    if ONEWAY_SET: return
+    acct = _acct()
+    if acct.oneway_set: return
     try:
         try:
             dual = str(BINANCE.get_position_mode().get("dualSidePosition","false")).lower() in ("true","1")
-            if not dual: ONEWAY_SET=True; techlog({"level":"info","msg":"oneway_mode_ok","source":"precheck"}); return
+            if not dual: acct.oneway_set=True; techlog({"level":"info","msg":"oneway_mode_ok","source":"precheck"}); return
         except: pass
         BINANCE.change_position_mode(dualSidePosition="false")
-        ONEWAY_SET=True; techlog({"level":"info","msg":"oneway_mode_ok"})
+        acct.oneway_set=True; techlog({"level":"info","msg":"oneway_mode_ok"})
     except Exception as e:
         techlog({"level":"warn","msg":"change_position_mode_failed","err":str(e)})
 
 def ensure_leverage(symbol):
-    if symbol in LEVERAGE_SET: return
+    acct = _acct()
+    if symbol in acct.leverage_set: return
     try:
-        BINANCE.change_leverage(symbol=symbol, leverage=LEVERAGE)
-        LEVERAGE_SET.add(symbol)
-        techlog({"level":"info","msg":"leverage_ok","symbol":symbol,"leverage":LEVERAGE})
+        lev = acct.eff_leverage()
+        BINANCE.change_leverage(symbol=symbol, leverage=lev)
+        acct.leverage_set.add(symbol)
+        techlog({"level":"info","msg":"leverage_ok","symbol":symbol,"leverage":lev})
     except Exception as e:
         techlog({"level":"warn","msg":"change_leverage_failed","symbol":symbol,"err":str(e)})
 
@@ -285,6 +706,33 @@ def _fetch_positions(symbol):
             except: pass
     return []
 
+def _all_positions():
+    """{symbol: signed amt} усіх ненульових позицій одним запитом; None — якщо біржа не віддала список."""
+    for m in ("position_risk","get_position_risk","position_information","get_position_information"):
+        if hasattr(BINANCE, m):
+            try:
+                data = getattr(BINANCE, m)()
+            except Exception:
+                continue
+            if isinstance(data, dict) and "positions" in data: data = data["positions"]
+            if isinstance(data, list):
+                out = {}
+                for p in data:
+                    amt = to_float(p.get("positionAmt")) or 0.0
+                    if amt:
+                        out[str(p.get("symbol","")).upper()] = amt
+                return out
+    return None
+
+def _open_orders_by_symbol():
+    """Усі відкриті ордери одним запитом -> {symbol: [orders]}."""
+    by_sym = {}
+    for od in _list_open_orders(symbol=None) or []:
+        sy = str(od.get("symbol","")).upper()
+        if sy:
+            by_sym.setdefault(sy, []).append(od)
+    return by_sym
+
 def _position_amt(symbol)->float:
     try:
         for p in _fetch_positions(symbol):
@@ -301,7 +749,7 @@ def _position_signed_amt(symbol)->float:
     except: pass
     return 0.0
 
-# ---- safe order getters (м'яко трактуємо -2013 як REJECTED) ----
+# ---- safe order getters (м'яко трактуємо -2013 як REJECTED; -1021 — статус невідомий, ok=None) ----
 def _safe_get_order(symbol, order_id):
     try:
         return BINANCE.get_order(symbol=symbol, orderId=order_id), True
@@ -315,11 +763,17 @@ def _safe_get_order(symbol, order_id):
                          "symbol":symbol,"order_id":order_id,
                          "reason":"order_rejected_or_not_found"})
                 return {}, False
+            if _is_clock_error(e1) or _is_clock_error(e2):
+                techlog({"level":"warn","msg":"order_get_clock_error","symbol":symbol,"order_id":order_id,"err":msg})
+                return {}, None
             techlog({"level":"warn","msg":"order_get_failed","symbol":symbol,"order_id":order_id,"err":msg})
             return {}, False
 
 def _get_order_status(symbol, order_id:int) -> str:
+    """UNKNOWN — статус не прочитано через годинник; це не відмова ордера."""
     od, ok = _safe_get_order(symbol, order_id)
+    if ok is None:
+        return "UNKNOWN"
     if not ok:
         return "REJECTED"
     return str(od.get("status","")).upper()
@@ -346,19 +800,97 @@ def _list_open_orders(symbol=None):
                     continue
     return []
 
-def _split_open_orders(symbol):
-    orders = _list_open_orders(symbol) or []
+# ---- client order ids ----
+CID_ROLES = {"E": "entry", "L": "entry", "F": "entry", "T": "tp", "S": "sl", "C": "exit"}
+_CID_RE = re.compile(r"^([A-Za-z0-9]{1,6})-([A-Za-z0-9_-]{16})-([ELFTSC])(\d{1,3})$")
+
+def _sig_tag(signal_id) -> str:
+    """16 символів base64url від blake2b(signal id) — влазить у ліміт 36 символів newClientOrderId."""
+    return base64.urlsafe_b64encode(hashlib.blake2b(str(signal_id).encode("utf-8"), digest_size=12).digest()).decode("ascii")
+
+def client_order_id(signal_id, role: str, attempt: int = 0) -> str:
+    """role: E market-вхід, L лімітка (0 — seed, далі репрайси), F fallback, T TP, S SL, C закриття."""
+    return f"{CID_PREFIX}-{_sig_tag(signal_id)}-{role}{int(attempt) % 1000}"
+
+def parse_client_order_id(cid):
+    """-> (tag, role, attempt) або None, якщо ордер виставлено не цим ботом."""
+    m = _CID_RE.match(str(cid or ""))
+    if m is None or m.group(1) != CID_PREFIX:
+        return None
+    return m.group(2), m.group(3), int(m.group(4))
+
+def _order_role(od) -> str:
+    """entry | tp | sl | exit: спершу з тегу clientOrderId, для чужих/старих ордерів — за типом."""
+    tag = parse_client_order_id(od.get("clientOrderId"))
+    if tag is not None:
+        return CID_ROLES[tag[1]]
+    typ = str(od.get("type","")).upper()
+    ro  = str(od.get("reduceOnly","")).lower() in ("true","1","yes")
+    cp  = str(od.get("closePosition","")).lower() in ("true","1","yes")
+    if (typ=="LIMIT" and ro) or typ in ("TAKE_PROFIT","TAKE_PROFIT_MARKET"):
+        return "tp"
+    if typ in ("STOP","STOP_MARKET") and (cp or ro):
+        return "sl"
+    if typ in ("STOP","STOP_MARKET","TAKE_PROFIT","TAKE_PROFIT_MARKET") or ro or cp:
+        return "exit"
+    return "entry"
+
+def _split_open_orders(symbol, orders=None):
+    if orders is None:
+        orders = _list_open_orders(symbol) or []
     entries, exits = [], []
     for od in orders:
-        typ = str(od.get("type","")).upper()
-        ro  = str(od.get("reduceOnly","")).lower() in ("true","1","yes")
-        cp  = str(od.get("closePosition","")).lower() in ("true","1","yes")
-        if typ in ("STOP","STOP_MARKET","TAKE_PROFIT","TAKE_PROFIT_MARKET") or ro or cp:
-            exits.append(od)
-        else:
-            entries.append(od)
+        (entries if _order_role(od) == "entry" else exits).append(od)
     return entries, exits
 
+def _order_by_cid(symbol, cid):
+    """Ордер за origClientOrderId або None, якщо біржа його не знає."""
+    for m in ("query_order", "get_order"):
+        if hasattr(BINANCE, m):
+            try:
+                return getattr(BINANCE, m)(symbol=symbol, origClientOrderId=cid)
+            except Exception as e:
+                if _is_unknown_order(e):
+                    return None
+    for od in _list_open_orders(symbol) or []:
+        if od.get("clientOrderId") == cid:
+            return od
+    return None
+
+_SEND_UNKNOWN_CODES = (-1000, -1001, -1006, -1007)
+
+def _send_status_unknown(e) -> bool:
+    """Таймаут/обрив/5xx: біржа могла прийняти ордер. Явна відмова з кодом — ні."""
+    code = getattr(e, "error_code", None)
+    if code is None:
+        m = re.search(r"\((-\d{4})\)", str(e))
+        code = int(m.group(1)) if m else None
+    return code is None or code in _SEND_UNKNOWN_CODES or code == -4116
+
+def _new_order(cid=None, **params):
+    """
+    new_order із детермінованим newClientOrderId. Якщо результат невідомий (таймаут, 5xx,
+    -4116 duplicate), спершу шукаємо ордер за cid і лише якщо його немає — повторюємо з тим самим cid,
+    тож повтор не може створити другий ордер.
+    """
+    if not cid:
+        return BINANCE.new_order(**params)
+    symbol = params["symbol"]
+    for i in range(2):
+        try:
+            return BINANCE.new_order(newClientOrderId=cid, **params)
+        except Exception as e:
+            if not _send_status_unknown(e):
+                raise
+            od = _order_by_cid(symbol, cid)
+            if od:
+                techlog({"level":"info","msg":"order_found_by_cid","symbol":symbol,"cid":cid,
+                         "order_id":od.get("orderId"),"err":str(e)})
+                return od
+            if i:
+                raise
+            techlog({"level":"warn","msg":"order_send_retry","symbol":symbol,"cid":cid,"err":str(e)})
+
 def _fetch_trades_for_order(symbol, order_id:int):
     try: trades = BINANCE.user_trades(symbol=symbol)
     except:
@@ -378,149 +910,609 @@ def _fetch_trades_for_order(symbol, order_id:int):
     vwap=(pxqty/qty) if qty else None
     return vwap,(qty or None),(fee or None),asset,(pnl if pnl!=0.0 else None)
 
+# ====== WATCHDOG ======
+class Worker:
+    """
+    Фоновий цикл під наглядом watchdog: час і тривалість останньої ітерації, backlog, рестарти.
+    Цикл обгортає кожну ітерацію у `with w.iteration():` і крутиться, поки w.current().
+    Кожен запущений потік має своє покоління gen: замінений (завислий) потік, прокинувшись,
+    не чіпає стан нового і виходить з циклу.
+    """
+    __slots__ = ("name", "target", "interval", "backlog_fn", "thread", "gen", "busy", "last_begin", "last_end",
+                 "last_dur", "max_dur", "iterations", "restarts", "stalled", "last_err")
+
+    def __init__(self, name, target, interval=None, backlog_fn=None):
+        self.name = name; self.target = target
+        self.interval = interval          # очікувана пауза між ітераціями; None — цикл за подіями
+        self.backlog_fn = backlog_fn
+        self.thread = None
+        self.gen = 0
+        self.busy = False
+        self.last_begin = self.last_end = time.monotonic()
+        self.last_dur = self.max_dur = 0.0
+        self.iterations = self.restarts = 0
+        self.stalled = False
+        self.last_err = None
+
+    @contextmanager
+    def iteration(self):
+        gen = _WORKER_TL.gen if self.current() else None
+        t0 = time.monotonic()
+        if gen is not None:
+            self.last_begin = t0; self.busy = True
+        try:
+            yield
+        finally:
+            if gen is not None and self.gen == gen:
+                now = time.monotonic()
+                self.last_dur = now - t0
+                if self.last_dur > self.max_dur: self.max_dur = self.last_dur
+                self.last_end = now; self.iterations += 1; self.busy = False
+
+    def current(self) -> bool:
+        """False, якщо watchdog уже замінив цей потік новим (старий має вийти)."""
+        return getattr(_WORKER_TL, "gen", None) == self.gen and getattr(_WORKER_TL, "worker", None) is self
+
+    def _run(self, gen):
+        _WORKER_TL.worker = self; _WORKER_TL.gen = gen
+        try:
+            self.target()
+        except Exception as e:
+            if self.current():
+                self.last_err = str(e)
+            techlog({"level":"error","msg":"worker_crashed","worker":self.name,"err":str(e),"gen":gen})
+
+    def start(self):
+        self.gen += 1
+        self.busy = False
+        self.last_begin = self.last_end = time.monotonic()
+        self.thread = threading.Thread(target=self._run, args=(self.gen,), name=self.name, daemon=True)
+        self.thread.start()
+
+    def lag(self, now) -> float:
+        """Скільки секунд цикл «висить» в ітерації або прострочив наступну."""
+        if self.busy:
+            return now - self.last_begin
+        if self.interval is None:
+            return 0.0
+        return max(0.0, now - self.last_end - self.interval)
+
+    def status(self, now) -> dict:
+        backlog = None
+        if self.backlog_fn:
+            try: backlog = self.backlog_fn()
+            except Exception: pass
+        return {"alive": bool(self.thread and self.thread.is_alive()), "busy": self.busy,
+                "stalled": self.stalled, "lag_sec": round(self.lag(now), 3),
+                "since_last_sec": round(now - self.last_end, 3),
+                "last_iter_sec": round(self.last_dur, 4), "max_iter_sec": round(self.max_dur, 4),
+                "iterations": self.iterations, "restarts": self.restarts,
+                "backlog": backlog, "last_err": self.last_err}
+
+WORKERS = OrderedDict()
+_WORKER_TL = threading.local()      # worker, gen — чий це потік і якого покоління
+
+def _spawn_worker(name, target, interval=None, backlog_fn=None) -> Worker:
+    w = WORKERS[name] = Worker(name, target, interval, backlog_fn)
+    w.start()
+    return w
+
+def _watchdog():
+    while True:
+        time.sleep(max(0.5, WATCHDOG_SEC))
+        now = time.monotonic()
+        for w in list(WORKERS.values()):
+            try:
+                if not w.thread.is_alive():
+                    w.restarts += 1
+                    techlog({"level":"error","msg":"worker_restarted","worker":w.name,"reason":"dead",
+                             "restarts":w.restarts,"err":w.last_err})
+                    w.start()
+                    continue
+                lag = w.lag(now)
+                stalled = lag > WORKER_STALL_SEC
+                if stalled and not w.stalled:
+                    techlog({"level":"error","msg":"worker_stalled","worker":w.name,"lag_sec":round(lag, 1),"busy":w.busy})
+                elif w.stalled and not stalled:
+                    techlog({"level":"info","msg":"worker_recovered","worker":w.name})
+                w.stalled = stalled
+                # завислий виклик не перервати — запускаємо заміну, старий потік вийде сам
+                if stalled and w.busy and lag > 3 * WORKER_STALL_SEC:
+                    w.restarts += 1
+                    techlog({"level":"error","msg":"worker_restarted","worker":w.name,"reason":"hung",
+                             "lag_sec":round(lag, 1),"restarts":w.restarts})
+                    w.start()
+            except Exception as e:
+                techlog({"level":"warn","msg":"watchdog_error","worker":w.name,"err":str(e)})
+
+def _workers_stalled() -> list:
+    return [w.name for w in WORKERS.values() if w.stalled or not (w.thread and w.thread.is_alive())]
+
+threading.Thread(target=_watchdog, name="watchdog", daemon=True).start()
+
+# ====== LOG ROTATION ======
+# Ротацію робить фоновий цикл, запис у лог лише відкриває файл на append: rename під
+# відкритим дескриптором безпечний — рядок допишеться у щойно відкочений файл.
+_ROT_DAY = {}
+
+def _rotated_files(path) -> list:
+    """Усі ротації path (path.<stamp>[.gz], а також старі path.1..N), від старих до нових."""
+    return sorted((f for f in glob.glob(glob.escape(path) + ".*") if not f.endswith(".tmp")), key=os.path.getmtime)
+
+def _managed_logs() -> list:
+    return [CSV_PATH, TECH_PATH] + [a.exec_path for a in ACCOUNTS.values()]
+
+def _rotate(path) -> str:
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+    dst = f"{path}.{stamp}"; n = 1
+    while os.path.exists(dst) or os.path.exists(dst + ".gz"):
+        dst = f"{path}.{stamp}-{n}"; n += 1
+    os.rename(path, dst)
+    if LOGIDX is not None:
+        LOGIDX.moved(path, dst)
+    if path.endswith(".csv"):
+        # заголовок переносимо одразу, щоб writer не дописав рядки у файл без header
+        with open(dst, "r", encoding="utf-8") as f:
+            header = f.readline()
+        if header:
+            try:
+                with open(path, "x", encoding="utf-8", newline="") as f:
+                    f.write(header)
+            except FileExistsError:
+                pass
+    return dst
+
+def _compress(src):
+    if LOGIDX is not None:
+        LOGIDX.catch_up([src])      # дочитати хвіст до стиснення
+    tmp = src + ".gz.tmp"
+    with open(src, "rb") as fi, gzip.open(tmp, "wb", compresslevel=6) as fo:
+        shutil.copyfileobj(fi, fo, 1024*1024)
+    os.replace(tmp, src + ".gz")
+    if LOGIDX is not None:
+        LOGIDX.moved(src, src + ".gz")
+    os.remove(src)
+
+def _log_rotation_pass():
+    now = time.time()
+    today = datetime.now(timezone.utc).date()
+    for path in _managed_logs():
+        try:
+            # 1) стиснути відкочені файли, у які вже точно ніхто не пише
+            for f in _rotated_files(path):
+                if ROTATE_COMPRESS == "gzip" and not f.endswith(".gz") and now - os.path.getmtime(f) > 5:
+                    _compress(f)
+                    techlog({"level":"info","msg":"log_compressed","file":os.path.basename(f)})
+            # 2) тригери ротації: розмір / зміна доби
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            day = _ROT_DAY.setdefault(path, datetime.fromtimestamp(st.st_mtime, timezone.utc).date())
+            by_size = ROTATE_BYTES > 0 and st.st_size >= ROTATE_BYTES
+            by_day = ROTATE_DAILY and day != today and st.st_size > 0
+            if by_size or by_day:
+                dst = _rotate(path)
+                _ROT_DAY[path] = today
+                techlog({"level":"info","msg":"log_rotated","file":os.path.basename(dst),
+                         "bytes":st.st_size,"trigger":"size" if by_size else "daily"})
+            # 3) ретеншн за віком
+            if LOG_RETENTION_DAYS > 0:
+                for f in _rotated_files(path):
+                    if now - os.path.getmtime(f) > LOG_RETENTION_DAYS * 86400:
+                        os.remove(f)
+                        if LOGIDX is not None: LOGIDX.dropped(f)
+                        techlog({"level":"info","msg":"log_expired","file":os.path.basename(f)})
+        except Exception as e:
+            techlog({"level":"warn","msg":"rotate_failed","err":str(e),"path":path})
+
+LOGIDX = None
+if LOG_INDEX:
+    try:
+        LOGIDX = LI.LogIndex(os.path.join(LOG_DIR, LOG_INDEX),
+                             [("signals", CSV_PATH), ("tech", TECH_PATH)] + [("exec", a.exec_path) for a in ACCOUNTS.values()])
+    except Exception as e:
+        print("[WARN] log index disabled:", repr(e), flush=True)
+
+def _log_indexer():
+    w = WORKERS["log_indexer"]
+    while w.current():
+        with w.iteration():
+            try:
+                LOGIDX.catch_up()
+            except Exception as e:
+                techlog({"level":"warn","msg":"log_index_failed","err":str(e)})
+        time.sleep(max(0.2, LOG_INDEX_SEC))
+
+def _log_rotator():
+    w = WORKERS["log_rotator"]
+    while w.current():
+        with w.iteration():
+            _log_rotation_pass()
+        time.sleep(max(1.0, ROTATE_CHECK_SEC))
+
 # ====== HEARTBEAT ======
 def _heartbeat():
-    while True:
-        print("[HEARTBEAT] " + datetime.now().strftime("%Y-%m-%d %H:%M:%S") + " alive", flush=True)
+    w = WORKERS["heartbeat"]
+    while w.current():
+        with w.iteration():
+            print("[HEARTBEAT] " + datetime.now().strftime("%Y-%m-%d %H:%M:%S") + " alive", flush=True)
         time.sleep(60)
-threading.Thread(target=_heartbeat, daemon=True).start()
+_spawn_worker("heartbeat", _heartbeat, interval=60)
+_spawn_worker("log_rotator", _log_rotator, interval=max(1.0, ROTATE_CHECK_SEC))
+if LOGIDX is not None:
+    _spawn_worker("log_indexer", _log_indexer, interval=max(0.2, LOG_INDEX_SEC))
 
 # ====== CANCEL HELPERS ======
-def _cancel_order_silent(symbol, order_id, reason):
-    if not order_id: return
-    err = None
-    for i in range(max(1, CANCEL_RETRIES)):
-        try:
-            BINANCE.cancel_order(symbol=symbol, orderId=order_id)
-            techlog({"level":"info","msg":"cancel_order","symbol":symbol,"order_id":order_id,"reason":reason,"try":i+1})
-            return
-        except Exception as e:
-            err = str(e)
-            time.sleep(0.3)
-    techlog({"level":"warn","msg":"cancel_order_failed","symbol":symbol,"order_id":order_id,"err":err})
+# ====== CANCEL PIPELINE ======
+def _is_unknown_order(e) -> bool:
+    """-2011 Unknown order / -2013 Order does not exist: ордер уже не живий — для cancel це успіх."""
+    code = getattr(e, "error_code", None)
+    if code in (-2011, -2013):
+        return True
+    msg = str(e)
+    return "-2011" in msg or "-2013" in msg or "Unknown order" in msg or "Order does not exist" in msg
 
-def _cancel_all_silent(symbol, reason):
-    err = None
-    for i in range(max(1, CANCEL_RETRIES)):
+class CancelPipeline:
+    """
+    Скасування у власному пулі потоків: виклик одразу отримує Future (True — ордер уже не живий,
+    False — не вдалося після CANCEL_RETRIES спроб) і чекає лише тоді, коли потрібне підтвердження.
+    Повтори — з експоненційним backoff і jitter; дубль для того самого ордера (акаунт, символ, id)
+    повертає вже наявний Future замість другого запиту.
+    """
+    def __init__(self, workers: int):
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="cancel")
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def submit(self, symbol, order_id, reason, all_orders=False):
+        acct = _acct()
+        key = (acct.name, symbol, "*" if all_orders else int(order_id))
+        with self._lock:
+            fut = self._pending.get(key)
+            if fut is not None:
+                M_CANCEL.inc("coalesced")
+                return fut
+            fut = self._pending[key] = self._pool.submit(self._run, acct, getattr(_CTX, "sig", None), key,
+                                                         symbol, order_id, reason, all_orders)
+        return fut
+
+    def _backoff(self, i: int) -> float:
+        cap = min(CANCEL_BACKOFF_MAX_MS, CANCEL_BACKOFF_MS * (2 ** i))
+        return random.uniform(cap / 2.0, cap) / 1000.0
+
+    def _run(self, acct, sig, key, symbol, order_id, reason, all_orders):
+        t0 = time.perf_counter()
+        err = None
         try:
-            BINANCE.cancel_all_open_orders(symbol=symbol)
-            techlog({"level":"info","msg":"cancel_all_open_orders","symbol":symbol,"reason":reason,"try":i+1})
-            return
-        except Exception as e:
-            err = str(e)
-            time.sleep(0.3)
-    techlog({"level":"warn","msg":"cancel_all_failed","symbol":symbol,"err":err,"reason":reason})
-
-def _cancel_exits_for_symbol(symbol, reason):
+            with _use_account(acct), _use_signal(sig):
+                for i in range(max(1, CANCEL_RETRIES)):
+                    try:
+                        if all_orders:
+                            BINANCE.cancel_all_open_orders(symbol=symbol)
+                            techlog({"level":"info","msg":"cancel_all_open_orders","symbol":symbol,"reason":reason,"try":i+1})
+                        else:
+                            BINANCE.cancel_order(symbol=symbol, orderId=order_id)
+                            techlog({"level":"info","msg":"cancel_order","symbol":symbol,"order_id":order_id,"reason":reason,"try":i+1})
+                        M_CANCEL.inc("ok")
+                        return True
+                    except Exception as e:
+                        if not all_orders and _is_unknown_order(e):
+                            techlog({"level":"info","msg":"cancel_order_gone","symbol":symbol,"order_id":order_id,"reason":reason,"try":i+1})
+                            M_CANCEL.inc("unknown")
+                            return True
+                        err = str(e)
+                        if i + 1 < max(1, CANCEL_RETRIES):
+                            time.sleep(self._backoff(i))
+                if all_orders:
+                    techlog({"level":"warn","msg":"cancel_all_failed","symbol":symbol,"err":err,"reason":reason})
+                else:
+                    techlog({"level":"warn","msg":"cancel_order_failed","symbol":symbol,"order_id":order_id,"err":err,"reason":reason})
+                M_CANCEL.inc("failed")
+                return False
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+            M_CANCEL_SEC.observe(time.perf_counter() - t0)
+
+CANCELS = CancelPipeline(CANCEL_WORKERS)
+
+def _await_cancels(futs, symbol, reason) -> bool:
+    """Чекає підтвердження групи скасувань; timeout рахується як невдача."""
+    ok = True
+    deadline = time.monotonic() + CANCEL_WAIT_SEC
+    for f in futs:
+        try:
+            ok = f.result(timeout=max(0.0, deadline - time.monotonic())) and ok
+        except Exception:
+            techlog({"level":"warn","msg":"cancel_wait_timeout","symbol":symbol,"reason":reason})
+            ok = False
+    return ok
+
+def _cancel_order_silent(symbol, order_id, reason, wait=False):
+    """Без wait повертає Future (або None, якщо ордера немає); з wait — True/False."""
+    if not order_id:
+        return True if wait else None
+    fut = CANCELS.submit(symbol, order_id, reason)
+    return _await_cancels([fut], symbol, reason) if wait else fut
+
+def _cancel_all_silent(symbol, reason, wait=False):
+    fut = CANCELS.submit(symbol, 0, reason, all_orders=True)
+    return _await_cancels([fut], symbol, reason) if wait else fut
+
+def _cancel_exits_for_symbol(symbol, reason, wait=False):
     _entries, exits = _split_open_orders(symbol)
-    for od in exits:
-        _cancel_order_silent(symbol, int(od.get("orderId",0)), reason)
+    futs = [CANCELS.submit(symbol, int(od.get("orderId",0)), reason) for od in exits if od.get("orderId")]
+    return _await_cancels(futs, symbol, reason) if wait else futs
+
+def _log_close_fill(signal_id, symbol, pos_side, order_id):
+    vwap,qtyc,feec,assetc,rpn = _fetch_trades_for_order(symbol, order_id)
+    exec_log(signal_id,"CLOSE_MANUAL",datetime.now(timezone.utc).isoformat().replace("+00:00","Z"),
+             vwap,qtyc,feec,assetc,rpn,symbol,pos_side,order_id)
 
 def _close_position_reduce_only(symbol, signal_id, reason="replace", wait_sec=5.0):
+    """
+    MARKET reduceOnly із newOrderRespType=RESULT: якщо відповідь FILLED і executedQty покриває
+    позицію (із точністю до stepSize), позиція вважається закритою без опитування.
+    Опитування позиції — лише коли результат неоднозначний (NEW/PARTIALLY_FILLED/недолив).
+    Комісія/PnL для exec-логу дочитуються у фоні, щоб не затримувати новий вхід.
+    """
     signed = _position_signed_amt(symbol)
     if signed == 0.0:
         return None
-    _cancel_exits_for_symbol(symbol, reason + "_cancel_exits")
+    b = _acct().brackets.get(symbol)
+    if b is not None: b.set_state(BR_CLOSING)
+    _cancel_exits_for_symbol(symbol, reason + "_cancel_exits", wait=True)
     side_to_close = "SELL" if signed > 0 else "BUY"
+    pos_side = "long" if signed > 0 else "short"
     filt = fetch_symbol_filters(symbol); step = filt.get("stepSize") or 0.001
     last_order_id = None
     deadline = time.time() + max(0.5, wait_sec)
+    amt = abs(signed)
+    attempt = 0
     while True:
-        amt = abs(_position_signed_amt(symbol))
-        if amt <= 0.0:
-            break
         qty = q_floor_to_step(amt, step)
         if qty <= 0.0:
             break
         try:
-            o = BINANCE.new_order(symbol=symbol, side=side_to_close, type="MARKET",
-                                  reduceOnly="true", quantity=qty, newOrderRespType="RESULT")
+            o = _new_order(client_order_id(signal_id, "C", attempt), symbol=symbol, side=side_to_close,
+                           type="MARKET", reduceOnly="true", quantity=qty, newOrderRespType="RESULT")
+            attempt += 1
             last_order_id = int(o.get("orderId") or 0)
             techlog({"level":"info","msg":"replace_close_market_sent","symbol":symbol,"qty":qty,"id":last_order_id})
-            vwap,qtyc,feec,assetc,rpn = _fetch_trades_for_order(symbol, last_order_id)
-            exec_log(signal_id,"CLOSE_MANUAL",datetime.now(timezone.utc).isoformat().replace("+00:00","Z"),
-                     vwap,qtyc,feec,assetc,rpn,symbol,("long" if signed>0 else "short"),last_order_id)
+            _submit_bg(_log_close_fill, signal_id, symbol, pos_side, last_order_id)
         except Exception as e:
             techlog({"level":"warn","msg":"replace_close_market_failed","symbol":symbol,"err":str(e)})
             break
+        status = str(o.get("status","")).upper()
+        executed = to_float(o.get("executedQty")) or 0.0
+        if status == "FILLED" and amt - executed < step:
+            techlog({"level":"info","msg":"replace_close_confirmed","symbol":symbol,"source":"order_result",
+                     "executed":executed,"dust":max(0.0, amt - executed)})
+            break
+        # неоднозначно — підтверджуємо опитуванням позиції
         t0 = time.time()
-        while time.time() - t0 < 0.6:
-            if abs(_position_signed_amt(symbol)) <= 0.0:
+        while True:
+            amt = abs(_position_signed_amt(symbol))
+            if amt <= 0.0 or time.time() - t0 >= 0.6:
                 break
             time.sleep(0.1)
-        if abs(_position_signed_amt(symbol)) <= 0.0:
+        if amt <= 0.0:
+            techlog({"level":"info","msg":"replace_close_confirmed","symbol":symbol,"source":"position_poll"})
             break
         if time.time() >= deadline:
-            techlog({"level":"warn","msg":"replace_close_timeout","symbol":symbol,"remain":_position_signed_amt(symbol)})
+            techlog({"level":"warn","msg":"replace_close_timeout","symbol":symbol,"remain":amt})
             break
-    with BR_LOCK:
-        BRACKETS.pop(symbol, None)
+    _bracket_drop(symbol, reason)
     return last_order_id
 
 # ====== BRACKET MONITOR ======
+def _live_accounts():
+    return [a for a in ACCOUNTS.values() if a.client is not None]
+
+MONITOR_POOL = ThreadPoolExecutor(max_workers=max(1, MONITOR_WORKERS), thread_name_prefix="mon")
+_MARKS = {}              # symbol -> (mark price, monotonic-час отримання)
+_MARKS_T = [0.0]
+
+def _refresh_marks() -> bool:
+    """Mark price усіх символів одним викликом, не частіше MARK_REFRESH_SEC. -> True, якщо оновлено."""
+    now = time.monotonic()
+    if now - _MARKS_T[0] < MARK_REFRESH_SEC:
+        return False
+    _MARKS_T[0] = now
+    try:
+        rows = BINANCE.mark_price()
+    except Exception as e:
+        techlog({"level":"warn","msg":"mark_refresh_failed","err":str(e)})
+        return False
+    t = time.monotonic()
+    for r in (rows if isinstance(rows, list) else [rows]):
+        try: _MARKS[r["symbol"]] = (float(r["markPrice"]), t)
+        except (KeyError, TypeError, ValueError): pass
+    return True
+
+def _observe_mark(b: Bracket, px: float, t: float) -> bool:
+    """t — час отримання семплу; повторне спостереження того ж семплу ігнорується. -> True для нового."""
+    if px <= 0 or t <= b.mark_t:
+        return False
+    if b.mark:
+        r = math.log(px / b.mark)
+        v = r * r / (t - b.mark_t)
+        b.var = v if b.var is None else 0.7 * b.var + 0.3 * v
+    b.mark = px; b.mark_t = t
+    return True
+
+def _next_poll_delay(b: Bracket, px) -> float:
+    """
+    Очікуваний час, за який ціна пройде відстань d до найближчого TP/SL при броунівському русі
+    з дисперсією var (на сек): t ≈ d²/var; опитуємо на частці BRACKET_POLL_SAFETY від нього.
+    """
+    if not px or not (b.tp or b.sl):
+        return BRACKET_POLL_SEC
+    long = b.side == "long"
+    if (b.tp and (px >= b.tp if long else px <= b.tp)) or (b.sl and (px <= b.sl if long else px >= b.sl)):
+        return BRACKET_POLL_MIN_SEC      # тригер уже перетнуто — чекаємо на fill
+    if not b.var:
+        return BRACKET_POLL_SEC
+    d = min(abs(px - x) for x in (b.tp, b.sl) if x) / px
+    return min(BRACKET_POLL_MAX_SEC, max(BRACKET_POLL_MIN_SEC, BRACKET_POLL_SAFETY * d * d / b.var))
+
 def _bracket_monitor():
-    while True:
-        try:
-            with BR_LOCK:
-                items=list(BRACKETS.items())
-            for symbol, b in items:
-                sid=b.get("id"); side=b.get("side")
-                tp_id=b.get("tp_id"); sl_id=b.get("sl_id")
-
-                if _position_amt(symbol)==0.0:
-                    entries, exits = _split_open_orders(symbol)
-                    if entries:
-                        techlog({"level":"debug","msg":"flat_but_entry_present","symbol":symbol,"entries":len(entries),"exits":len(exits)})
-                        continue
-                    if exits:
-                        for od in exits:
-                            oid = int(od.get("orderId", 0))
-                            _cancel_order_silent(symbol, oid, "pos_is_zero_exit_cleanup")
-                        with BR_LOCK: BRACKETS.pop(symbol, None)
-                        techlog({"level":"info","msg":"exit_orphans_cleaned_flat","symbol":symbol,"count":len(exits)})
-                        continue
-                    with BR_LOCK: BRACKETS.pop(symbol, None)
-                    techlog({"level":"info","msg":"bracket_removed_flat_no_orders","symbol":symbol})
-                    continue
+    w = WORKERS["bracket_monitor"]
+    while w.current():
+        with w.iteration():
+            _monitor_tick()
+        time.sleep(max(0.05, min(BRACKET_POLL_MIN_SEC, 0.25)))
+
+def _monitor_tick():
+    """Символи, чий next_poll настав, — у пул MONITOR_POOL; повільний символ не блокує інших."""
+    if DRAINING.is_set():
+        return      # brackets уже в журналі — їх веде наступник
+    live = [(acct, b) for acct in _live_accounts() for b in acct.brackets.snapshot().values()]
+    if not live:
+        return
+    # марки — за власним розкладом, незалежно від того, чи щось уже due: рух ціни до TP/SL
+    # має підтягувати next_poll далеких символів
+    with _use_account(live[0][0]):
+        fresh = _refresh_marks()
+    now = time.monotonic()
+    if fresh:
+        for _a, b in live:
+            m = _MARKS.get(b.symbol)
+            if m and not b.inflight and _observe_mark(b, m[0], m[1]):
+                b.next_poll = min(b.next_poll, now + _next_poll_delay(b, m[0]))
+    due = [(b.next_poll, acct, b) for acct, b in live if not b.inflight and b.next_poll <= now]
+    if not due:
+        return
+    due.sort(key=lambda x: x[0])
+    for _, acct, b in due:
+        b.inflight = True
+        MONITOR_POOL.submit(_poll_job, acct, b)
 
-                if tp_id:
-                    st=_get_order_status(symbol, tp_id)
-                    if st=="FILLED":
-                        vwap,qty,fee,asset,rpn=_fetch_trades_for_order(symbol, tp_id)
-                        exec_log(sid,"CLOSE_TP",datetime.now(timezone.utc).isoformat().replace("+00:00","Z"),
-                                 vwap,qty,fee,asset,rpn,symbol,side,tp_id)
-                        _cancel_order_silent(symbol, sl_id, "tp_filled")
-                        with BR_LOCK: BRACKETS.pop(symbol,None)
-                        continue
-                if sl_id:
-                    st=_get_order_status(symbol, sl_id)
-                    if st=="FILLED":
-                        vwap,qty,fee,asset,rpn=_fetch_trades_for_order(symbol, sl_id)
-                        exec_log(sid,"CLOSE_SL",datetime.now(timezone.utc).isoformat().replace("+00:00","Z"),
-                                 vwap,qty,fee,asset,rpn,symbol,side,sl_id)
-                        _cancel_order_silent(symbol, tp_id, "sl_filled")
-                        with BR_LOCK: BRACKETS.pop(symbol,None)
-                        continue
-        except Exception as e:
-            techlog({"level":"warn","msg":"bracket_monitor_error","err":str(e)})
-        time.sleep(max(0.5, BRACKET_POLL_SEC))
+def _poll_job(acct: Account, b: Bracket):
+    t0 = time.perf_counter()
+    try:
+        with _use_account(acct), _use_signal(b.id):
+            _bracket_poll(b.symbol, b)
+    finally:
+        m = _MARKS.get(b.symbol)
+        px = m[0] if m else None
+        now = time.monotonic()
+        if m:
+            _observe_mark(b, m[0], m[1])
+        delay = _next_poll_delay(b, px)
+        b.next_poll = now + delay
+        b.inflight = False
+        M_MONITOR_SEC.observe(time.perf_counter() - t0)
+        M_POLL_DELAY.observe(delay)
+
+def _monitor_backlog() -> int:
+    now = time.monotonic()
+    return sum(1 for a in ACCOUNTS.values() for b in a.brackets.snapshot().values() if b.inflight or b.next_poll <= now)
+
+def _bracket_monitor_pass():
+    """Повний послідовний прохід по brackets поточного акаунта (без планувальника)."""
+    for symbol, b in _acct().brackets.snapshot().items():
+        with _use_signal(b.id):
+            _bracket_poll(symbol, b)
+
+def _bracket_poll(symbol, b: Bracket):
+    try:
+        sid=b.id; side=b.side
+        tp_id=b.tp_id; sl_id=b.sl_id
+
+        if _position_amt(symbol)==0.0:
+            entries, exits = _split_open_orders(symbol)
+            if entries:
+                techlog({"level":"debug","msg":"flat_but_entry_present","symbol":symbol,"entries":len(entries),"exits":len(exits)})
+                return
+            if exits:
+                for od in exits:
+                    oid = int(od.get("orderId", 0))
+                    _cancel_order_silent(symbol, oid, "pos_is_zero_exit_cleanup")
+                _bracket_drop(symbol, "flat_exit_cleanup")
+                techlog({"level":"info","msg":"exit_orphans_cleaned_flat","symbol":symbol,"count":len(exits)})
+                return
+            _bracket_drop(symbol, "flat_no_orders")
+            techlog({"level":"info","msg":"bracket_removed_flat_no_orders","symbol":symbol})
+            return
+
+        if tp_id:
+            st=_get_order_status(symbol, tp_id)
+            if st=="FILLED":
+                b.set_state(BR_CLOSING)
+                vwap,qty,fee,asset,rpn=_fetch_trades_for_order(symbol, tp_id)
+                exec_log(sid,"CLOSE_TP",datetime.now(timezone.utc).isoformat().replace("+00:00","Z"),
+                         vwap,qty,fee,asset,rpn,symbol,side,tp_id)
+                _cancel_order_silent(symbol, sl_id, "tp_filled")
+                _bracket_drop(symbol, "tp_filled")
+                return
+        if sl_id:
+            st=_get_order_status(symbol, sl_id)
+            if st=="FILLED":
+                b.set_state(BR_CLOSING)
+                vwap,qty,fee,asset,rpn=_fetch_trades_for_order(symbol, sl_id)
+                exec_log(sid,"CLOSE_SL",datetime.now(timezone.utc).isoformat().replace("+00:00","Z"),
+                         vwap,qty,fee,asset,rpn,symbol,side,sl_id)
+                _cancel_order_silent(symbol, tp_id, "sl_filled")
+                _bracket_drop(symbol, "sl_filled")
+                return
+    except Exception as e:
+        techlog({"level":"warn","msg":"bracket_monitor_error","symbol":symbol,"err":str(e)})
 
 # ====== ORPHAN SWEEPER & RECOVERY ======
+def _replay_journal() -> dict:
+    """
+    Відновлює BRACKETS поточного акаунта з журналу без REST для символів у стані exits_acked.
+    -> {symbol: signal_id} для «невизначених» символів (крах між наміром і підтвердженням),
+    які ще треба звірити з біржею.
+    """
+    acct = _acct(); t0 = time.perf_counter()
+    uncertain = {}; restored = 0
+    for s, r in JOURNAL.live(acct.name).items():
+        if r.get("e") == "handoff":
+            acct.handoffs[s] = r
+        elif r.get("e") == "exits_acked":
+            age = max(0.0, time.time() - (r.get("t") or time.time()))
+            acct.brackets.put(Bracket(s, r.get("id"), r.get("side"), BR_PROTECTED, r.get("tp_id"), r.get("sl_id"),
+                                      r.get("open_id") or 0, t_open=time.monotonic() - age,
+                                      tp=r.get("tp"), sl=r.get("sl")))
+            restored += 1
+        else:
+            uncertain[s] = r.get("id")
+    techlog({"level":"info","msg":"journal_replayed","restored":restored,"uncertain":sorted(uncertain),
+             "handoffs":sorted(acct.handoffs),
+             "ms":round((time.perf_counter() - t0)*1000, 2)})
+    return uncertain
+
 def _recover_state():
-    candidates = set([s for s in PRESET_SYMBOLS if s])
-    try:
-        all_open = _list_open_orders(symbol=None) or []
-        for od in all_open:
-            if "symbol" in od:
-                candidates.add(str(od["symbol"]).upper())
-    except:
-        pass
+    """
+    Є журнал -> відновлення з нього + REST-звірка лише невизначених символів;
+    журналу немає (перший запуск) -> скан усіх відкритих ордерів і позицій.
+    Стан біржі читається двома запитами (усі ордери + усі позиції), ролі ордерів — з тегу clientOrderId.
+    """
+    if JOURNAL is not None and JOURNAL.existed:
+        candidates = _replay_journal()
+        if not candidates:
+            return      # усе визначено журналом — жодного REST
+        orders_by_sym = _open_orders_by_symbol()
+        positions = _all_positions()
+    else:
+        orders_by_sym = _open_orders_by_symbol()
+        positions = _all_positions()
+        candidates = dict.fromkeys(s for s in PRESET_SYMBOLS if s)
+        for sy in list(orders_by_sym) + list(positions or ()):
+            candidates.setdefault(sy, None)
+    tags = {_sig_tag(sid): sid for sid in candidates.values() if sid}
     for s in sorted(candidates):
         try:
-            amt = _position_amt(s)
-            orders = _list_open_orders(s) or []
-            entries, exits = _split_open_orders(s)
-            if amt == 0.0:
+            orders = orders_by_sym.get(s, [])
+            signed = positions.get(s, 0.0) if positions is not None else _position_signed_amt(s)
+            entries, exits = _split_open_orders(s, orders)
+            if signed == 0.0:
                 if entries:
                     techlog({"level":"info","msg":"recover_flat_keep_entries","symbol":s,"entries":len(entries),"exits":len(exits)})
                     continue
@@ -528,65 +1520,70 @@ def _recover_state():
                     for od in exits:
                         _cancel_order_silent(s, int(od.get("orderId",0)), "recover_cleanup_exit_orphans")
                     techlog({"level":"info","msg":"recover_exit_orphans_cleaned","symbol":s,"count":len(exits)})
+                _bracket_drop(s, "recover_flat")
                 continue
             tp_id = sl_id = None
-            for od in orders:
-                typ = str(od.get("type","")).upper()
-                ro  = str(od.get("reduceOnly","")).lower() in ("true","1","yes")
-                cp  = str(od.get("closePosition","")).lower() in ("true","1","yes")
+            tp = sl = None
+            sid = candidates.get(s)
+            for od in exits:
+                role = _order_role(od)
                 oid = int(od.get("orderId",0))
-                if (typ=="LIMIT" and ro) or typ in ("TAKE_PROFIT","TAKE_PROFIT_MARKET"):
-                    tp_id = oid
-                if typ in ("STOP","STOP_MARKET") and (cp or ro):
-                    sl_id = oid
-            side = "long" if _position_signed_amt(s) > 0 else "short"
-            with BR_LOCK:
-                BRACKETS[s] = {
-                    "id": f"recover|{s}|{int(time.time())}",
-                    "side": side,
-                    "tp_id": tp_id,
-                    "sl_id": sl_id,
-                    "open_order_id": 0,
-                    "ts": datetime.now(timezone.utc).isoformat().replace("+00:00","Z")
-                }
-            techlog({"level":"info","msg":"state_recovered","symbol":s,"tp_id":tp_id,"sl_id":sl_id})
+                px  = float(od.get("stopPrice") or 0) or float(od.get("price") or 0) or None
+                if role == "tp":
+                    tp_id = oid; tp = px
+                elif role == "sl":
+                    sl_id = oid; sl = px
+                tag = parse_client_order_id(od.get("clientOrderId"))
+                if sid is None and tag is not None:
+                    sid = tags.get(tag[0])
+            side = "long" if signed > 0 else "short"
+            sid = sid or f"recover|{s}|{int(time.time())}"
+            _acct().brackets.put(Bracket(s, sid, side, BR_PROTECTED, tp_id, sl_id, tp=tp, sl=sl))
+            journal(s, "exits_acked", sid, side=side, open_id=0, tp_id=tp_id, sl_id=sl_id, tp=tp, sl=sl)
+            techlog({"level":"info","msg":"state_recovered","symbol":s,"id":sid,"tp_id":tp_id,"sl_id":sl_id})
         except Exception as e:
             techlog({"level":"warn","msg":"state_recover_failed","symbol":s,"err":str(e)})
 
 def _orphan_sweeper():
-    if not CANCEL_ORPHANS:
+    w = WORKERS["orphan_sweeper"]
+    while w.current():
+        with w.iteration():
+            for acct in _live_accounts():
+                with _use_account(acct):
+                    _orphan_sweeper_pass()
+        M_SWEEPER_SEC.observe(w.last_dur)
+        time.sleep(max(3.0, ORPHAN_SWEEP_SEC))
+
+def _orphan_sweeper_pass():
+    if DRAINING.is_set():
         return
-    while True:
-        try:
-            symbols = set()
+    try:
+        orders_by_sym = _open_orders_by_symbol()
+        if not orders_by_sym:
+            return
+        positions = _all_positions()
+        for s in sorted(orders_by_sym):
             try:
-                all_open = _list_open_orders(symbol=None) or []
-                for od in all_open:
-                    sy = str(od.get("symbol","")).upper()
-                    if sy: symbols.add(sy)
-            except:
-                symbols.update([s for s in PRESET_SYMBOLS if s])
-            for s in sorted(symbols):
-                try:
-                    if _position_amt(s) == 0.0:
-                        entries, exits = _split_open_orders(s)
-                        if (not entries) and exits:
-                            for od in exits:
-                                _cancel_order_silent(s, int(od.get("orderId",0)), "orphan_sweeper_exit_only")
-                            techlog({"level":"info","msg":"orphan_sweeper_exit_cleaned","symbol":s,"count":len(exits)})
-                except Exception as e:
-                    techlog({"level":"warn","msg":"orphan_sweep_symbol_failed","symbol":s,"err":str(e)})
-        except Exception as e:
-            techlog({"level":"warn","msg":"orphan_sweeper_failed","err":str(e)})
-        time.sleep(max(3.0, ORPHAN_SWEEP_SEC))
+                flat = (s not in positions) if positions is not None else _position_amt(s) == 0.0
+                if flat:
+                    entries, exits = _split_open_orders(s, orders_by_sym[s])
+                    if (not entries) and exits:
+                        for od in exits:
+                            _cancel_order_silent(s, int(od.get("orderId",0)), "orphan_sweeper_exit_only")
+                        techlog({"level":"info","msg":"orphan_sweeper_exit_cleaned","symbol":s,"count":len(exits)})
+            except Exception as e:
+                techlog({"level":"warn","msg":"orphan_sweep_symbol_failed","symbol":s,"err":str(e)})
+    except Exception as e:
+        techlog({"level":"warn","msg":"orphan_sweeper_failed","err":str(e)})
 
 # ====== RISK/QTY ======
 def compute_qty(symbol, price):
+    acct = _acct()
     bal = get_available_balance_usdt()
-    if RISK_MODE=="margin":
-        notional = bal*(RISK_PCT/100.0)*LEVERAGE
+    if acct.eff_risk_mode()=="margin":
+        notional = bal*(acct.eff_risk_pct()/100.0)*acct.eff_leverage()
     else:
-        notional = bal*(RISK_PCT/100.0)
+        notional = bal*(acct.eff_risk_pct()/100.0)
     qty_raw = notional/max(price, 1e-12)
     f=fetch_symbol_filters(symbol)
     step=f.get("stepSize") or 0.001
@@ -599,16 +1596,131 @@ def compute_qty(symbol, price):
     if qty<=0: raise RuntimeError("Computed qty <= 0")
     return qty
 
+# ====== EXECUTION PROFILES ======
+class ExecProfile:
+    """Параметри входу для символу; незадані поля беруться з глобальних ENV-значень."""
+    __slots__ = ("name", "entry_mode", "post_only", "offset_ticks", "offset_bps",
+                 "chase_ms", "chase_steps", "max_wait_sec", "max_dev_bps", "fallback")
+    FIELDS = {"entry_mode": str, "post_only": bool, "offset_ticks": int, "offset_bps": float,
+              "chase_ms": int, "chase_steps": int, "max_wait_sec": float, "max_dev_bps": float, "fallback": str}
+
+    def __init__(self, name="default", **kw):
+        self.name = name
+        self.entry_mode = ENTRY_MODE; self.post_only = POST_ONLY
+        self.offset_ticks = PRICE_OFFSET_TICKS; self.offset_bps = PRICE_OFFSET_BPS
+        self.chase_ms = CHASE_INTERVAL_MS; self.chase_steps = CHASE_STEPS
+        self.max_wait_sec = MAX_WAIT_SEC; self.max_dev_bps = MAX_DEVIATION_BPS
+        self.fallback = FALLBACK
+        for k, v in kw.items():
+            setattr(self, k, v)
+
+    def public(self) -> dict:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+def _parse_exec_profiles(specs) -> list:
+    """Валідація списку профілів -> [(patterns, ExecProfile)]; ValueError з поясненням."""
+    if not isinstance(specs, list):
+        raise ValueError("exec_profiles must be a list")
+    out = []
+    for i, sp in enumerate(specs):
+        if not isinstance(sp, dict) or not sp.get("match"):
+            raise ValueError(f"exec_profiles[{i}]: object with 'match' expected")
+        m = sp["match"]
+        m = m.split(",") if isinstance(m, str) else m
+        if not isinstance(m, list) or not all(isinstance(x, str) for x in m):
+            raise ValueError(f"exec_profiles[{i}]: match must be a string or a list of strings")
+        pats = [x.strip().upper() for x in m if x.strip()]
+        kw = {}
+        for k, v in sp.items():
+            if k in ("match", "name"):
+                continue
+            typ = ExecProfile.FIELDS.get(k)
+            if typ is None:
+                raise ValueError(f"exec_profiles[{i}]: unknown field {k}")
+            if typ is bool:
+                v = v if isinstance(v, bool) else str(v).lower() == "true"
+            else:
+                try: v = typ(v)
+                except (TypeError, ValueError): raise ValueError(f"exec_profiles[{i}]: {k} must be {typ.__name__}")
+            kw[k] = v.lower() if typ is str else v
+        if kw.get("entry_mode", "market") not in ("market", "limit", "maker_chase"):
+            raise ValueError(f"exec_profiles[{i}]: entry_mode must be market|limit|maker_chase")
+        if kw.get("fallback", "none") not in ("none", "market", "limit_ioc"):
+            raise ValueError(f"exec_profiles[{i}]: fallback must be none|market|limit_ioc")
+        out.append((pats, ExecProfile(str(sp.get("name") or ",".join(pats)), **kw)))
+    return out
+
+class ExecProfileTable:
+    """
+    Скомпільована таблиця: точні символи -> dict, glob-и -> один regex з іменованими групами
+    (перший збіг у порядку специфікації), результат кешується по символу.
+    Заміна таблиці при /config — атомарне присвоєння EXEC_PROFILES.
+    """
+    def __init__(self, specs=()):
+        self.specs = list(specs)
+        self.default = ExecProfile()
+        parsed = _parse_exec_profiles(self.specs)
+        self._exact = {}
+        self._globs = []
+        for order, (pats, prof) in enumerate(parsed):
+            for p in pats:
+                if any(c in p for c in "*?["):
+                    self._globs.append((order, re.compile(fnmatch.translate(p)), prof))
+                else:
+                    self._exact.setdefault(p, (order, prof))
+        self._cache = {}
+
+    def get(self, symbol) -> ExecProfile:
+        prof = self._cache.get(symbol)
+        if prof is not None:
+            return prof
+        best = self._exact.get(symbol)
+        for order, rx, p in self._globs:
+            if best is not None and best[0] < order:
+                break
+            if rx.match(symbol):
+                best = (order, p); break
+        prof = best[1] if best is not None else self.default
+        if len(self._cache) < 10000:
+            self._cache[symbol] = prof
+        return prof
+
+def _load_exec_profile_specs() -> list:
+    raw = EXEC_PROFILES_JSON
+    if EXEC_PROFILES_FILE:
+        try:
+            with open(EXEC_PROFILES_FILE, "r", encoding="utf-8") as f:
+                raw = f.read()
+        except Exception as e:
+            print("[WARN] Cannot read EXEC_PROFILES_FILE:", repr(e), flush=True)
+    if not raw.strip():
+        return []
+    try:
+        return json.loads(raw)
+    except Exception as e:
+        print("[WARN] Bad EXEC_PROFILES json:", repr(e), flush=True)
+        return []
+
+try:
+    EXEC_PROFILES = ExecProfileTable(_load_exec_profile_specs())
+except ValueError as e:
+    print("[WARN] Bad EXEC_PROFILES:", repr(e), flush=True)
+    EXEC_PROFILES = ExecProfileTable()
+
+def exec_profile(symbol) -> ExecProfile:
+    return EXEC_PROFILES.get(symbol)
+
 # ====== ORDER PRICE/OFFSET ======
-def _offset_price_from_book(symbol, side, tick):
+def _offset_price_from_book(symbol, side, tick, prof=None):
+    prof = prof or exec_profile(symbol)
     bid, ask = get_best_bid_ask(symbol)
-    if PRICE_OFFSET_BPS > 0:
+    if prof.offset_bps > 0:
         if side=="long":
-            base = bid; px = base*(1 - PRICE_OFFSET_BPS/10000.0)
+            base = bid; px = base*(1 - prof.offset_bps/10000.0)
         else:
-            base = ask; px = base*(1 + PRICE_OFFSET_BPS/10000.0)
+            base = ask; px = base*(1 + prof.offset_bps/10000.0)
     else:
-        off = max(1, PRICE_OFFSET_TICKS)
+        off = max(1, prof.offset_ticks)
         if side=="long":
             px = bid - off*tick
         else:
@@ -623,10 +1735,12 @@ def _place_exits(symbol, side, qty, tp_price, sl_price, signal_id):
     """
     exit_side = "SELL" if side=="long" else "BUY"
     tp_id = sl_id = None
+    journal(symbol, "exits_sent", signal_id, side=side)
     filt = fetch_symbol_filters(symbol)
     tick = filt.get("tickSize") or 0.0001
     try:
-        oTP = BINANCE.new_order(
+        oTP = _new_order(
+            client_order_id(signal_id, "T"),
             symbol=symbol, side=exit_side, type="TAKE_PROFIT_MARKET",
             stopPrice=p_floor_to_tick(tp_price, tick),
             closePosition="true", workingType="MARK_PRICE",
@@ -637,7 +1751,8 @@ def _place_exits(symbol, side, qty, tp_price, sl_price, signal_id):
     except Exception as e:
         techlog({"level":"warn","msg":"tp_take_profit_market_failed","symbol":symbol,"tp":tp_price,"err":str(e)})
     try:
-        oSL = BINANCE.new_order(
+        oSL = _new_order(
+            client_order_id(signal_id, "S"),
             symbol=symbol, side=exit_side, type="STOP_MARKET",
             stopPrice=p_floor_to_tick(sl_price, tick),
             closePosition="true", workingType="MARK_PRICE",
@@ -647,32 +1762,35 @@ def _place_exits(symbol, side, qty, tp_price, sl_price, signal_id):
         techlog({"level":"info","msg":"sl_stop_market_ok","symbol":symbol,"sl":sl_price,"sl_id":sl_id})
     except Exception as e:
         techlog({"level":"warn","msg":"sl_stop_market_failed","symbol":symbol,"sl":sl_price,"err":str(e)})
-    with BR_LOCK:
-        BRACKETS[symbol] = {
-            "id":signal_id,"side":side,"tp_id":tp_id,"sl_id":sl_id,
-            "open_order_id":BRACKETS.get(symbol,{}).get("open_order_id",0),
-            "ts":datetime.now(timezone.utc).isoformat().replace("+00:00","Z")
-        }
+    brackets = _acct().brackets
+    prev = brackets.get(symbol)
+    open_id = prev.open_order_id if prev is not None else 0
+    b = Bracket(symbol, signal_id, side, BR_PROTECTED, tp_id, sl_id, open_id,
+                t_open=prev.t_open if prev is not None and prev.id == signal_id else None,
+                tp=float(tp_price), sl=float(sl_price))
+    brackets.put(b)
+    journal(symbol, "exits_acked", signal_id, side=side, open_id=open_id, tp_id=tp_id, sl_id=sl_id,
+            tp=b.tp, sl=b.sl)
     techlog({"level":"info","msg":"bracket_seeded","symbol":symbol})
     return tp_id, sl_id
 
 # ====== ENTRY HELPERS ======
-def _entry_market(symbol, side, qty):
+def _entry_market(symbol, side, qty, cid=None):
     open_side="BUY" if side=="long" else "SELL"
-    o_open=BINANCE.new_order(symbol=symbol, side=open_side, type="MARKET",
-                             quantity=qty, newOrderRespType="RESULT")
+    o_open=_new_order(cid, symbol=symbol, side=open_side, type="MARKET",
+                      quantity=qty, newOrderRespType="RESULT")
     return int(o_open.get("orderId") or 0)
 
-def _entry_limit(symbol, side, qty, price, tif="GTC"):
+def _entry_limit(symbol, side, qty, price, tif="GTC", cid=None):
     filt = fetch_symbol_filters(symbol)
     tick = filt.get("tickSize") or 0.0001
     step = filt.get("stepSize") or 0.001
     price = p_floor_to_tick(price, tick)
     qty   = q_floor_to_step(qty, step)
     open_side="BUY" if side=="long" else "SELL"
-    o = BINANCE.new_order(symbol=symbol, side=open_side, type="LIMIT",
-                          price=price, quantity=qty, timeInForce=tif,
-                          newOrderRespType="RESULT")
+    o = _new_order(cid, symbol=symbol, side=open_side, type="LIMIT",
+                   price=price, quantity=qty, timeInForce=tif,
+                   newOrderRespType="RESULT")
     status = str(o.get("status","")).upper()
     oid = int(o.get("orderId") or 0)
     if status in ("REJECTED","EXPIRED","CANCELED") or oid == 0:
@@ -694,15 +1812,22 @@ def _within_deviation(entry_ref, side, max_bps):
     techlog({"level":"info","msg":"deviation_exceeded","sym":entry_ref["symbol"],"dev_bps":dev,"max_bps":max_bps})
     return False
 
-def _try_cancel_replace(symbol, side, old_order_id, remain_qty, tif, tick):
-    new_price = _offset_price_from_book(symbol, side, tick)
+def _try_cancel_replace(symbol, side, old_order_id, remain_qty, tif, tick, prof=None, cid=None, counted_qty=0.0):
+    """
+    -> (order_id, atomic, late_fill). Неатомарно: спершу дочікуємось скасування старої лімітки,
+    дочитуємо її executedQty і зменшуємо заміну на долив понад counted_qty (уже врахований).
+    Якщо старий ордер FILLED або скасування не підтверджене — заміни немає, повертається старий id.
+    """
+    new_price = _offset_price_from_book(symbol, side, tick, prof)
     open_side = "BUY" if side=="long" else "SELL"
     if REPRICE_ATOMIC:
         for m in ("cancel_replace", "cancel_replace_order", "cancelReplace"):
             if hasattr(BINANCE, m):
                 try:
                     fn = getattr(BINANCE, m)
+                    extra = {"newClientOrderId": cid} if cid else {}
                     resp = fn(
+                        **extra,
                         symbol=symbol,
                         cancelReplaceMode="STOP_ON_FAILURE",
                         cancelOrderId=old_order_id,
@@ -725,28 +1850,69 @@ def _try_cancel_replace(symbol, side, old_order_id, remain_qty, tif, tick):
                                 new_id = v; break
                     if new_id:
                         techlog({"level":"info","msg":"entry_reprice_atomic_ok","symbol":symbol,"price":new_price,"remain":remain_qty,"id":new_id})
-                        return new_id, True
+                        return new_id, True, 0.0
                 except Exception as e:
                     techlog({"level":"warn","msg":"entry_reprice_atomic_failed","symbol":symbol,"err":str(e)})
                     break
+    late = 0.0
     if old_order_id:
-        _cancel_order_silent(symbol, old_order_id, "chase_reprice")
-    new_id = _entry_limit(symbol, side, remain_qty, new_price, tif=tif)
-    techlog({"level":"info","msg":"entry_repriced","symbol":symbol,"price":new_price,"remain":remain_qty,"id":new_id})
-    return new_id, False
-
-def _entry_maker_chase(symbol, side, qty, tick, signal_id, ref_price):
-    tif = "GTX" if POST_ONLY else "GTC"
-    price = _offset_price_from_book(symbol, side, tick)
-    order_id = _entry_limit(symbol, side, qty, price, tif=tif)
-    techlog({"level":"info","msg":"entry_limit_seeded","symbol":symbol,"side":side,"qty":qty,"price":price,"tif":tif,"id":order_id})
-
-    start = time.time()
-    filled_qty = 0.0
-    steps_done = 0
+        # заміна лише після підтвердженого скасування: інакше долив старої + нова = перевхід
+        cancelled = _cancel_order_silent(symbol, old_order_id, "chase_reprice", wait=True)
+        od, ok = _safe_get_order(symbol, old_order_id)
+        status = str(od.get("status","")).upper() if ok else ""
+        try: exec_qty = float(od.get("executedQty") or 0.0) if ok else 0.0
+        except (TypeError, ValueError): exec_qty = 0.0
+        late = max(0.0, exec_qty - (counted_qty or 0.0))
+        remain_qty = max(0.0, remain_qty - late)
+        if status == "FILLED" or remain_qty <= 0:
+            techlog({"level":"info","msg":"entry_reprice_skipped_filled","symbol":symbol,"id":old_order_id,"late_fill":late})
+            return old_order_id, False, late
+        if not cancelled and status not in ("CANCELED","EXPIRED","REJECTED"):
+            techlog({"level":"warn","msg":"entry_reprice_skipped_cancel_unconfirmed","symbol":symbol,
+                     "id":old_order_id,"status":status or None})
+            return old_order_id, False, late
+    new_id = _entry_limit(symbol, side, remain_qty, new_price, tif=tif, cid=cid)
+    techlog({"level":"info","msg":"entry_repriced","symbol":symbol,"price":new_price,"remain":remain_qty,
+             "late_fill":late,"id":new_id})
+    return new_id, False, late
+
+def _chase_observe(steps, filled, qty):
+    M_CHASE_STEPS.observe(steps)
+    M_CHASE_FILL.observe(min(1.0, (filled or 0.0)/qty) if qty else 0.0)
+
+class ChaseHandoff(Exception):
+    """Drain посеред chase: лімітка лишається на біржі, стан іде наступнику через журнал."""
+    def __init__(self, state: dict):
+        super().__init__("chase handed off")
+        self.state = state
+
+def _entry_maker_chase(symbol, side, qty, tick, signal_id, ref_price, prof=None, resume=None):
+    """resume — стан із журнального запису handoff: продовжити chase попереднього процесу з його ордером."""
+    prof = prof or exec_profile(symbol)
+    tif = "GTX" if prof.post_only else "GTC"
+    if resume:
+        order_id = int(resume.get("order_id") or 0)
+        attempt = int(resume.get("attempt") or 0)
+        filled_qty = float(resume.get("filled") or 0.0)
+        counted = float(resume.get("counted", filled_qty) or 0.0)
+        steps_done = int(resume.get("steps") or 0)
+        start = time.time() - float(resume.get("elapsed") or 0.0)
+        techlog({"level":"info","msg":"entry_chase_resumed","symbol":symbol,"id":order_id,"steps":steps_done,"filled":filled_qty})
+    else:
+        price = _offset_price_from_book(symbol, side, tick, prof)
+        attempt = 0
+        order_id = _entry_limit(symbol, side, qty, price, tif=tif, cid=client_order_id(signal_id, "L", attempt))
+        techlog({"level":"info","msg":"entry_limit_seeded","symbol":symbol,"side":side,"qty":qty,"price":price,"tif":tif,"id":order_id})
+        start = time.time()
+        filled_qty = 0.0
+        counted = 0.0           # executedQty поточного ордера, уже включена у filled_qty
+        steps_done = 0
 
     while True:
-        time.sleep(max(0.05, CHASE_INTERVAL_MS/1000.0))
+        if DRAINING.is_set():
+            raise ChaseHandoff({"order_id":order_id, "attempt":attempt, "filled":filled_qty, "counted":counted, "steps":steps_done,
+                                "elapsed":round(time.time() - start, 3)})
+        time.sleep(max(0.05, prof.chase_ms/1000.0))
         steps_done += 1
 
         # Якщо seed одразу відхилився (GTX), не намагаємось читати get_order
@@ -754,51 +1920,85 @@ def _entry_maker_chase(symbol, side, qty, tick, signal_id, ref_price):
             techlog({"level":"info","msg":"seed_rejected_retry",
                      "symbol":symbol,"reason":"order_rejected_or_not_found","mode":tif})
             remain = max(0.0, qty - filled_qty)
-            order_id, _ = _try_cancel_replace(symbol, side, 0, remain, tif, tick)
+            attempt += 1
+            order_id, _, _ = _try_cancel_replace(symbol, side, 0, remain, tif, tick, prof,
+                                                 cid=client_order_id(signal_id, "L", attempt))
+            counted = 0.0
             continue
 
         st = _get_order_status(symbol, order_id)
+        if st == "UNKNOWN":
+            # не перевиставляємо наосліп: чекаємо наступного кроку, в межах ліміту часу/кроків
+            if time.time()-start >= prof.max_wait_sec or steps_done >= prof.chase_steps:
+                break
+            continue
         if st in ("REJECTED","CANCELED","EXPIRED"):
             techlog({"level":"info","msg":"entry_status_rejected_retry",
                      "symbol":symbol,"order_id":order_id,"status":st,"mode":tif,
                      "reason":"order_rejected_or_not_found"})
             remain = max(0.0, qty - filled_qty)
-            order_id, _ = _try_cancel_replace(symbol, side, order_id, remain, tif, tick)
+            attempt += 1
+            new_id, _, late = _try_cancel_replace(symbol, side, order_id, remain, tif, tick, prof,
+                                                  cid=client_order_id(signal_id, "L", attempt), counted_qty=counted)
+            filled_qty += late
+            if new_id != order_id:
+                order_id, counted = new_id, 0.0
+            else:
+                counted += late
             continue
 
         eq = _get_order_exec_qty(symbol, order_id) if st in ("PARTIALLY_FILLED","FILLED") else 0.0
-        filled_qty = max(filled_qty, eq or 0.0)
+        if (eq or 0.0) > counted:
+            filled_qty += eq - counted; counted = eq
 
         if st=="FILLED":
             techlog({"level":"info","msg":"entry_filled","symbol":symbol,"id":order_id,"filled":filled_qty,"steps":steps_done})
+            _chase_observe(steps_done, filled_qty, qty)
             return order_id, filled_qty
 
-        if (time.time()-start >= MAX_WAIT_SEC) or (steps_done >= CHASE_STEPS) or (not _within_deviation(
-            {"symbol":symbol,"ref_price":ref_price}, side, MAX_DEVIATION_BPS)):
+        if (time.time()-start >= prof.max_wait_sec) or (steps_done >= prof.chase_steps) or (not _within_deviation(
+            {"symbol":symbol,"ref_price":ref_price}, side, prof.max_dev_bps)):
             break
 
         remain = max(0.0, qty - (filled_qty or 0.0))
         if remain <= 0:
+            _chase_observe(steps_done, filled_qty, qty)
             return order_id, filled_qty
 
         try:
-            order_id, _ = _try_cancel_replace(symbol, side, order_id, remain, tif, tick)
+            attempt += 1
+            new_id, _, late = _try_cancel_replace(symbol, side, order_id, remain, tif, tick, prof,
+                                                  cid=client_order_id(signal_id, "L", attempt), counted_qty=counted)
+            filled_qty += late
+            if new_id != order_id:
+                order_id, counted = new_id, 0.0
+            else:
+                counted += late
+                if filled_qty >= qty:
+                    techlog({"level":"info","msg":"entry_filled","symbol":symbol,"id":order_id,"filled":filled_qty,"steps":steps_done})
+                    _chase_observe(steps_done, filled_qty, qty)
+                    return order_id, filled_qty
         except Exception as e:
             techlog({"level":"warn","msg":"entry_reprice_failed","err":str(e)})
 
     remain = max(0.0, qty - (filled_qty or 0.0))
     if remain > 0:
-        try: _cancel_order_silent(symbol, order_id, "fallback")
-        except: pass
-    if FALLBACK == "market" and remain > 0:
-        fb_id = _entry_market(symbol, side, remain)
+        # перед добором має бути певність, що лімітка вже не доллється; долив під час скасування — врахувати
+        _cancel_order_silent(symbol, order_id, "fallback", wait=True)
+        eq = _get_order_exec_qty(symbol, order_id) if order_id else 0.0
+        if (eq or 0.0) > counted:
+            filled_qty += eq - counted; counted = eq
+            remain = max(0.0, qty - filled_qty)
+    _chase_observe(steps_done, filled_qty, qty)
+    if prof.fallback == "market" and remain > 0:
+        fb_id = _entry_market(symbol, side, remain, cid=client_order_id(signal_id, "F"))
         techlog({"level":"info","msg":"fallback_market_done","symbol":symbol,"remain":remain,"id":fb_id})
         return fb_id, qty
-    elif FALLBACK == "limit_ioc" and remain > 0:
+    elif prof.fallback == "limit_ioc" and remain > 0:
         tif = "IOC"
-        fb_price = _offset_price_from_book(symbol, side, tick)
-        fb = BINANCE.new_order(symbol=symbol, side=("BUY" if side=="long" else "SELL"), type="LIMIT",
-                               price=fb_price, quantity=remain, timeInForce=tif, newOrderRespType="RESULT")
+        fb_price = _offset_price_from_book(symbol, side, tick, prof)
+        fb = _new_order(client_order_id(signal_id, "F"), symbol=symbol, side=("BUY" if side=="long" else "SELL"),
+                        type="LIMIT", price=fb_price, quantity=remain, timeInForce=tif, newOrderRespType="RESULT")
         fb_id = int(fb.get("orderId") or 0)
         time.sleep(0.2)
         eq = _get_order_exec_qty(symbol, fb_id)
@@ -818,9 +2018,9 @@ def _format_price_for_key(val: float, tick: float|None) -> str:
         v = p_floor_to_tick(v, tick)
     return "{:.10f}".format(v)
 
-def build_id(symbol: str, pattern: str, side: str, time_raw, entry_val, tp_val, sl_val):
+def build_id(symbol: str, pattern: str, side: str, time_raw, entry_val, tp_val, sl_val, t_iso=None):
     sym = str(symbol).upper()
-    t_iso = to_iso8601(time_raw)
+    t_iso = t_iso or to_iso8601(time_raw)
     tick = None
     try:
         if BINANCE:
@@ -833,73 +2033,631 @@ def build_id(symbol: str, pattern: str, side: str, time_raw, entry_val, tp_val,
     sl_str = _format_price_for_key(sl_val, tick)
     return f"{sym}|{pattern}|{side}|{t_iso}|e:{e_str}|tp:{tp_str}|sl:{sl_str}"
 
+class DedupStore:
+    """
+    Ключі — 64-бітні blake2b-дайджести, значення — час експірації (int, сек).
+    TTL однаковий для всіх, тож порядок вставки = порядок експірації: протухлі
+    знімаються з голови deque за O(1). Кількість обмежена max_keys.
+    Знімок: 12 байт на ключ (u64 digest + u32 expiry), атомарний os.replace,
+    при збереженні зливається з файлом інших воркерів — під flock на <path>.lock,
+    інакше два воркери, що пишуть одночасно, гублять нові ключі один одного.
+    """
+    _REC = struct.Struct("<QI")
+
+    def __init__(self, path, ttl_sec, max_keys):
+        self.path = path
+        self.ttl = max(1, int(ttl_sec))
+        self.max_keys = max_keys
+        self._exp = {}
+        self._order = deque()
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._last_exp = 0
+
+    @staticmethod
+    def digest(key: str) -> int:
+        return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little")
+
+    def __len__(self):
+        return len(self._exp)
+
+    def clear(self):
+        with self._lock:
+            self._exp.clear(); self._order.clear(); self._dirty = True
+
+    def _expire(self, now: int):
+        exp, order = self._exp, self._order
+        while order and (len(exp) > self.max_keys or exp.get(order[0], 0) <= now):
+            exp.pop(order.popleft(), None)
+
+    def seen(self, key: str) -> bool:
+        """Атомарно: True, якщо ключ уже є й не протух; інакше вставляє його."""
+        d = self.digest(key)
+        now = int(time.time())
+        with self._lock:
+            self._expire(now)
+            if d in self._exp:
+                return True
+            e = now + self.ttl
+            if e != self._last_exp:
+                self._last_exp = e
+            # один int-об'єкт на секунду, а не на ключ
+            self._exp[d] = self._last_exp
+            self._order.append(d)
+            self._dirty = True
+            if len(self._exp) > self.max_keys:
+                self._expire(now)
+            return False
+
+    def load(self):
+        now = int(time.time()); recs = []
+        try:
+            with open(self.path, "rb") as f:
+                buf = f.read()
+            recs = [r for r in self._REC.iter_unpack(buf[:len(buf) - len(buf) % self._REC.size]) if r[1] > now]
+        except FileNotFoundError:
+            return 0
+        except Exception as e:
+            techlog({"level":"warn","msg":"dedup_load_failed","err":str(e),"path":self.path})
+            return 0
+        recs.sort(key=lambda r: r[1])
+        with self._lock:
+            for d, e in recs[-self.max_keys:]:
+                if d not in self._exp:
+                    self._order.append(d)
+                self._exp[d] = max(e, self._exp.get(d, 0))
+        return len(recs)
+
+    @contextmanager
+    def _file_lock(self, wait_sec=2.0):
+        """Ексклюзивний flock на <path>.lock на час read-merge-replace -> True, якщо взято."""
+        if fcntl is None:
+            yield True
+            return
+        with open(self.path + ".lock", "a") as lf:
+            deadline = time.monotonic() + wait_sec
+            while True:
+                try:
+                    fcntl.flock(lf.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except OSError:
+                    if time.monotonic() >= deadline:
+                        yield False
+                        return
+                    time.sleep(0.02)
+            try:
+                yield True
+            finally:
+                fcntl.flock(lf.fileno(), fcntl.LOCK_UN)
+
+    def snapshot(self, force=False):
+        with self._lock:
+            if not (self._dirty or force):
+                return
+            self._dirty = False
+            self._expire(int(time.time()))
+            items = dict(self._exp)
+        with self._file_lock() as locked:
+            if not locked:
+                self._dirty = True      # наступний прохід спробує знову
+                techlog({"level":"warn","msg":"dedup_snapshot_lock_timeout","path":self.path})
+                return
+            self._merge_write(items)
+
+    def _merge_write(self, items):
+        now = int(time.time())
+        try:
+            with open(self.path, "rb") as f:
+                buf = f.read()
+            for d, e in self._REC.iter_unpack(buf[:len(buf) - len(buf) % self._REC.size]):
+                if e > now and e > items.get(d, 0):
+                    items[d] = e
+        except FileNotFoundError:
+            pass
+        except Exception:
+            pass
+        if len(items) > self.max_keys:
+            items = dict(sorted(items.items(), key=lambda kv: kv[1])[-self.max_keys:])
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(b"".join(self._REC.pack(d, e) for d, e in items.items()))
+            os.replace(tmp, self.path)
+        except Exception as e:
+            self._dirty = True
+            techlog({"level":"warn","msg":"dedup_snapshot_failed","err":str(e),"path":self.path})
+
+# вікно дедупа = вікно свіжості сигналу; старіші повтори відсіче _check_signal_freshness
+DEDUP = DedupStore(DEDUP_PATH, MAX_SIGNAL_AGE_SEC + ALLOW_FUTURE_SKEW_SEC + 5, MAX_KEYS)
+
 def dedup_seen(key:str)->bool:
-    if key in DEDUP:
-        DEDUP.move_to_end(key); return True
-    DEDUP[key]=True
-    if len(DEDUP)>MAX_KEYS: DEDUP.popitem(last=False)
-    return False
+    return DEDUP.seen(key)
+
+def _dedup_snapshotter():
+    w = WORKERS["dedup_snapshotter"]
+    while w.current():
+        time.sleep(max(0.2, DEDUP_SNAPSHOT_SEC))
+        with w.iteration():
+            DEDUP.snapshot()
+
+_n = DEDUP.load()
+if _n:
+    techlog({"level":"info","msg":"dedup_restored","keys":_n,"path":DEDUP_PATH})
+atexit.register(DEDUP.snapshot, True)
+_spawn_worker("dedup_snapshotter", _dedup_snapshotter, interval=max(0.2, DEDUP_SNAPSHOT_SEC))
+
+# ====== ORDER JOURNAL (write-ahead) ======
+class IntentJournal:
+    """
+    Append-only JSONL журнал намірів/підтверджень по (акаунт, символ):
+    accepted -> entry_sent -> entry_acked -> exits_sent -> exits_acked -> closed.
+    Записи пише один потік пачками (group commit): один write+fsync на пачку,
+    а append(sync=True) чекає, доки його запис стане durable.
+    state — останній запис по кожному ключу; з нього відновлюються BRACKETS після рестарту
+    і будується компактний журнал (лише незакриті ключі).
+    """
+    CERTAIN = ("exits_acked", "closed")
+
+    def __init__(self, path, fsync=True, compact_bytes=1024*1024):
+        self.path = path
+        self.fsync = fsync
+        self.compact_bytes = compact_bytes
+        self.state = {}            # (acct, symbol) -> останній запис
+        self.existed = False       # журнал був на диску при старті
+        self._q = []
+        self._cv = threading.Condition()
+        self._wlock = threading.Lock()   # одна пачка за раз, навіть якщо watchdog замінив завислий writer
+        self._seq = 0
+        self._durable = 0
+        self._f = None
+        self._lockf = None
+        self.sealed = False        # журнал передано наступнику — далі не пишемо
+
+    def acquire(self, wait_sec: float) -> bool:
+        """
+        Ексклюзивний flock на <journal>.lock: журнал пише лише один процес. Наступник чекає,
+        доки попередник завершить drain і відпустить lock (або помре — тоді lock знімає ОС).
+        """
+        if fcntl is None:
+            return True
+        self._lockf = open(self.path + ".lock", "a")
+        deadline = time.monotonic() + wait_sec
+        while True:
+            try:
+                fcntl.flock(self._lockf.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except OSError:
+                if time.monotonic() >= deadline:
+                    return False
+                time.sleep(0.1)
+
+    def seal(self, timeout=2.0):
+        """Фінальний flush і передача журналу: lock відпускається, подальші append ігноруються."""
+        self.flush(timeout)
+        with self._cv:
+            self.sealed = True
+        if self._lockf is not None:
+            fcntl.flock(self._lockf.fileno(), fcntl.LOCK_UN)
+            self._lockf.close(); self._lockf = None
+
+    def _apply(self, rec):
+        self.state[(rec.get("a") or "main", rec.get("s"))] = rec
+
+    def load(self) -> int:
+        n = 0
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.existed = True
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        continue    # обірваний хвіст після краху
+                    self._apply(rec); n += 1
+        except FileNotFoundError:
+            pass
+        return n
+
+    def live(self, acct_name) -> dict:
+        """{symbol: останній запис} для незакритих ключів акаунта."""
+        with self._cv:
+            return {s: r for (a, s), r in self.state.items() if a == acct_name and r.get("e") != "closed"}
+
+    def live_count(self) -> int:
+        """Кількість незакритих ключів усіх акаунтів (state змінюється під _cv потоками append/writer)."""
+        with self._cv:
+            return sum(1 for r in self.state.values() if r.get("e") != "closed")
+
+    def is_live(self, acct_name, symbol) -> bool:
+        r = self.state.get((acct_name, symbol))
+        return r is not None and r.get("e") != "closed"
+
+    def _compact_locked(self):
+        recs = [r for r in self.state.values() if r.get("e") != "closed"]
+        self.state = {(r.get("a") or "main", r.get("s")): r for r in recs}
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write("".join(json.dumps(r, separators=(",", ":")) + "\n" for r in recs))
+            f.flush()
+            if self.fsync: os.fsync(f.fileno())
+        if self._f: self._f.close()
+        os.replace(tmp, self.path)
+        self._f = open(self.path, "a", encoding="utf-8")
+
+    def start(self):
+        if fcntl is not None and self._lockf is None:
+            raise RuntimeError("journal lock not held")     # компакція без lock перетре файл живого власника
+        with self._cv:
+            self._compact_locked()
+        _spawn_worker("journal_writer", self._writer, backlog_fn=lambda: len(self._q))
+
+    def append(self, rec: dict, sync=False):
+        with self._cv:
+            if self.sealed:
+                return
+            self._apply(rec)
+            self._q.append(rec)
+            self._seq += 1; seq = self._seq
+            self._cv.notify_all()
+            if sync and self.fsync and self._f is not None:
+                deadline = time.time() + 2.0
+                while self._durable < seq and time.time() < deadline:
+                    self._cv.wait(0.5)
+
+    def _writer(self):
+        w = WORKERS["journal_writer"]
+        while w.current():
+            # пачка береться під _wlock: порядок у файлі = порядок черги, а замінений потік,
+            # що прокинувся, бачить чужу генерацію й виходить, нічого не записавши
+            with self._wlock:
+                with self._cv:
+                    while not self._q and w.current():
+                        self._cv.wait(1.0)
+                    if not w.current():
+                        return
+                    batch, self._q = self._q, []
+                    upto = self._seq
+                with w.iteration():
+                    self._commit(batch, upto)
+
+    def _commit(self, batch, upto):
+        t0 = time.perf_counter()
+        try:
+            self._f.write("".join(json.dumps(r, separators=(",", ":"), ensure_ascii=False) + "\n" for r in batch))
+            self._f.flush()
+            if self.fsync: os.fsync(self._f.fileno())
+        except Exception as e:
+            techlog({"level":"error","msg":"journal_write_failed","err":str(e),"records":len(batch)})
+        M_JOURNAL_SEC.observe(time.perf_counter() - t0)
+        with self._cv:
+            self._durable = max(self._durable, upto)
+            self._cv.notify_all()
+            try:
+                if self._f.tell() > self.compact_bytes:
+                    self._compact_locked()
+            except Exception as e:
+                techlog({"level":"warn","msg":"journal_compact_failed","err":str(e)})
 
-# ====== REPORT ENDPOINT (з поштою) ======
-try:
-    import daily_report as DR
-except Exception:
-    DR = None
+    def flush(self, timeout=2.0):
+        with self._cv:
+            seq = self._seq
+            deadline = time.time() + timeout
+            while self._durable < seq and time.time() < deadline:
+                self._cv.wait(0.2)
 
-try:
-    from send_mail import send_file as send_mail_file
-except Exception:
-    send_mail_file = None
+JOURNAL = None
+JOURNAL_LOCK_FAILED = False     # журнал тримає інший процес — цей воркер не торгує
+
+def journal(symbol, event, signal_id, sync=False, **fields):
+    """Запис у журнал від імені поточного акаунта; sync=True — write-ahead (чекає fsync)."""
+    if JOURNAL is None:
+        return
+    rec = {"t": round(time.time(), 3), "a": _acct().name, "s": symbol, "e": event, "id": signal_id}
+    rec.update(fields)
+    JOURNAL.append(rec, sync=sync)
+
+def _bracket_drop(symbol, reason):
+    """Прибирає bracket поточного акаунта й фіксує closed у журналі."""
+    acct = _acct()
+    b = acct.brackets.pop(symbol)
+    if JOURNAL is not None and (b is not None or JOURNAL.is_live(acct.name, symbol)):
+        journal(symbol, "closed", b.id if b is not None else None, reason=reason)
+
+def _init_journal():
+    """
+    Журнал відкривається лише з увімкненою торгівлею і лише під lock. Не дочекались lock —
+    fail closed: журнал не читаємо й не компактуємо, торгівлю в цьому воркері вимкнено.
+    """
+    global JOURNAL, JOURNAL_LOCK_FAILED, BINANCE_ENABLED
+    if not JOURNAL_PATH or JOURNAL is not None:
+        return JOURNAL
+    j = IntentJournal(JOURNAL_PATH, JOURNAL_FSYNC, JOURNAL_COMPACT_BYTES)
+    try:
+        t0 = time.monotonic()
+        if not j.acquire(HANDOFF_WAIT_SEC):
+            JOURNAL_LOCK_FAILED = True; BINANCE_ENABLED = False
+            techlog({"level":"error","msg":"journal_lock_timeout","path":JOURNAL_PATH,"wait_sec":HANDOFF_WAIT_SEC,
+                     "action":"trading_disabled"})
+            return None
+        if time.monotonic() - t0 > 0.5:
+            techlog({"level":"info","msg":"journal_handoff_waited","sec":round(time.monotonic() - t0, 3)})
+        n = j.load()
+        j.start()
+        atexit.register(j.flush)
+        if n:
+            techlog({"level":"info","msg":"journal_loaded","records":n,"live":len(j.state),"path":JOURNAL_PATH})
+        JOURNAL = j
+    except Exception as e:
+        techlog({"level":"error","msg":"journal_init_failed","err":str(e),"path":JOURNAL_PATH})
+    return JOURNAL
+
+if BINANCE_ENABLED:
+    _init_journal()
+
+# ====== GRACEFUL DRAIN ======
+# SIGTERM (gunicorn recycle/deploy): нові сигнали -> 503, chase-и віддають свою лімітку через журнал
+# (запис handoff), монітор зупиняється; на виході журнал flush-иться і lock переходить наступнику,
+# який відновлює brackets і продовжує chase-и без REST-пошуку.
+DRAINING = threading.Event()
+_INFLIGHT = [0]
+_INFLIGHT_CV = threading.Condition()
+
+@contextmanager
+def _inflight():
+    with _INFLIGHT_CV:
+        _INFLIGHT[0] += 1
+    try:
+        yield
+    finally:
+        with _INFLIGHT_CV:
+            _INFLIGHT[0] -= 1
+            _INFLIGHT_CV.notify_all()
+
+def _begin_drain(reason: str):
+    if DRAINING.is_set():
+        return
+    DRAINING.set()
+    techlog({"level":"info","msg":"drain_started","reason":reason,"inflight":_INFLIGHT[0]})
+
+def _finish_drain():
+    """atexit: дочекатись in-flight входів (chase-и перериваються й пишуть handoff), віддати журнал."""
+    quiet = not DRAINING.is_set() and _INFLIGHT[0] == 0     # звичайний вихід (CLI, replay) — без шуму в techlog
+    if quiet:
+        DRAINING.set()
+    else:
+        _begin_drain("exit")
+    t0 = time.monotonic()
+    with _INFLIGHT_CV:
+        while _INFLIGHT[0] > 0 and time.monotonic() - t0 < DRAIN_TIMEOUT_SEC:
+            _INFLIGHT_CV.wait(0.2)
+        left = _INFLIGHT[0]
+    if JOURNAL is not None:
+        JOURNAL.seal()
+    if quiet:
+        return
+    techlog({"level":"info" if not left else "warn","msg":"drain_done","inflight_left":left,
+             "sec":round(time.monotonic() - t0, 3)})
+
+def _install_drain_handler():
+    """Ланцюжком перед попереднім обробником (у gunicorn — обробник воркера)."""
+    if threading.current_thread() is not threading.main_thread():
+        return
+    prev = signal.getsignal(signal.SIGTERM)
+    def on_term(signum, frame):
+        _begin_drain("sigterm")
+        if callable(prev):
+            prev(signum, frame)
+        elif prev == signal.SIG_DFL:
+            raise SystemExit(128 + signum)
+    signal.signal(signal.SIGTERM, on_term)
+
+atexit.register(_finish_drain)
+_install_drain_handler()
+
+# ====== REPORT ENDPOINT (з поштою) ======
+# pandas не імпортується у воркер: звіт будує окремий процес daily_report.py (REPORT_MODE=subprocess)
+# або модуль вантажиться ліниво при першому звіті (REPORT_MODE=inline).
+REPORT_MODE        = os.environ.get("REPORT_MODE", "subprocess").lower()     # subprocess | inline
+REPORT_TIMEOUT_SEC = float(os.environ.get("REPORT_TIMEOUT_SEC", "120"))
+REPORT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "daily_report.py")
+REPORT_LOCK = threading.Lock()
+_DR = None
 
 from zoneinfo import ZoneInfo
 KYIV = ZoneInfo("Europe/Kyiv")
 
+def _daily_report():
+    """Лінивий імпорт daily_report (і pandas) для REPORT_MODE=inline."""
+    global _DR
+    if _DR is None:
+        import daily_report
+        _DR = daily_report
+    return _DR
+
+def _report_execs(account=None):
+    """Exec-логи для звітів ["акаунт=шлях", ...]: main, усі теки logs/accounts/* (і вимкнені акаунти) та налаштовані акаунти.
+    account — лише один з них; None, якщо такого немає."""
+    srcs = OrderedDict([("main", EXEC_PATH)])
+    for d in sorted(glob.glob(os.path.join(LOG_DIR, "accounts", "*", ""))):
+        srcs.setdefault(os.path.basename(os.path.dirname(d)), os.path.join(d, EXEC_LOG))
+    for a in ACCOUNTS.values():
+        srcs.setdefault(a.name, a.exec_path)
+    if account:
+        if account not in srcs:
+            return None
+        srcs = {account: srcs[account]}
+    return [f"{name}={path}" for name, path in srcs.items()]
+
+def _report_subdir(base, account=None):
+    return os.path.join(base, "accounts", account) if account else base
+
+def _build_daily_report(day, signals_glob, execs, out_dir=None):
+    """-> (rows, out_path). Викликати під REPORT_LOCK."""
+    out_dir = out_dir or REPORT_DIR
+    os.makedirs(out_dir, exist_ok=True)
+    if REPORT_MODE == "inline":
+        DR = _daily_report()
+        daily = DR.build_daily(DR.load_signals(signals_glob), DR.load_execs(execs), day)
+        out_path = os.path.join(out_dir, f"daily_trades_{day}.csv")
+        daily.to_csv(out_path, index=False)
+        return int(daily.shape[0]), out_path
+    import subprocess, sys
+    cp = subprocess.run([sys.executable, REPORT_SCRIPT, "--signals", signals_glob, "--execs", *execs,
+                         "--date", day, "--outdir", out_dir],
+                        capture_output=True, text=True, timeout=REPORT_TIMEOUT_SEC)
+    if cp.returncode != 0:
+        raise RuntimeError((cp.stderr or cp.stdout or f"exit {cp.returncode}").strip().splitlines()[-1])
+    m = re.search(r"Written: (.+) \((\d+) rows\)", cp.stdout)
+    if not m:
+        raise RuntimeError(f"unexpected report output: {cp.stdout.strip()[-200:]}")
+    return int(m.group(2)), m.group(1)
+
 @app.route("/report/daily", methods=["POST"])
 def report_daily():
     if ADMIN_TOKEN and request.headers.get("X-Admin-Token","") != ADMIN_TOKEN:
         return jsonify({"status":"error","msg":"unauthorized"}), 401
-    if DR is None:
+    if not os.path.exists(REPORT_SCRIPT):
         return jsonify({"status":"error","msg":"daily_report module not found"}), 500
 
     day = request.args.get("day") or datetime.now(KYIV).strftime("%Y-%m-%d")
+    if not re.fullmatch(r"\d{4}-\d{2}-\d{2}", day):
+        return jsonify({"status":"error","msg":"day must be YYYY-MM-DD"}), 400
+    account = request.args.get("account") or None
     signals_glob = os.path.join(LOG_DIR, "*.csv")
-    execs_path   = os.path.join(LOG_DIR, EXEC_LOG)
+    execs = _report_execs(account)
+    if execs is None:
+        return jsonify({"status":"error","msg":f"unknown account: {account}"}), 400
 
     try:
-        signals = DR.load_signals(signals_glob)
-        execs   = DR.load_execs(execs_path)
-        daily   = DR.build_daily(signals, execs, day)
-        out_path = os.path.join(REPORT_DIR, f"daily_trades_{day}.csv")
-        daily.to_csv(out_path, index=False)
+        t0 = time.perf_counter()
+        with REPORT_LOCK:
+            rows, out_path = _build_daily_report(day, signals_glob, execs, _report_subdir(REPORT_DIR, account))
+        techlog({"level":"info","msg":"report_built","day":day,"rows":rows,"mode":REPORT_MODE,"account":account,
+                 "sec":round(time.perf_counter() - t0, 3)})
 
         sent = False
-        if daily.shape[0] > 0 and send_mail_file and EMAIL_TO and SMTP_HOST and SMTP_USER and SMTP_PASS:
+        if rows > 0 and EMAIL_TO and SMTP_HOST and SMTP_USER and SMTP_PASS:
             try:
                 from pathlib import Path
+                from send_mail import send_file as send_mail_file
                 subj = f"Daily CSV — {day}"
                 send_mail_file(Path(out_path), subj)
                 sent = True
             except Exception as e:
                 techlog({"level":"warn","msg":"email_failed","err":str(e)})
 
-        return jsonify({"status":"ok","rows":int(daily.shape[0]),"file":out_path,"email_sent":sent})
+        return jsonify({"status":"ok","rows":rows,"file":out_path,"email_sent":sent})
     except Exception as e:
         techlog({"level":"error","msg":"report_daily_failed","err":str(e)})
         return jsonify({"status":"error","msg":str(e)}), 500
 
-# ====== INIT BINANCE & WORKERS ======
-if BINANCE_ENABLED and UMFutures:
+REPORT_RANGE_MAX_DAYS = int(os.environ.get("REPORT_RANGE_MAX_DAYS", "400"))
+REPORT_FINAL_AFTER_DAYS = int(os.environ.get("REPORT_FINAL_AFTER_DAYS", "7"))
+REPORT_AGG_DIR = os.path.join(REPORT_DIR, "daily_agg")
+
+def _build_range_report(start, end, period, signals_glob, execs, account=None):
+    """-> dict зведення з кешованих денних агрегатів. Викликати під REPORT_LOCK."""
+    cache_dir = _report_subdir(REPORT_AGG_DIR, account)
+    if REPORT_MODE == "inline":
+        return _daily_report().build_range(start, end, period, signals_glob, execs,
+                                           cache_dir, REPORT_FINAL_AFTER_DAYS)
+    import subprocess, sys
+    cp = subprocess.run([sys.executable, REPORT_SCRIPT, "--signals", signals_glob, "--execs", *execs,
+                         "--period", period, "--start", start, "--end", end,
+                         "--outdir", _report_subdir(REPORT_DIR, account),
+                         "--cache-dir", cache_dir, "--final-after-days", str(REPORT_FINAL_AFTER_DAYS)],
+                        capture_output=True, text=True, timeout=REPORT_TIMEOUT_SEC)
+    if cp.returncode != 0:
+        raise RuntimeError((cp.stderr or cp.stdout or f"exit {cp.returncode}").strip().splitlines()[-1])
+    m = re.search(r"Written: (.+) \((\d+) rows\)", cp.stdout)
+    if not m:
+        raise RuntimeError(f"unexpected report output: {cp.stdout.strip()[-200:]}")
+    with open(m.group(1), encoding="utf-8") as f:
+        return json.load(f)
+
+@app.route("/report/range", methods=["GET","POST"])
+def report_range():
+    """Тижневі/місячні зведення: ?period=week|month|day&start=YYYY-MM-DD&end=YYYY-MM-DD (або ?day= — період, що його містить)."""
+    if ADMIN_TOKEN and request.headers.get("X-Admin-Token","") != ADMIN_TOKEN:
+        return jsonify({"status":"error","msg":"unauthorized"}), 401
+    if not os.path.exists(REPORT_SCRIPT):
+        return jsonify({"status":"error","msg":"daily_report module not found"}), 500
+
+    period = (request.args.get("period") or "month").lower()
+    if period not in ("day","week","month"):
+        return jsonify({"status":"error","msg":"period must be day/week/month"}), 400
+    day = request.args.get("day") or datetime.now(KYIV).strftime("%Y-%m-%d")
+    start, end = request.args.get("start"), request.args.get("end")
+    for v in (day, start, end):
+        if v is not None and not re.fullmatch(r"\d{4}-\d{2}-\d{2}", v):
+            return jsonify({"status":"error","msg":"dates must be YYYY-MM-DD"}), 400
+    try:
+        d0 = datetime.strptime(day, "%Y-%m-%d").date()
+        if period == "week":
+            d0 -= timedelta(days=d0.weekday()); d1 = d0 + timedelta(days=6)
+        elif period == "month":
+            d0 = d0.replace(day=1)
+            d1 = (d0.replace(year=d0.year+1, month=1) if d0.month == 12 else d0.replace(month=d0.month+1)) - timedelta(days=1)
+        else:
+            d1 = d0
+        start, end = start or d0.isoformat(), end or d1.isoformat()
+        span = (datetime.strptime(end, "%Y-%m-%d") - datetime.strptime(start, "%Y-%m-%d")).days + 1
+    except ValueError as e:
+        return jsonify({"status":"error","msg":str(e)}), 400
+    if span < 1 or span > REPORT_RANGE_MAX_DAYS:
+        return jsonify({"status":"error","msg":f"range must be 1..{REPORT_RANGE_MAX_DAYS} days"}), 400
+    account = request.args.get("account") or None
+    execs = _report_execs(account)
+    if execs is None:
+        return jsonify({"status":"error","msg":f"unknown account: {account}"}), 400
+
     try:
-        BINANCE = UMFutures(key=API_KEY_MAIN, secret=API_SECRET_MAIN)
+        t0 = time.perf_counter()
+        with REPORT_LOCK:
+            rep = _build_range_report(start, end, period, os.path.join(LOG_DIR, "*.csv"), execs, account)
+        techlog({"level":"info","msg":"report_range_built","start":start,"end":end,"period":period,"account":account,
+                 "days_cached":rep.get("days_cached"),"days_built":rep.get("days_built"),"mode":REPORT_MODE,
+                 "sec":round(time.perf_counter() - t0, 3)})
+        return jsonify({"status":"ok", **rep})
+    except Exception as e:
+        techlog({"level":"error","msg":"report_range_failed","err":str(e)})
+        return jsonify({"status":"error","msg":str(e)}), 500
+
+# ====== INIT BINANCE & WORKERS ======
+def _init_account(acct: Account):
+    with _use_account(acct):
+        acct.client = _MeteredClient(UMFutures(key=acct.key, secret=acct.secret))
         techlog({"level":"info","msg":"binance_client_ready","import_path":_BINANCE_IMPORT_PATH})
+        if CLOCK.synced_at is None:
+            CLOCK.sync(acct.client, "startup")
         ensure_oneway_mode()
         for s in PRESET_SYMBOLS:
-            try: BINANCE.change_leverage(symbol=s, leverage=LEVERAGE); LEVERAGE_SET.add(s)
+            try: BINANCE.change_leverage(symbol=s, leverage=acct.eff_leverage()); acct.leverage_set.add(s)
             except Exception as e: techlog({"level":"warn","msg":"preset_leverage_failed","symbol":s,"err":str(e)})
         _recover_state()
-        threading.Thread(target=_bracket_monitor, daemon=True).start()
-        threading.Thread(target=_orphan_sweeper, daemon=True).start()
-        techlog({"level":"info","msg":"workers_started","poll_sec":BRACKET_POLL_SEC,"orphan_sec":ORPHAN_SWEEP_SEC})
+
+if BINANCE_ENABLED and UMFutures:
+    try:
+        BINANCE = _AccountClient()
+        _install_exchange_clock()
+        _init_account(MAIN_ACCOUNT)
+        for _a in list(ACCOUNTS.values())[1:]:
+            try:
+                _init_account(_a)
+            except Exception as e:
+                _a.client = None
+                techlog({"level":"warn","msg":"account_init_failed","acct":_a.name,"err":str(e)})
+        _spawn_worker("bracket_monitor", _bracket_monitor, interval=0.25, backlog_fn=_monitor_backlog)
+        if CLOCK_SYNC_SEC > 0:
+            _spawn_worker("clock_sync", _clock_syncer, interval=max(5.0, CLOCK_SYNC_SEC))
+        for _a in _live_accounts():
+            for _s, _r in _a.handoffs.items():
+                threading.Thread(target=_resume_handoff, args=(_a, _s, _r), name=f"handoff_{_s}", daemon=True).start()
+            _a.handoffs = {}
+        if CANCEL_ORPHANS:
+            _spawn_worker("orphan_sweeper", _orphan_sweeper, interval=max(3.0, ORPHAN_SWEEP_SEC))
+        techlog({"level":"info","msg":"workers_started","poll_sec":BRACKET_POLL_SEC,"orphan_sec":ORPHAN_SWEEP_SEC,
+                 "accounts":[a.name for a in _live_accounts()]})
     except Exception as e:
         techlog({"level":"warn","msg":"binance_client_init_failed","err":str(e)})
         BINANCE_ENABLED=False; BINANCE=None
@@ -910,23 +2668,138 @@ def _is_admin(req) -> bool:
         return False
     return req.headers.get("X-Admin-Token","") == ADMIN_TOKEN
 
-def _rate_limit_check(symbol: str) -> tuple[bool, str]:
-    now = time.time()
-    with RL_LOCK:
-        while WEBHOOK_TIMESTAMPS and (now - WEBHOOK_TIMESTAMPS[0] > 60.0):
-            WEBHOOK_TIMESTAMPS.popleft()
-        if MAX_WEBHOOKS_PER_MIN > 0 and len(WEBHOOK_TIMESTAMPS) >= MAX_WEBHOOKS_PER_MIN:
-            return False, f"global rate limit exceeded: {len(WEBHOOK_TIMESTAMPS)}/{MAX_WEBHOOKS_PER_MIN} in last 60s"
-        if MIN_SEC_BETWEEN_TRADES_PER_SYMBOL > 0:
-            last = LAST_SYMBOL_ACCEPT.get(symbol)
+class _SlidingWindow:
+    """
+    Ковзне вікно з двох лічильників (попереднє + поточне), O(1) пам'яті:
+    оцінка = prev*(1 - elapsed/W) + cur.
+    """
+    __slots__ = ("start", "prev", "cur")
+
+    def __init__(self, now, window):
+        self.start = now - (now % window); self.prev = 0; self.cur = 0
+
+    def _roll(self, now, window):
+        n = int((now - self.start) // window)
+        self.prev = self.cur if n == 1 else 0
+        self.cur = 0
+        self.start += n * window
+
+    def estimate(self, now, window) -> float:
+        if now - self.start >= window:
+            self._roll(now, window)
+        return self.prev * (1.0 - (now - self.start) / window) + self.cur
+
+    def retry_after(self, now, window, limit) -> float:
+        """Через скільки секунд estimate()+1 <= limit."""
+        e = now - self.start
+        need = self.prev * (1.0 - e / window) + self.cur + 1 - limit
+        if self.prev > 0:
+            t = need * window / self.prev
+            if t <= window - e:
+                return max(0.0, t)
+        # у наступному вікні поточний лічильник стане prev
+        if self.cur + 1 <= limit:
+            return window - e
+        return (window - e) + (self.cur + 1 - limit) * window / max(self.cur, 1)
+
+class RateLimiter:
+    """
+    Ієрархічний анти-флуд: per-IP (ковзне вікно) -> global (ковзне вікно) ->
+    per-symbol (мін. інтервал між прийнятими сигналами). Стан кожного рівня O(1),
+    per-key стани — LRU з обмеженням max_keys. Запис робиться лише якщо пройдено всі рівні.
+    """
+    WINDOW = 60.0
+
+    def __init__(self, max_keys):
+        self.max_keys = max(16, max_keys)
+        self.glob = None
+        self.ips = OrderedDict()
+        self.symbols = OrderedDict()
+
+    def _lru_get(self, table, key):
+        v = table.get(key)
+        if v is not None:
+            table.move_to_end(key)
+        return v
+
+    def _lru_add(self, table, key, val):
+        table[key] = val
+        if len(table) > self.max_keys:
+            table.popitem(last=False)
+
+    def key_counts(self) -> dict:
+        return {"ip": len(self.ips), "symbol": len(self.symbols)}
+
+    def clear(self):
+        self.glob = None; self.ips.clear(); self.symbols.clear()
+
+    def check_ip(self, now, ip, per_min_ip):
+        """Лише per-IP рівень (для batch). -> (ok, detail, retry_after_sec)"""
+        if per_min_ip <= 0 or not ip:
+            return True, "", 0.0
+        W = self.WINDOW
+        ipw = self._lru_get(self.ips, ip)
+        if ipw is None:
+            ipw = _SlidingWindow(now, W)
+            self._lru_add(self.ips, ip, ipw)
+        est = ipw.estimate(now, W)
+        if est + 1 > per_min_ip:
+            return False, f"ip rate limit exceeded: {est:.0f}/{per_min_ip} in last 60s", ipw.retry_after(now, W, per_min_ip)
+        ipw.cur += 1
+        return True, "", 0.0
+
+    def check(self, now, symbol, ip, per_min, per_min_ip, min_gap_sym):
+        """-> (ok, tier, detail, retry_after_sec)"""
+        W = self.WINDOW
+        ipw = None; ip_new = False
+        if per_min_ip > 0 and ip:
+            ipw = self._lru_get(self.ips, ip)
+            if ipw is None:
+                ipw = _SlidingWindow(now, W); ip_new = True
+            est = ipw.estimate(now, W)
+            if est + 1 > per_min_ip:
+                return False, "ip", f"ip rate limit exceeded: {est:.0f}/{per_min_ip} in last 60s", ipw.retry_after(now, W, per_min_ip)
+        if per_min > 0:
+            if self.glob is None:
+                self.glob = _SlidingWindow(now, W)
+            est = self.glob.estimate(now, W)
+            if est + 1 > per_min:
+                return False, "global", f"global rate limit exceeded: {est:.0f}/{per_min} in last 60s", self.glob.retry_after(now, W, per_min)
+        last = None
+        if min_gap_sym > 0:
+            last = self._lru_get(self.symbols, symbol)
             if last is not None:
                 dt = now - last
-                if dt < MIN_SEC_BETWEEN_TRADES_PER_SYMBOL:
-                    wait = max(0.0, MIN_SEC_BETWEEN_TRADES_PER_SYMBOL - dt)
-                    return False, f"symbol rate limit: wait {wait:.2f}s"
-        WEBHOOK_TIMESTAMPS.append(now)
-        LAST_SYMBOL_ACCEPT[symbol] = now
-        return True, ""
+                if dt < min_gap_sym:
+                    wait = max(0.0, min_gap_sym - dt)
+                    return False, "symbol", f"symbol rate limit: wait {wait:.2f}s", wait
+        if ipw is not None:
+            ipw.cur += 1
+            if ip_new:
+                self._lru_add(self.ips, ip, ipw)
+        if per_min > 0:
+            self.glob.cur += 1
+        if min_gap_sym > 0:
+            if last is None:
+                self._lru_add(self.symbols, symbol, now)
+            else:
+                self.symbols[symbol] = now
+        return True, "", "", 0.0
+
+RATE_LIMITER = RateLimiter(RL_MAX_KEYS)
+
+def _rate_limit_check(symbol: str, ip: str|None = None) -> tuple[bool, str, str, float]:
+    """-> (ok, tier, detail, retry_after_sec); ліміти читаються на кожен виклик (їх міняє /config і тести)."""
+    with RL_LOCK:
+        return RATE_LIMITER.check(time.time(), symbol, ip, MAX_WEBHOOKS_PER_MIN,
+                                  MAX_WEBHOOKS_PER_MIN_PER_IP, MIN_SEC_BETWEEN_TRADES_PER_SYMBOL)
+
+def _rate_limit_check_ip(ip: str|None) -> tuple[bool, str, float]:
+    with RL_LOCK:
+        return RATE_LIMITER.check_ip(time.time(), ip, MAX_WEBHOOKS_PER_MIN_PER_IP)
+
+def _client_ip(req) -> str:
+    return req.remote_addr or ""
 
 # ====== ROUTES ======
 @app.route("/")
@@ -941,15 +2814,28 @@ def healthz():
         "trading_enabled": BINANCE_ENABLED,
         "time": datetime.now(timezone.utc).isoformat().replace("+00:00","Z")
     }
+    base["clock"] = CLOCK.status()
+    stalled = _workers_stalled()
+    base["workers"] = "stalled" if stalled else "ok"
+    code = 200
+    if stalled:
+        base["status"] = "degraded"; base["stalled_workers"] = stalled
+        if HEALTHZ_FAIL_ON_STALL: code = 503
+    if JOURNAL_LOCK_FAILED:
+        base["status"] = "degraded"; base["journal"] = "lock_timeout"; code = 503
+    if DRAINING.is_set():
+        base["status"] = "draining"; base["inflight"] = _INFLIGHT[0]; code = 503
     if not _is_admin(request):
         base["webhook_secured"] = bool(SECRET) and not ALLOW_INSECURE_WEBHOOK
-        return jsonify(base)
+        return jsonify(base), code
     full = {
         **base,
         "risk_mode":RISK_MODE,"risk_pct":RISK_PCT,"leverage":LEVERAGE,
         "preset_symbols":PRESET_SYMBOLS,"binance_import_path":_BINANCE_IMPORT_PATH,
         "poll_sec": BRACKET_POLL_SEC, "orphan_sweep_sec": ORPHAN_SWEEP_SEC,
         "cancel_orphans": CANCEL_ORPHANS, "cancel_retries": CANCEL_RETRIES,
+        "cancel_workers": CANCEL_WORKERS, "cancels_pending": CANCELS.pending(),
+        "coalesce_ms": COALESCE_MS, "coalesce_waiting": COALESCER.pending() if COALESCER else 0,
         "entry_mode": ENTRY_MODE, "post_only": POST_ONLY,
         "offset_ticks": PRICE_OFFSET_TICKS, "offset_bps": PRICE_OFFSET_BPS,
         "chase_ms": CHASE_INTERVAL_MS, "chase_steps": CHASE_STEPS,
@@ -962,14 +2848,122 @@ def healthz():
         "max_signal_age_sec": MAX_SIGNAL_AGE_SEC,
         "allow_future_skew_sec": ALLOW_FUTURE_SKEW_SEC,
         "max_webhooks_per_min": MAX_WEBHOOKS_PER_MIN,
+        "max_webhooks_per_min_per_ip": MAX_WEBHOOKS_PER_MIN_PER_IP,
         "min_sec_between_trades_per_symbol": MIN_SEC_BETWEEN_TRADES_PER_SYMBOL,
-        "smtp_host": bool(SMTP_HOST), "email_to_set": bool(EMAIL_TO)
+        "rate_limit_keys": RATE_LIMITER.key_counts(),
+        "smtp_host": bool(SMTP_HOST), "email_to_set": bool(EMAIL_TO),
+        "dedup_keys": len(DEDUP), "dedup_ttl_sec": DEDUP.ttl, "dedup_state": DEDUP_PATH,
+        "journal": JOURNAL_PATH or None, "journal_fsync": JOURNAL_FSYNC,
+        "journal_live": JOURNAL.live_count() if JOURNAL else 0,
+        "accounts": [a.public() for a in ACCOUNTS.values()],
+        "workers": {n: w.status(time.monotonic()) for n, w in WORKERS.items()},
+        "brackets": {n: [b.public() for b in a.brackets.snapshot().values()] for n, a in ACCOUNTS.items()},
+        "worker_stall_sec": WORKER_STALL_SEC
     }
-    return jsonify(full)
+    return jsonify(full), code
+
+@app.route("/metrics")
+def metrics():
+    if not METRICS_PUBLIC:
+        tok = request.headers.get("X-Admin-Token","")
+        auth = request.headers.get("Authorization","")
+        if auth.startswith("Bearer "):
+            tok = tok or auth[7:]
+        if not ADMIN_TOKEN or tok != ADMIN_TOKEN:
+            return jsonify({"status":"error","msg":"unauthorized"}), 401
+    return Response(METRICS.render(), mimetype="text/plain; version=0.0.4")
+
+# ====== PROFILER (admin) ======
+PROFILE_MAX_SEC = float(os.environ.get("PROFILE_MAX_SEC", "60"))
+ONESHOT = PROF.OneShotProfile()
+SAMPLER = PROF.BackgroundSampler(on_done=lambda meta: techlog({"level":"info","msg":"profile_sampled", **meta}))
+
+@app.before_request
+def _oneshot_begin():
+    if ONESHOT.armed is not None:
+        ONESHOT.begin(request.path)
+
+@app.teardown_request
+def _oneshot_end(exc=None):
+    if ONESHOT.active:
+        ONESHOT.end()
+
+@app.route("/debug/profile", methods=["GET","POST"])
+def debug_profile():
+    """
+    Семплінг стеків усіх потоків у фоні (запит не тримає воркер gunicorn):
+    POST ?seconds=10&interval_ms=5 -> 202 старт; GET -> 202 поки триває, далі collapsed stacks (text/plain).
+    """
+    if not _is_admin(request):
+        return jsonify({"status":"error","msg":"unauthorized"}), 401
+    if request.method == "POST":
+        try:
+            sec = min(PROFILE_MAX_SEC, max(0.1, float(request.args.get("seconds", "10"))))
+            interval = min(1.0, max(0.001, float(request.args.get("interval_ms", "5")) / 1000.0))
+        except ValueError:
+            return jsonify({"status":"error","msg":"bad seconds/interval_ms"}), 400
+        if not SAMPLER.start(sec, interval):
+            return jsonify({"status":"error","msg":"profiler busy", **SAMPLER.status()}), 409
+        return _with_retry_after((jsonify({"status":"started","seconds":sec}), 202), sec)
+    st = SAMPLER.status()
+    if st["running"]:
+        return _with_retry_after((jsonify({"status":"running", **st}), 202), max(0.0, st["seconds"] - st["elapsed_sec"]))
+    if SAMPLER.result is None:
+        if st["error"]:
+            return jsonify({"status":"error","msg":st["error"]}), 500
+        return jsonify({"status":"error","msg":"no profile yet, POST /debug/profile to start"}), 404
+    stacks, meta = SAMPLER.result
+    resp = Response(PROF.collapsed(stacks), mimetype="text/plain")
+    resp.headers["X-Profile-Samples"] = str(meta["samples"])
+    return resp
+
+@app.route("/debug/cprofile", methods=["GET","POST"])
+def debug_cprofile():
+    """
+    POST {"path":"/webhook"} — наступний запит на цей шлях іде під cProfile.
+    GET — останній результат: ?format=text (pstats, ?sort=&limit=) або ?format=prof (marshal для snakeviz/pstats).
+    """
+    if not _is_admin(request):
+        return jsonify({"status":"error","msg":"unauthorized"}), 401
+    if request.method == "POST":
+        data = request.get_json(force=True, silent=True) or {}
+        path = str(data.get("path") or request.args.get("path") or "/webhook")
+        ONESHOT.arm(path)
+        techlog({"level":"info","msg":"cprofile_armed","path":path})
+        return jsonify({"status":"ok","armed":path})
+    r = ONESHOT.result
+    if r is None:
+        return jsonify({"status":"ok","armed":ONESHOT.armed,"result":None})
+    if request.args.get("format") == "prof":
+        resp = Response(r["stats"], mimetype="application/octet-stream")
+        resp.headers["Content-Disposition"] = "attachment; filename=request.prof"
+        return resp
+    try:
+        limit = int(request.args.get("limit", "60"))
+    except ValueError:
+        limit = 60
+    return Response(ONESHOT.text(request.args.get("sort", "cumulative"), limit), mimetype="text/plain")
+
+@app.route("/lifecycle", methods=["GET"])
+def lifecycle():
+    """Усі події сигналу з tech/signals/exec логів: ?id=<signal_id> | ?symbol=&since=&until= (ISO/epoch)."""
+    if not _is_admin(request):
+        return jsonify({"status":"error","msg":"unauthorized"}), 401
+    if LOGIDX is None:
+        return jsonify({"status":"error","msg":"log index disabled"}), 503
+    t0 = time.perf_counter()
+    try:
+        LOGIDX.catch_up()
+        events = LOGIDX.lookup(request.args.get("id"), request.args.get("symbol"),
+                               LI.parse_ts(request.args.get("since")), LI.parse_ts(request.args.get("until")),
+                               int(request.args.get("limit", "1000")))
+    except ValueError as e:
+        return jsonify({"status":"error","msg":str(e)}), 400
+    return jsonify({"status":"ok","count":len(events),"ms":round((time.perf_counter() - t0)*1000, 2),"events":events})
 
 @app.route("/config", methods=["GET","POST"])
 def config():
-    global RISK_MODE,RISK_PCT,LEVERAGE
+    global RISK_MODE,RISK_PCT,LEVERAGE,EXEC_PROFILES
     if request.method=="GET":
         if not ADMIN_TOKEN:
             return jsonify({"status":"error","msg":"admin token not set"}), 401
@@ -983,32 +2977,58 @@ def config():
             "offset_ticks":PRICE_OFFSET_TICKS,"offset_bps":PRICE_OFFSET_BPS,
             "chase_ms":CHASE_INTERVAL_MS,"chase_steps":CHASE_STEPS,
             "max_wait_sec":MAX_WAIT_SEC,"max_dev_bps":MAX_DEVIATION_BPS,"fallback":FALLBACK,
+            "exec_profiles": EXEC_PROFILES.specs,
             "webhook_secured": bool(SECRET),
             "allow_insecure_webhook": ALLOW_INSECURE_WEBHOOK,
             "max_signal_age_sec": MAX_SIGNAL_AGE_SEC,
             "allow_future_skew_sec": ALLOW_FUTURE_SKEW_SEC,
             "max_webhooks_per_min": MAX_WEBHOOKS_PER_MIN,
-            "min_sec_between_trades_per_symbol": MIN_SEC_BETWEEN_TRADES_PER_SYMBOL
+            "max_webhooks_per_min_per_ip": MAX_WEBHOOKS_PER_MIN_PER_IP,
+            "min_sec_between_trades_per_symbol": MIN_SEC_BETWEEN_TRADES_PER_SYMBOL,
+            "accounts": [a.public() for a in ACCOUNTS.values()]
         })
     if ADMIN_TOKEN and request.headers.get("X-Admin-Token","")!=ADMIN_TOKEN:
         return jsonify({"status":"error","msg":"unauthorized"}),401
     data=request.get_json(force=True,silent=True) or {}
+    # {"exec_profiles":[...]} — повна заміна профілів виконання, діє з наступного сигналу
+    if "exec_profiles" in data:
+        try:
+            EXEC_PROFILES = ExecProfileTable(data["exec_profiles"])
+        except ValueError as e:
+            return jsonify({"status":"error","msg":str(e)}),400
+        techlog({"level":"info","msg":"exec_profiles_updated","count":len(EXEC_PROFILES.specs)})
+        if not any(k in data for k in ("risk_mode","risk_pct","leverage")):
+            return jsonify({"status":"ok","exec_profiles":EXEC_PROFILES.specs})
+    # {"account":"sub1", ...} — змінює ризик лише цього акаунта
+    acct = None
+    if data.get("account"):
+        acct = ACCOUNTS.get(str(data["account"]))
+        if acct is None: return jsonify({"status":"error","msg":"unknown account"}),404
     if "risk_mode" in data:
         val=str(data["risk_mode"]).lower()
         if val not in ("margin","notional"): return jsonify({"status":"error","msg":"risk_mode must be margin|notional"}),400
-        RISK_MODE=val
+        if acct: acct.risk_mode=val
+        else: RISK_MODE=val
     if "risk_pct" in data:
         try:
             v=float(data["risk_pct"])
             if not (0<v<=100): return jsonify({"status":"error","msg":"risk_pct must be (0;100]"}),400
-            RISK_PCT=v
+            if acct: acct.risk_pct=v
+            else: RISK_PCT=v
         except: return jsonify({"status":"error","msg":"risk_pct must be float"}),400
     if "leverage" in data:
         try:
             lv=int(data["leverage"])
             if not (1<=lv<=125): return jsonify({"status":"error","msg":"leverage out of range"}),400
-            LEVERAGE=lv; LEVERAGE_SET.clear()
+            if acct:
+                acct.leverage=lv; acct.leverage_set.clear()
+            else:
+                LEVERAGE=lv
+                for a in ACCOUNTS.values(): a.leverage_set.clear()
         except: return jsonify({"status":"error","msg":"leverage must be int"}),400
+    if acct:
+        techlog({"level":"info","msg":"config_updated","account":acct.name,**acct.public()})
+        return jsonify({"status":"ok","account":acct.public()})
     techlog({"level":"info","msg":"config_updated","risk_mode":RISK_MODE,"risk_pct":RISK_PCT,"leverage":LEVERAGE})
     return jsonify({"status":"ok","risk_mode":RISK_MODE,"risk_pct":RISK_PCT,"leverage":LEVERAGE})
 
@@ -1021,118 +3041,387 @@ def config_public():
         "time": datetime.now(timezone.utc).isoformat().replace("+00:00","Z")
     })
 
-def validate_payload(d:dict):
-    req = ["signal","symbol","time","side","pattern","entry","tp","sl"]
-    miss=[k for k in req if k not in d]
-    if miss: return False, f"Missing: {','.join(miss)}"
-    if str(d["signal"]).lower()!="entry": return False, "signal must be 'entry'"
-    if str(d["side"]).lower() not in ("long","short"): return False,"side must be long/short"
-    if str(d["pattern"]).lower()!=ALLOW_PATTERN: return False, f"pattern must be '{ALLOW_PATTERN}'"
+# ====== SIGNAL ======
+class Signal:
+    """
+    Нормалізований вхідний сигнал: час розібрано один раз (epoch + ISO), символ зведено
+    до Binance, side/pattern у нижньому регістрі. Незмінний; id додає with_id().
+    """
+    __slots__ = ("symbol_tv", "symbol", "side", "pattern", "entry", "tp", "sl",
+                 "time_raw", "epoch", "time_iso", "ext_id", "id")
+
+    def __init__(self, symbol_tv, symbol, side, pattern, entry, tp, sl, time_raw, epoch, time_iso, ext_id="", id=None):
+        for k, v in zip(self.__slots__, (symbol_tv, symbol, side, pattern, entry, tp, sl,
+                                         time_raw, epoch, time_iso, ext_id, id)):
+            object.__setattr__(self, k, v)
+
+    def __setattr__(self, k, v):
+        raise AttributeError("Signal is immutable")
+
+    def with_id(self, sig_id) -> "Signal":
+        return Signal(*(getattr(self, k) for k in self.__slots__[:-1]), id=sig_id)
+
+_SIGNAL_REQUIRED = ("signal","symbol","time","side","pattern","entry","tp","sl")
+
+def normalize_signal(d: dict):
+    """Валідація + нормалізація за один прохід -> (Signal, None) або (None, причина)."""
+    miss=[k for k in _SIGNAL_REQUIRED if k not in d]
+    if miss: return None, f"Missing: {','.join(miss)}"
+    if str(d["signal"]).lower()!="entry": return None, "signal must be 'entry'"
+    side=str(d["side"]).lower()
+    if side not in ("long","short"): return None,"side must be long/short"
+    pattern=str(d["pattern"]).lower()
+    if pattern!=ALLOW_PATTERN: return None, f"pattern must be '{ALLOW_PATTERN}'"
     e=to_float(d["entry"]); t=to_float(d["tp"]); s=to_float(d["sl"])
-    if e is None or t is None or s is None: return False, "entry/tp/sl must be numeric"
-    return True, {"entry":e,"tp":t,"sl":s}
+    if e is None or t is None or s is None: return None, "entry/tp/sl must be numeric"
+    dt = _signal_dt(d["time"])
+    symbol_tv = str(d["symbol"])
+    ext_id = str(d.get("id") or d.get("signal_id") or "").strip()
+    return Signal(symbol_tv, binance_symbol(symbol_tv), side, pattern, e, t, s, d["time"],
+                  dt.timestamp(), dt.isoformat().replace("+00:00","Z"), ext_id), None
+
+def signal_id(sig: Signal) -> str:
+    if sig.ext_id:
+        return f"ext|{sig.ext_id}"
+    return build_id(sig.symbol, sig.pattern, sig.side, sig.time_raw, sig.entry, sig.tp, sig.sl, t_iso=sig.time_iso)
+
+def validate_payload(d:dict):
+    sig, err = normalize_signal(d)
+    if sig is None: return False, err
+    return True, {"entry":sig.entry,"tp":sig.tp,"sl":sig.sl}
+
+def _check_freshness(epoch: float) -> tuple[bool, str]:
+    age = CLOCK.now() - epoch
+    if age > MAX_SIGNAL_AGE_SEC:
+        return False, f"signal too old: age_sec={int(age)}, max={MAX_SIGNAL_AGE_SEC}"
+    if age < 0 and -age > ALLOW_FUTURE_SKEW_SEC:
+        return False, f"signal time too far in future: skew_sec={int(-age)}, max={ALLOW_FUTURE_SKEW_SEC}"
+    return True, ""
 
 def _check_signal_freshness(raw_time_value) -> tuple[bool, str]:
-    try:
-        t_iso = to_iso8601(raw_time_value)
-        t_dt  = parse_iso8601_to_dt(t_iso)
-        now   = datetime.now(timezone.utc)
-        diff  = now - t_dt
-        if diff.total_seconds() > MAX_SIGNAL_AGE_SEC:
-            return False, f"signal too old: age_sec={int(diff.total_seconds())}, max={MAX_SIGNAL_AGE_SEC}"
-        if diff.total_seconds() < 0:
-            fut = -diff.total_seconds()
-            if fut > ALLOW_FUTURE_SKEW_SEC:
-                return False, f"signal time too far in future: skew_sec={int(fut)}, max={ALLOW_FUTURE_SKEW_SEC}"
-        return True, ""
-    except Exception as e:
-        return False, f"bad time format: {str(e)}"
+    return _check_freshness(_signal_dt(raw_time_value).timestamp())
+
+def _wh_reply(outcome: str, body: dict, code: int = 200):
+    M_WEBHOOK.inc(outcome)
+    return jsonify(body), code
 
 @app.route("/webhook", methods=["POST"])
 def webhook():
+    t0 = time.perf_counter()
+    try:
+        return _webhook()
+    finally:
+        M_WEBHOOK_SEC.observe(time.perf_counter() - t0)
+
+def _wh_auth():
+    """None, якщо підпис валідний; інакше готова відповідь."""
     if _require_signature() and not SECRET:
         techlog({"level":"warn","msg":"webhook_secret_missing"})
-        return jsonify({"status":"error","msg":"webhook secret not set"}), 401
+        return _wh_reply("bad_sig", {"status":"error","msg":"webhook secret not set"}, 401)
     if SECRET:
         sig_hdr = request.headers.get("X-Signature", "")
         if not sig_hdr:
             techlog({"level":"warn","msg":"missing_signature_header"})
-            return jsonify({"status":"error","msg":"missing signature"}), 401
+            return _wh_reply("bad_sig", {"status":"error","msg":"missing signature"}, 401)
         if not valid_sig(request):
             techlog({"level":"warn","msg":"bad_signature"})
-            return jsonify({"status":"error","msg":"bad signature"}), 401
+            return _wh_reply("bad_sig", {"status":"error","msg":"bad signature"}, 401)
+    return None
+
+def _wh_draining():
+    if JOURNAL_LOCK_FAILED:
+        return _with_retry_after(_wh_reply("draining", {"status":"error","msg":"journal locked by another process"}, 503), 5)
+    if not DRAINING.is_set():
+        return None
+    return _with_retry_after(_wh_reply("draining", {"status":"error","msg":"draining, retry on another worker"}, 503), 5)
+
+def _with_retry_after(reply, retry_sec):
+    resp, code = reply
+    resp.headers["Retry-After"] = str(max(1, int(retry_sec + 0.999)))
+    return resp, code
+
+def _webhook():
+    denied = _wh_auth() or _wh_draining()
+    if denied is not None:
+        return denied
     try:
         data=request.get_json(force=True, silent=False)
     except Exception as e:
         techlog({"level":"error","msg":"bad_json","err":str(e)})
-        return jsonify({"status":"error","msg":"bad json"}),400
+        return _wh_reply("bad_json", {"status":"error","msg":"bad json"}, 400)
+
+    outcome, body, code, retry, sig = _ingest_signal(data, _client_ip(request))
+    if sig:
+        _execute_signal(sig, body, _coalesce_across_requests())
+    reply = _wh_reply(outcome, body, code)
+    return _with_retry_after(reply, retry) if code == 429 else reply
+
+class _BatchSnapshot:
+    """Позиції й відкриті ордери — по одному запиту на весь batch (ліниво), а не REST на кожен сигнал."""
+    def __init__(self):
+        self._pos = self._orders = None
+        self._pos_read = False
+
+    def position_amt(self, symbol) -> float:
+        if not self._pos_read:
+            self._pos = _all_positions(); self._pos_read = True
+        if self._pos is None:
+            return _position_amt(symbol)
+        return abs(self._pos.get(symbol, 0.0))
+
+    def open_orders(self, symbol) -> list:
+        if self._orders is None:
+            self._orders = _open_orders_by_symbol()
+        return self._orders.get(symbol, [])
+
+def _ingest_signal(data, ip, snap=None):
+    """
+    Валідація -> свіжість -> анти-флуд -> id -> позиція -> дедуп -> запис у CSV.
+    snap — _BatchSnapshot для /webhook/batch: стан біржі читається раз на batch.
+    -> (outcome, body, http_code, retry_after_sec, Signal|None); Signal (з id) — лише для прийнятого.
+    """
+    if not isinstance(data, dict):
+        techlog({"level":"warn","msg":"bad_payload","detail":"object expected","data":data})
+        return "bad_payload", {"status":"error","msg":"object expected"}, 400, 0.0, None
 
-    ok, info = validate_payload(data)
-    if not ok:
-        techlog({"level":"warn","msg":"bad_payload","detail":info,"data":data})
-        return jsonify({"status":"error","msg":info}),400
+    sig, err = normalize_signal(data)
+    if sig is None:
+        techlog({"level":"warn","msg":"bad_payload","detail":err,"data":data})
+        return "bad_payload", {"status":"error","msg":err}, 400, 0.0, None
 
-    fresh_ok, fresh_msg = _check_signal_freshness(data["time"])
+    fresh_ok, fresh_msg = _check_freshness(sig.epoch)
     if not fresh_ok:
-        techlog({"level":"warn","msg":"stale_or_future_signal","detail":fresh_msg,"raw_time":str(data["time"])})
-        return jsonify({"status":"error","msg":fresh_msg}), 400
+        techlog({"level":"warn","msg":"stale_or_future_signal","detail":fresh_msg,"raw_time":str(sig.time_raw)})
+        return "stale", {"status":"error","msg":fresh_msg}, 400, 0.0, None
 
-    symbol_tv=str(data["symbol"]); symbol=tv_to_binance_symbol(symbol_tv)
-    side=str(data["side"]).lower(); pattern=str(data["pattern"]).lower()
-
-    rl_ok, rl_msg = _rate_limit_check(symbol)
+    symbol = sig.symbol
+    rl_ok, rl_tier, rl_msg, rl_retry = _rate_limit_check(symbol, ip)
     if not rl_ok:
-        techlog({"level":"warn","msg":"rate_limit","type":("global" if "global" in rl_msg else "symbol"),
-                 "symbol":symbol,"detail":rl_msg})
-        return jsonify({"status":"error","msg":rl_msg}), 429
+        techlog({"level":"warn","msg":"rate_limit","type":rl_tier,"symbol":symbol,"detail":rl_msg})
+        return "rate_limit", {"status":"error","msg":rl_msg}, 429, rl_retry, None
 
-    ext_id = str(data.get("id") or data.get("signal_id") or "").strip()
-    if ext_id:
-        sig_id = f"ext|{ext_id}"
-    else:
-        sig_id = build_id(symbol, pattern, side, data["time"], info["entry"], info["tp"], info["sl"])
+    sig_id = signal_id(sig)
+    sig = sig.with_id(sig_id)
 
     print("[WEBHOOK_OK] id={} data={}".format(sig_id, json.dumps(data, ensure_ascii=False)), flush=True)
 
-    with BR_LOCK: has_local = symbol in BRACKETS
-    if BINANCE and has_local and _position_amt(symbol)==0.0 and not _list_open_orders(symbol):
-        with BR_LOCK: BRACKETS.pop(symbol,None)
+    # з кількома акаунтами позицію перевіряє кожен акаунт у place_orders_oneway
+    multi = len(ACCOUNTS) > 1
+    has_local = symbol in BRACKETS
+    pos_amt = snap.position_amt if snap is not None else _position_amt
+    open_orders = snap.open_orders if snap is not None else _list_open_orders
+    if not multi and BINANCE and has_local and pos_amt(symbol)==0.0 and not open_orders(symbol):
+        _bracket_drop(symbol, "stale_purge")
         techlog({"level":"info","msg":"stale_bracket_purged","symbol":symbol,"id":sig_id}); has_local=False
 
-    if (_position_amt(symbol)>0.0) and IN_POSITION_POLICY=="ignore":
+    if not multi and IN_POSITION_POLICY=="ignore" and pos_amt(symbol)>0.0:
         techlog({"level":"info","msg":"ignored_new_signal_active_position","id":sig_id,"symbol":symbol})
-        return jsonify({"status":"ok","msg":"ignored_active_position","id":sig_id})
+        return "in_position", {"status":"ok","msg":"ignored_active_position","id":sig_id}, 200, 0.0, None
 
     if dedup_seen(sig_id):
         techlog({"level":"info","msg":"duplicate_ignored","id":sig_id})
-        return jsonify({"status":"ok","msg":"ignored","id":sig_id})
+        return "duplicate", {"status":"ok","msg":"ignored","id":sig_id}, 200, 0.0, None
 
-    rotate_if_needed(CSV_PATH)
+    t_log = time.perf_counter()
     newfile=not os.path.exists(CSV_PATH)
     with open(CSV_PATH,"a",newline="",encoding="utf-8") as f:
         w=csv.writer(f)
         if newfile: w.writerow(["time_raw","time_iso","symbol","pattern","side","entry","tp","sl","id"])
-        w.writerow([data["time"], to_iso8601(data["time"]), symbol_tv, pattern, side, info["entry"], info["tp"], info["sl"], sig_id])
-    techlog({"level":"info","msg":"logged","id":sig_id,"symbol":symbol_tv,"side":side})
+        w.writerow([sig.time_raw, sig.time_iso, sig.symbol_tv, sig.pattern, sig.side, sig.entry, sig.tp, sig.sl, sig_id])
+    M_LOG_SEC.observe(time.perf_counter() - t_log, "signals")
+    techlog({"level":"info","msg":"logged","id":sig_id,"symbol":sig.symbol_tv,"side":sig.side})
 
+    body = {"status":"ok","msg":"logged","id":sig_id}
+    return "ok", body, 200, 0.0, sig
+
+# ====== COALESCING ======
+def _record_superseded(sig: Signal, body: dict, by: Signal):
+    body["msg"] = "superseded"; body["superseded_by"] = by.id
+    M_SUPERSEDED.inc()
+    techlog({"level":"info","msg":"signal_superseded","id":sig.id,"symbol":sig.symbol,"side":sig.side,
+             "by":by.id,"by_side":by.side})
+
+class SignalCoalescer:
+    """
+    Вікно злиття по символу: прийнятий сигнал чекає window_ms і завершення поточного виконання
+    цього символу. Новіший сигнал за цей час витісняє того, хто чекає, — виконується лише
+    останній намір, витіснені лишаються в логах як superseded.
+    """
+    def __init__(self, window_ms: float):
+        self.window = max(0.0, window_ms) / 1000.0
+        self._lock = threading.Lock()
+        self._slots = {}          # symbol -> [cond, pending, running, waiters]
+
+    def run(self, sig: Signal, body: dict, fn) -> bool:
+        """fn() виконує сигнал. -> False, якщо його витіснив новіший."""
+        me = [sig, body, None]    # [2] — Signal, що витіснив
+        with self._lock:
+            slot = self._slots.get(sig.symbol)
+            if slot is None:
+                slot = self._slots[sig.symbol] = [threading.Condition(self._lock), None, False, 0]
+            cond = slot[0]
+            if slot[1] is not None:
+                slot[1][2] = sig
+                cond.notify_all()
+            slot[1] = me; slot[3] += 1
+            deadline = time.monotonic() + self.window
+            try:
+                while me[2] is None:
+                    left = deadline - time.monotonic()
+                    if left <= 0 and not slot[2]:
+                        slot[1] = None; slot[2] = True
+                        break
+                    cond.wait(left if left > 0 else None)
+            finally:
+                slot[3] -= 1
+        if me[2] is not None:
+            _record_superseded(sig, body, me[2])
+            return False
+        try:
+            fn()
+        finally:
+            with self._lock:
+                slot[2] = False
+                cond.notify_all()
+                if slot[1] is None and slot[3] == 0 and self._slots.get(sig.symbol) is slot:
+                    del self._slots[sig.symbol]
+        return True
+
+    def pending(self) -> int:
+        with self._lock:
+            return sum(s[3] for s in self._slots.values())
+
+COALESCER = SignalCoalescer(COALESCE_MS) if COALESCE_MS > 0 else None
+
+def _dispatch_signal(sig: Signal, body: dict):
     if BINANCE_ENABLED and BINANCE:
+        results = dispatch_accounts(sig.symbol, sig.side, sig.entry, sig.tp, sig.sl, sig.id)
+        if len(ACCOUNTS) > 1:
+            body["accounts"] = results
+    else:
+        techlog({"level":"info","msg":"trading_disabled","id":sig.id})
+
+def _coalesce_across_requests() -> bool:
+    """
+    Вікно між запитами має сенс лише для багатопотокового воркера (gunicorn -k gthread --threads N):
+    sync-воркер обробляє /webhook по одному, тож новіший сигнал не прийде, поки цей чекає, —
+    вікно було б лише затримкою. Викликати в потоці запиту.
+    """
+    if COALESCER is None:
+        return False
+    if request.environ.get("wsgi.multithread"):
+        return True
+    if not _COALESCE_WARNED:
+        _COALESCE_WARNED.append(True)
+        techlog({"level":"warn","msg":"coalesce_window_inactive","coalesce_ms":COALESCE_MS,
+                 "hint":"single-threaded worker: use gunicorn -k gthread --threads N"})
+    return False
+
+_COALESCE_WARNED = []
+
+def _execute_signal(sig: Signal, body: dict, window: bool = False):
+    if COALESCER is None or not window:
+        return _dispatch_signal(sig, body)
+    # очікування у вікні — теж in-flight: drain не має загубити вже прийнятий сигнал
+    with _inflight():
+        COALESCER.run(sig, body, lambda: _dispatch_signal(sig, body))
+
+@app.route("/webhook/batch", methods=["POST"])
+def webhook_batch():
+    t0 = time.perf_counter()
+    try:
+        return _webhook_batch()
+    finally:
+        M_WEBHOOK_SEC.observe(time.perf_counter() - t0)
+
+def _webhook_batch():
+    """
+    Підписаний масив сигналів ([...] або {"signals":[...]}): один прохід валідації/дедупу,
+    далі виконання паралельно по символах (сигнали одного символу — послідовно).
+    Анти-флуд: per-IP рахує batch як один запит, global/per-symbol — кожен сигнал.
+    """
+    denied = _wh_auth() or _wh_draining()
+    if denied is not None:
+        return denied
+    try:
+        data=request.get_json(force=True, silent=False)
+    except Exception as e:
+        techlog({"level":"error","msg":"bad_json","err":str(e)})
+        return _wh_reply("bad_json", {"status":"error","msg":"bad json"}, 400)
+    items = data.get("signals") if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        return _wh_reply("bad_payload", {"status":"error","msg":"signals array expected"}, 400)
+    if len(items) > MAX_BATCH:
+        return _wh_reply("bad_payload", {"status":"error","msg":f"batch too large: {len(items)} > {MAX_BATCH}"}, 400)
+
+    ip_ok, ip_msg, ip_retry = _rate_limit_check_ip(_client_ip(request))
+    if not ip_ok:
+        techlog({"level":"warn","msg":"rate_limit","type":"ip","detail":ip_msg,"batch":len(items)})
+        return _with_retry_after(_wh_reply("rate_limit", {"status":"error","msg":ip_msg}, 429), ip_retry)
+
+    results, groups, retry_max = [], OrderedDict(), 0.0
+    snap = _BatchSnapshot() if len(ACCOUNTS) == 1 and BINANCE_ENABLED and BINANCE else None
+    for idx, d in enumerate(items):
+        outcome, body, code, retry, sig = _ingest_signal(d, None, snap)
+        M_WEBHOOK.inc(outcome)
+        body["index"] = idx; body["code"] = code
+        results.append(body)
+        retry_max = max(retry_max, retry)
+        if sig:
+            groups.setdefault(sig.symbol, []).append((sig, body))
+
+    window = _coalesce_across_requests()
+
+    def run_group(group):
+        if COALESCER is not None and len(group) > 1:
+            # у межах batch новіший сигнал символу витісняє попередні одразу
+            for sig, body in group[:-1]:
+                _record_superseded(sig, body, group[-1][0])
+            group = group[-1:]
+        for sig, body in group:
+            _execute_signal(sig, body, window)
+
+    if len(groups) > 1 and BINANCE_ENABLED and BINANCE:
+        futs = [BATCH_POOL.submit(run_group, g) for g in groups.values()]
+        for f in futs:
+            f.result()
+    else:
+        for g in groups.values():
+            run_group(g)
+
+    accepted = sum(len(g) for g in groups.values())
+    techlog({"level":"info","msg":"batch_done","count":len(items),"accepted":accepted,"symbols":len(groups)})
+    out = {"status":"ok","count":len(items),"accepted":accepted,"results":results}
+    if accepted == 0 and retry_max > 0 and all(r["code"] == 429 for r in results):
+        return _with_retry_after((jsonify(out), 429), retry_max)
+    return jsonify(out), 200
+
+def _place_for_account(acct: Account, symbol, side, entry, tp, sl, signal_id) -> dict:
+    with _use_account(acct), _use_signal(signal_id), _inflight():
         try:
-            res = place_orders_oneway(symbol, side, info["entry"], info["tp"], info["sl"], sig_id)
-            techlog({"level":"info","msg":"trade_ok","id":sig_id,"symbol":symbol,"res":res})
+            res = place_orders_oneway(symbol, side, entry, tp, sl, signal_id)
+            techlog({"level":"info","msg":"trade_ok","id":signal_id,"symbol":symbol,"res":res})
+            return {"ok":True,"res":res}
         except Exception as e:
-            techlog({"level":"error","msg":"trade_failed","id":sig_id,"err":str(e)})
-    else:
-        techlog({"level":"info","msg":"trading_disabled","id":sig_id})
+            techlog({"level":"error","msg":"trade_failed","id":signal_id,"err":str(e)})
+            return {"ok":False,"err":str(e)}
 
-    return jsonify({"status":"ok","msg":"logged","id":sig_id})
+def dispatch_accounts(symbol, side, entry, tp, sl, signal_id) -> dict:
+    """Один сигнал -> усі акаунти паралельно; час входу ≈ латентність найповільнішого акаунта."""
+    accts = [a for a in ACCOUNTS.values() if a.client is not None] or [MAIN_ACCOUNT]
+    if len(accts) == 1 or ACCOUNT_POOL is None:
+        return {a.name: _place_for_account(a, symbol, side, entry, tp, sl, signal_id) for a in accts}
+    futs = {a.name: ACCOUNT_POOL.submit(_place_for_account, a, symbol, side, entry, tp, sl, signal_id) for a in accts}
+    return {n: f.result() for n, f in futs.items()}
 
 def place_orders_oneway(symbol: str, side: str, entry: float, tp: float, sl: float, signal_id: str):
     symbol=symbol.upper()
     ensure_oneway_mode(); ensure_leverage(symbol)
 
-    with BR_LOCK: has_local = symbol in BRACKETS
+    brackets = _acct().brackets
+    has_local = symbol in brackets
     if BINANCE and has_local and _position_amt(symbol)==0.0 and not _list_open_orders(symbol):
-        with BR_LOCK: BRACKETS.pop(symbol,None)
+        _bracket_drop(symbol, "stale_purge")
         techlog({"level":"info","msg":"stale_bracket_purged","symbol":symbol,"id":signal_id}); has_local=False
 
     pos_amt=_position_amt(symbol)
@@ -1143,6 +3432,7 @@ def place_orders_oneway(symbol: str, side: str, entry: float, tp: float, sl: flo
         elif IN_POSITION_POLICY=="replace":
             _close_position_reduce_only(symbol, signal_id, reason="replace")
 
+    journal(symbol, "accepted", signal_id, side=side)
     price_ref = get_mark_price(symbol)
     qty  = compute_qty(symbol, price_ref)
     filt = fetch_symbol_filters(symbol)
@@ -1152,37 +3442,55 @@ def place_orders_oneway(symbol: str, side: str, entry: float, tp: float, sl: flo
     sl_r = p_floor_to_tick(float(sl), tick)
 
     open_event = "OPEN_MARKET"
+    # write-ahead: намір входу durable до першого new_order
+    prof = exec_profile(symbol)
+    cid = client_order_id(signal_id, "E" if prof.entry_mode == "market" else "L")
+    journal(symbol, "entry_sent", signal_id, sync=True, side=side, mode=prof.entry_mode, qty=qty, cid=cid)
     # ===== Вхід =====
-    if ENTRY_MODE == "market":
-        open_id = _entry_market(symbol, side, qty)
+    if prof.entry_mode == "market":
+        open_id = _entry_market(symbol, side, qty, cid=cid)
         open_event = "OPEN_MARKET"
-    elif ENTRY_MODE == "limit":
-        px = _offset_price_from_book(symbol, side, tick)
-        tif = "GTX" if POST_ONLY else "GTC"
-        open_id = _entry_limit(symbol, side, qty, px, tif=tif)
+    elif prof.entry_mode == "limit":
+        px = _offset_price_from_book(symbol, side, tick, prof)
+        tif = "GTX" if prof.post_only else "GTC"
+        open_id = _entry_limit(symbol, side, qty, px, tif=tif, cid=cid)
         open_event = "OPEN_LIMIT"
     else:
-        open_id, filled = _entry_maker_chase(symbol, side, qty, tick, signal_id, price_ref)
-        if filled <= 0.0 and FALLBACK == "none":
-            techlog({"level":"info","msg":"no_entry_filled","symbol":symbol})
+        try:
+            open_id, filled = _entry_maker_chase(symbol, side, qty, tick, signal_id, price_ref, prof)
+        except ChaseHandoff as h:
+            journal(symbol, "handoff", signal_id, sync=True, side=side, qty=qty, tp=tp_r, sl=sl_r, ref=price_ref, **h.state)
+            techlog({"level":"info","msg":"entry_chase_handed_off","symbol":symbol,"id":signal_id,**h.state})
+            return {"status":"ok","msg":"handed_off","id":signal_id}
+        done = _chase_outcome(symbol, signal_id, qty, filled, prof)
+        if done is None:
             return {"skipped":True,"reason":"no_filled"}
-        time.sleep(0.2)
-        pos_amt_now = _position_amt(symbol)
-        if pos_amt_now > 0:
-            qty = pos_amt_now
-        open_event = "OPEN_MAKER_CHASE"
-        # Якщо був fallback — переіменуємо
-        if ENTRY_MODE == "maker_chase" and filled < qty:
-            if FALLBACK == "market":
-                open_event = "OPEN_FALLBACK_MARKET"
-            elif FALLBACK == "limit_ioc":
-                open_event = "OPEN_FALLBACK_LIMIT_IOC"
-
-    with BR_LOCK:
-        BRACKETS[symbol] = {
-            "id":signal_id,"side":side,"tp_id":None,"sl_id":None,
-            "open_order_id":open_id,"ts":datetime.now(timezone.utc).isoformat().replace("+00:00","Z")
-        }
+        qty, open_event = done
+    return _finish_entry(symbol, side, qty, signal_id, open_id, open_event, tp_r, sl_r, price_ref)
+
+def _chase_outcome(symbol, signal_id, qty, filled, prof):
+    """Після maker-chase -> (фактична qty, open_event) або None, якщо нічого не налилось."""
+    if filled <= 0.0 and prof.fallback == "none":
+        techlog({"level":"info","msg":"no_entry_filled","symbol":symbol})
+        journal(symbol, "closed", signal_id, reason="no_entry_filled")
+        return None
+    time.sleep(0.2)
+    pos_amt_now = _position_amt(symbol)
+    if pos_amt_now > 0:
+        qty = pos_amt_now
+    open_event = "OPEN_MAKER_CHASE"
+    # Якщо був fallback — переіменуємо
+    if filled < qty:
+        if prof.fallback == "market":
+            open_event = "OPEN_FALLBACK_MARKET"
+        elif prof.fallback == "limit_ioc":
+            open_event = "OPEN_FALLBACK_LIMIT_IOC"
+    return qty, open_event
+
+def _finish_entry(symbol, side, qty, signal_id, open_id, open_event, tp_r, sl_r, price_ref):
+    brackets = _acct().brackets
+    brackets.put(Bracket(symbol, signal_id, side, BR_ENTERED, open_order_id=open_id))
+    journal(symbol, "entry_acked", signal_id, side=side, open_id=open_id, qty=qty)
     techlog({"level":"info","msg":"open_order_ok","symbol":symbol,"side":side,"qty":qty,"order_id":open_id,"open_event":open_event})
 
     # Запис OPEN
@@ -1194,5 +3502,24 @@ def place_orders_oneway(symbol: str, side: str, entry: float, tp: float, sl: flo
     tp_id, sl_id = _place_exits(symbol, side, qty, tp_r, sl_r, signal_id)
     return {"qty":qty,"price_ref":price_ref,"tp":tp_r,"sl":sl_r,"open_order_id":open_id,"tp_id":tp_id,"sl_id":sl_id}
 
+def _resume_handoff(acct: Account, symbol: str, rec: dict):
+    """Продовжує chase, переданий попереднім процесом, і далі — як звичайний вхід (OPEN + виходи)."""
+    with _use_account(acct), _use_signal(rec.get("id")), _inflight():
+        sid = rec.get("id"); side = rec.get("side")
+        try:
+            prof = exec_profile(symbol)
+            tick = fetch_symbol_filters(symbol).get("tickSize") or 0.0001
+            qty = float(rec.get("qty") or 0.0)
+            journal(symbol, "entry_sent", sid, side=side, mode=prof.entry_mode, qty=qty, resumed=True)
+            open_id, filled = _entry_maker_chase(symbol, side, qty, tick, sid, float(rec.get("ref") or 0.0), prof, resume=rec)
+            done = _chase_outcome(symbol, sid, qty, filled, prof)
+            if done is not None:
+                _finish_entry(symbol, side, done[0], sid, open_id, done[1], rec.get("tp"), rec.get("sl"), rec.get("ref"))
+        except ChaseHandoff as h:
+            journal(symbol, "handoff", sid, sync=True, side=side, qty=rec.get("qty"), tp=rec.get("tp"), sl=rec.get("sl"),
+                    ref=rec.get("ref"), **h.state)
+        except Exception as e:
+            techlog({"level":"error","msg":"handoff_resume_failed","symbol":symbol,"id":sid,"err":str(e)})
+
 if __name__=="__main__":
     app.run(host="0.0.0.0", port=int(os.environ.get("PORT","5000")))
@@ -19,12 +19,22 @@ daily_report.py
 - commission_total (USDT)
 
 Якщо угода ще не закрита — рядок не виводиться (можна додати включення відкритих згодом).
+
+Ротації логів (file.<stamp>.gz, file.<stamp>, старі file.1..N) читаються разом з основним файлом;
+.gz розпаковується потоково.
+
+Тижневі/місячні зведення (--period week|month): з кожного дня один раз будується
+агрегат <outdir>/daily_agg/YYYY-MM-DD.json (PnL, комісії, delay_ms, розбивка по символах).
+Завершений день (минув і без відкритих угод, або старший за --final-after-days) більше
+не перераховується; логи читаються лише якщо в діапазоні є дні без фінального агрегату.
 """
 
 import argparse
 import glob
+import gzip
+import json
 import os
-from datetime import datetime
+from datetime import date, datetime, timedelta
 from zoneinfo import ZoneInfo
 import pandas as pd
 
@@ -42,8 +52,21 @@ def parse_time(x):
         except Exception:
             return pd.to_datetime(int(float(x)), unit='s', utc=True).tz_convert(KYIV)
 
+def with_rotations(path):
+    """[ротації path від старих до нових..., path] — лише ті, що існують."""
+    rolled = [f for f in glob.glob(glob.escape(path) + ".*") if not f.endswith(".tmp")]
+    rolled.sort(key=os.path.getmtime)
+    return rolled + ([path] if os.path.exists(path) else [])
+
+def _read_csv(path):
+    # compression="infer" (за замовчуванням) розпаковує .gz потоково
+    try:
+        return pd.read_csv(path)
+    except Exception:
+        return pd.read_csv(path, sep=';')
+
 def load_signals(signals_glob):
-    files = sorted(glob.glob(signals_glob))
+    files = [f for base in sorted(glob.glob(signals_glob)) for f in with_rotations(base)]
     if not files:
         return pd.DataFrame(columns=[
             "signal_id","signal_time","symbol","side","pattern",
@@ -51,10 +74,7 @@ def load_signals(signals_glob):
         ])
     frames = []
     for f in files:
-        try:
-            df = pd.read_csv(f)
-        except Exception:
-            df = pd.read_csv(f, sep=';')
+        df = _read_csv(f)
         # нормалізуємо назви
         lower = {c.lower().strip(): c for c in df.columns}
         rename = {}
@@ -87,29 +107,55 @@ def load_signals(signals_glob):
     out = out.dropna(subset=["signal_id","signal_time"])
     return out
 
-def load_execs(execs_path):
-    if not os.path.exists(execs_path):
+def exec_sources(execs):
+    """execs: шлях, "акаунт=шлях" або їх список -> [(акаунт, шлях)]; без імені — main."""
+    out = []
+    for item in ([execs] if isinstance(execs, str) else execs):
+        name, sep, path = item.partition("=")
+        out.append((name, path) if sep and name and os.sep not in name else ("main", item))
+    return out
+
+def load_execs(execs):
+    """Виконання з усіх exec-логів (акаунтів), з колонкою account."""
+    frames = []
+    for account, path in exec_sources(execs):
+        df = _load_exec_file(path)
+        if df is not None:
+            df["account"] = account
+            frames.append(df)
+    if not frames:
         return pd.DataFrame(columns=[
             "signal_id","event","time","price","qty","commission","commission_asset","realized_pnl",
-            "symbol","side","order_id"
+            "symbol","side","order_id","account"
         ])
+    df = pd.concat(frames, ignore_index=True)
+    df["time"] = df["time"].apply(parse_time)
+    for col in ["price","qty","commission","realized_pnl"]:
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+    df["event"] = df["event"].astype(str).str.upper()
+    return df
+
+def _load_exec_file(execs_path):
+    """Один exec-лог з ротаціями -> DataFrame з нормалізованими колонками або None."""
+    files = with_rotations(execs_path)
+    if not files:
+        return None
     if execs_path.endswith(".jsonl"):
         import json
         rows = []
-        with open(execs_path, "r", encoding="utf-8") as f:
-            for line in f:
-                line=line.strip()
-                if not line: continue
-                try:
-                    rows.append(json.loads(line))
-                except Exception:
-                    pass
+        for path in files:
+            opener = gzip.open if path.endswith(".gz") else open
+            with opener(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    line=line.strip()
+                    if not line: continue
+                    try:
+                        rows.append(json.loads(line))
+                    except Exception:
+                        pass
         df = pd.DataFrame(rows)
     else:
-        try:
-            df = pd.read_csv(execs_path)
-        except Exception:
-            df = pd.read_csv(execs_path, sep=';')
+        df = pd.concat([_read_csv(f) for f in files], ignore_index=True)
 
     lower = {c.lower().strip(): c for c in df.columns}
     rename = {}
@@ -121,17 +167,12 @@ def load_execs(execs_path):
                 "realized_pnl","symbol","side","order_id"]:
         if col not in df.columns:
             df[col] = pd.NA
-
-    df["time"] = df["time"].apply(parse_time)
-    for col in ["price","qty","commission","realized_pnl"]:
-        df[col] = pd.to_numeric(df[col], errors="coerce")
-    df["event"] = df["event"].astype(str).str.upper()
     return df
 
 def build_daily(signals_df, execs_df, day):
-    """Збираємо завершені угоди за день (за датою signal_time у Europe/Kyiv)."""
+    """Збираємо завершені угоди за день (за датою signal_time у Europe/Kyiv), окремо по кожному акаунту."""
     empty_cols = [
-        "date","signal_id","signal_time","delay_ms",
+        "date","signal_id","account","signal_time","delay_ms",
         "indicator_entry","indicator_sl","indicator_tp",
         "order_open_time","executed_entry_price","entry_notional",
         "order_close_time","executed_close_price","pnl","commission_total",
@@ -148,9 +189,13 @@ def build_daily(signals_df, execs_df, day):
 
     # виконання тільки для потрібних signal_id
     execs = execs_df[execs_df["signal_id"].isin(sday["signal_id"].unique())].copy()
+    if "account" not in execs.columns:
+        execs["account"] = "main"
+    execs["account"] = execs["account"].fillna("main")
 
     # агрегуємо OPEN
-    opens = execs[execs["event"]=="OPEN"].groupby("signal_id").agg(
+    # бот пише OPEN_MARKET/OPEN_LIMIT/OPEN_MAKER_CHASE/OPEN_FALLBACK_*, CLOSE_TP/CLOSE_SL/CLOSE_MANUAL
+    opens = execs[execs["event"].astype(str).str.startswith("OPEN")].groupby(["signal_id","account"]).agg(
         order_open_time=("time","min"),
         executed_entry_price=("price", lambda x: (x*execs.loc[x.index,"qty"]).sum() /
                               max(execs.loc[x.index,"qty"].sum(),1e-9)),
@@ -159,7 +204,7 @@ def build_daily(signals_df, execs_df, day):
     ).reset_index()
 
     # агрегуємо CLOSE
-    closes = execs[execs["event"]=="CLOSE"].groupby("signal_id").agg(
+    closes = execs[execs["event"].astype(str).str.startswith("CLOSE")].groupby(["signal_id","account"]).agg(
         order_close_time=("time","max"),
         executed_close_price=("price", lambda x: (x*execs.loc[x.index,"qty"]).sum() /
                               max(execs.loc[x.index,"qty"].sum(),1e-9)),
@@ -167,7 +212,7 @@ def build_daily(signals_df, execs_df, day):
         pnl=("realized_pnl","sum")
     ).reset_index()
 
-    agg = sday.merge(opens, on="signal_id", how="left").merge(closes, on="signal_id", how="left")
+    agg = sday.merge(opens, on="signal_id", how="left").merge(closes, on=["signal_id","account"], how="left")
 
     # метрики
     agg["delay_ms"] = (agg["order_open_time"] - agg["signal_time"]).dt.total_seconds()*1000.0
@@ -179,29 +224,197 @@ def build_daily(signals_df, execs_df, day):
     done.insert(0, "date", day)
 
     cols = [
-        "date","signal_id","signal_time","delay_ms",
+        "date","signal_id","account","signal_time","delay_ms",
         "indicator_entry","indicator_sl","indicator_tp",
         "order_open_time","executed_entry_price","entry_notional",
         "order_close_time","executed_close_price","pnl","commission_total",
         "symbol","side","pattern"
     ]
-    return done[cols].sort_values("signal_time")
+    return done[cols].sort_values(["signal_time","account"])
+
+# ====== ДЕННІ АГРЕГАТИ ТА ЗВЕДЕННЯ ======
+AGG_VERSION = 3   # 2: угоди по (signal_id, account) з усіх exec-логів; 3: події OPEN_*/CLOSE_* (раніше — порожні фінальні дні)
+
+def _agg_path(cache_dir, day):
+    return os.path.join(cache_dir, f"{day}.json")
+
+def load_day_aggregate(cache_dir, day):
+    try:
+        with open(_agg_path(cache_dir, day), encoding="utf-8") as f:
+            agg = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return agg if agg.get("v") == AGG_VERSION else None
+
+def save_day_aggregate(cache_dir, agg):
+    os.makedirs(cache_dir, exist_ok=True)
+    path = _agg_path(cache_dir, agg["day"])
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(agg, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+
+def _num(x):
+    return float(x) if pd.notna(x) else 0.0
+
+def build_day_aggregate(signals_df, execs_df, day, now=None, final_after_days=7):
+    """Агрегат одного дня (Europe/Kyiv) з завершених угод build_daily + к-сть ще відкритих."""
+    daily = build_daily(signals_df, execs_df, day)
+    day_start = pd.Timestamp(day, tz=KYIV)
+    day_end = day_start + pd.Timedelta(days=1)
+    open_n = 0
+    if not signals_df.empty:
+        ids = signals_df.loc[(signals_df["signal_time"]>=day_start) & (signals_df["signal_time"]<day_end), "signal_id"]
+        ex = execs_df[execs_df["signal_id"].isin(ids.unique())]
+        ex = ex.assign(account=ex["account"].fillna("main") if "account" in ex.columns else "main")
+        seen = {}
+        for e in ("OPEN", "CLOSE"):
+            m = ex["event"].astype(str).str.startswith(e)
+            seen[e] = set(zip(ex.loc[m, "signal_id"], ex.loc[m, "account"]))
+        open_n = len(seen["OPEN"] - seen["CLOSE"])
+    now = now or pd.Timestamp.now(tz=KYIV)
+    final = now >= day_end and (open_n == 0 or now >= day_end + pd.Timedelta(days=final_after_days))
+
+    symbols = {}
+    for r in daily.itertuples(index=False):
+        pnl, comm = _num(r.pnl), _num(r.commission_total)
+        s = symbols.setdefault(str(r.symbol), {"trades":0, "pnl":0.0, "commission":0.0, "wins":0})
+        s["trades"] += 1; s["pnl"] += pnl; s["commission"] += comm; s["wins"] += int(pnl > 0)
+    pnl = [_num(x) for x in daily["pnl"]]
+    return {
+        "v": AGG_VERSION, "day": day, "final": bool(final),
+        "built_at": datetime.now(KYIV).isoformat(timespec="seconds"),
+        "trades": len(daily), "open": open_n,
+        "pnl": sum(pnl), "commission": sum(_num(x) for x in daily["commission_total"]),
+        "notional": sum(_num(x) for x in daily["entry_notional"]),
+        "wins": sum(1 for x in pnl if x > 0), "losses": sum(1 for x in pnl if x < 0),
+        "delays_ms": sorted(round(float(x), 1) for x in daily["delay_ms"] if pd.notna(x)),
+        "symbols": symbols,
+    }
+
+def _days(start, end):
+    d0, d1 = date.fromisoformat(start), date.fromisoformat(end)
+    return [(d0 + timedelta(days=i)).isoformat() for i in range((d1 - d0).days + 1)]
+
+def period_bounds(day, period):
+    """Тиждень (пн-нд) або календарний місяць, що містить day -> (start, end)."""
+    d = date.fromisoformat(day)
+    if period == "week":
+        s = d - timedelta(days=d.weekday())
+        return s.isoformat(), (s + timedelta(days=6)).isoformat()
+    if period == "month":
+        s = d.replace(day=1)
+        e = (s.replace(year=s.year + 1, month=1) if s.month == 12 else s.replace(month=s.month + 1)) - timedelta(days=1)
+        return s.isoformat(), e.isoformat()
+    return day, day
+
+def _period_key(day, period):
+    d = date.fromisoformat(day)
+    if period == "week":
+        y, w, _ = d.isocalendar()
+        return f"{y}-W{w:02d}"
+    if period == "month":
+        return day[:7]
+    return day
+
+def _pct(sorted_vals, q):
+    if not sorted_vals:
+        return None
+    k = (len(sorted_vals) - 1) * q
+    lo = int(k); hi = min(lo + 1, len(sorted_vals) - 1)
+    return round(sorted_vals[lo] + (sorted_vals[hi] - sorted_vals[lo]) * (k - lo), 1)
+
+def _rollup(aggs):
+    out = {"days": len(aggs), "trades": 0, "open": 0, "pnl": 0.0, "commission": 0.0,
+           "notional": 0.0, "wins": 0, "losses": 0, "symbols": {}}
+    delays = []
+    for a in aggs:
+        for k in ("trades", "open", "pnl", "commission", "notional", "wins", "losses"):
+            out[k] += a[k]
+        delays.extend(a["delays_ms"])
+        for sym, s in a["symbols"].items():
+            t = out["symbols"].setdefault(sym, {"trades":0, "pnl":0.0, "commission":0.0, "wins":0})
+            for k in t:
+                t[k] += s[k]
+    delays.sort()
+    out["net"] = out["pnl"] - out["commission"]
+    out["delay_ms"] = {"count": len(delays), "p50": _pct(delays, 0.5), "p90": _pct(delays, 0.9),
+                       "p99": _pct(delays, 0.99), "max": delays[-1] if delays else None}
+    for s in out["symbols"].values():
+        s["net"] = s["pnl"] - s["commission"]
+    out["symbols"] = dict(sorted(out["symbols"].items(), key=lambda kv: -kv[1]["net"]))
+    return out
+
+def build_range(start, end, period, signals_glob, execs, cache_dir, final_after_days=7):
+    """
+    Зведення за [start, end] по періодах day|week|month з кешованих денних агрегатів.
+    Логи читаються один раз і лише якщо є дні без фінального агрегату.
+    """
+    days = _days(start, end)
+    today = datetime.now(KYIV).strftime("%Y-%m-%d")
+    aggs, missing, cached = {}, [], 0
+    for d in days:
+        a = load_day_aggregate(cache_dir, d)
+        if a is not None and a.get("final"):
+            aggs[d] = a; cached += 1
+        elif d > today:
+            aggs[d] = build_day_aggregate(pd.DataFrame(), pd.DataFrame(), d)   # майбутнє: порожньо, не кешуємо
+        else:
+            missing.append(d)
+    if missing:
+        signals, execs_df = load_signals(signals_glob), load_execs(execs)
+        for d in missing:
+            aggs[d] = build_day_aggregate(signals, execs_df, d, final_after_days=final_after_days)
+            save_day_aggregate(cache_dir, aggs[d])
+
+    buckets = {}
+    for d in days:
+        buckets.setdefault(_period_key(d, period), []).append(aggs[d])
+    periods = []
+    for key, items in buckets.items():
+        r = _rollup(items)
+        periods.append({"period": key, "start": items[0]["day"], "end": items[-1]["day"],
+                        "final": all(a["final"] for a in items), **r})
+    return {"start": start, "end": end, "period": period,
+            "days_cached": cached, "days_built": len(missing),
+            "total": _rollup([aggs[d] for d in days]), "periods": periods}
 
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--signals", default="logs/*.csv",
                     help="Глоб-шаблон для CSV із сигналами (за замовчуванням logs/*.csv)")
-    ap.add_argument("--execs", default="logs/executions.csv",
-                    help="Файл з виконаннями біржі (CSV або JSONL)")
+    ap.add_argument("--execs", nargs="+", default=["logs/executions.csv"],
+                    help="Файли з виконаннями біржі (CSV або JSONL); по акаунтах — акаунт=шлях")
     ap.add_argument("--date", default=None,
                     help="Дата у форматі YYYY-MM-DD (Europe/Kyiv). Якщо не задано — поточна дата.")
     ap.add_argument("--outdir", default=".",
                     help="Куди писати daily-файл")
+    ap.add_argument("--period", choices=["day","week","month"], default=None,
+                    help="Зведення замість daily-файлу: тиждень/місяць, що містить --date, або --start..--end")
+    ap.add_argument("--start", default=None, help="Початок діапазону YYYY-MM-DD (з --period)")
+    ap.add_argument("--end", default=None, help="Кінець діапазону YYYY-MM-DD (з --period)")
+    ap.add_argument("--cache-dir", default=None,
+                    help="Кеш денних агрегатів (за замовчуванням <outdir>/daily_agg)")
+    ap.add_argument("--final-after-days", type=int, default=7,
+                    help="Через скільки днів день фіналізується навіть з відкритими угодами")
     args = ap.parse_args()
 
     day = args.date or datetime.now(KYIV).strftime("%Y-%m-%d")
     os.makedirs(args.outdir, exist_ok=True)
 
+    if args.period:
+        start, end = period_bounds(day, args.period)
+        start, end = args.start or start, args.end or end
+        if start > end:
+            ap.error("--start must not be after --end")
+        rep = build_range(start, end, args.period, args.signals, args.execs,
+                          args.cache_dir or os.path.join(args.outdir, "daily_agg"), args.final_after_days)
+        out_path = os.path.join(args.outdir, f"rollup_{args.period}_{start}_{end}.json")
+        with open(out_path, "w", encoding="utf-8") as f:
+            json.dump(rep, f, ensure_ascii=False, indent=2)
+        print(f"Written: {out_path} ({len(rep['periods'])} rows)")
+        return
+
     signals = load_signals(args.signals)
     execs = load_execs(args.execs)
 
@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+"""
+loadgen.py
+
+Генератор навантаження на живий /webhook (gunicorn або flask): валідні HMAC-підписані сигнали
+у форматі validate_payload з домішкою дублів, протермінованих часових міток і поганих підписів.
+
+Відкритий цикл (--rps): запити відправляються за розкладом незалежно від відповідей, латентність
+рахується від запланованого моменту — черга на сервері не ховається (coordinated omission).
+Закритий цикл (--concurrency): N клієнтів, кожен шле наступний запит після відповіді.
+
+Запуск:
+  python loadgen.py --url http://127.0.0.1:8000 --rps 5,10,20,50 --step-sec 20
+  python loadgen.py --url http://127.0.0.1:8000 --concurrency 16 --step-sec 30 --dup-ratio 0.2 --stale-ratio 0.05
+  python loadgen.py --url http://127.0.0.1:8000 --rps 10,20,40,80 --max-error-rate 0.05 \\
+      --pid $(pgrep -of "gunicorn bot:app") --admin-token "$ADMIN_TOKEN" --json load.json
+
+Звіт по кожному кроку: досягнутий RPS, перцентилі латентності (загалом і по класах відповідей),
+розбивка відповідей (HTTP-код + msg сервера, таймаути, обриви), CPU/RSS процесів сервера
+(--pid разом із дочірніми воркерами, лише Linux) і приріст bot_webhook_requests_total з /metrics.
+
+Перед стартом читає /healthz і відмовляється працювати, якщо на цілі увімкнена торгівля
+(trading_enabled не false або /healthz не прочитати) — валідні сигнали там стали б реальними ордерами.
+Свідомо проти такого інстансу — лише з --allow-live.
+"""
+
+import argparse
+import hashlib
+import hmac
+import http.client
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlsplit
+
+# ====== PAYLOADS ======
+class SignalFactory:
+    """
+    Сигнали для validate_payload. Кожен свіжий сигнал має унікальний "id" (ext|...), тож дедуп
+    бота спрацьовує лише на навмисних дублях (--dup-ratio повторює один із попередніх тіл байт-у-байт).
+    """
+    def __init__(self, secret, pattern, symbols, dup_ratio=0.0, stale_ratio=0.0, bad_sig_ratio=0.0,
+                 stale_age_sec=3600, ext_id=True, seed=0):
+        self.secret = secret.encode()
+        self.pattern = pattern
+        self.symbols = symbols
+        self.dup_ratio = dup_ratio; self.stale_ratio = stale_ratio; self.bad_sig_ratio = bad_sig_ratio
+        self.stale_age_sec = stale_age_sec
+        self.ext_id = ext_id
+        self._rnd = random.Random(seed)
+        self._lock = threading.Lock()
+        self._recent = []
+
+    def sign(self, raw: bytes) -> str:
+        return hmac.new(self.secret, raw, hashlib.sha256).hexdigest()
+
+    def next(self):
+        """-> (kind, body bytes, headers); kind = fresh | dup | stale | bad_sig."""
+        with self._lock:
+            r = self._rnd.random()
+            if r < self.dup_ratio and self._recent:
+                raw = self._rnd.choice(self._recent)
+                return "dup", raw, self._headers(raw)
+            r -= self.dup_ratio
+            kind = "stale" if r < self.stale_ratio else ("bad_sig" if r < self.stale_ratio + self.bad_sig_ratio else "fresh")
+            sym = self._rnd.choice(self.symbols)
+            side = self._rnd.choice(("long", "short"))
+            px = 100.0 + self._rnd.random() * 10.0
+            tp, sl = (px * 1.01, px * 0.99) if side == "long" else (px * 0.99, px * 1.01)
+            now = datetime.now(timezone.utc)
+            if kind == "stale":
+                now -= timedelta(seconds=self.stale_age_sec)
+            d = {"signal": "entry", "symbol": sym, "side": side, "pattern": self.pattern,
+                 "time": now.isoformat(timespec="milliseconds").replace("+00:00", "Z"),
+                 "entry": f"{px:.4f}", "tp": f"{tp:.4f}", "sl": f"{sl:.4f}"}
+            if self.ext_id:
+                d["id"] = uuid.UUID(int=self._rnd.getrandbits(128)).hex
+            raw = json.dumps(d, separators=(",", ":")).encode()
+            if kind == "fresh":
+                self._recent.append(raw)
+                if len(self._recent) > 256:
+                    del self._recent[:-256]
+            headers = self._headers(raw)
+            if kind == "bad_sig":
+                headers["X-Signature"] = "0" * 64
+            return kind, raw, headers
+
+    def _headers(self, raw):
+        return {"Content-Type": "application/json", "X-Signature": self.sign(raw)}
+
+# ====== HTTP ======
+class Target:
+    def __init__(self, url, timeout, keepalive=False):
+        u = urlsplit(url)
+        self.https = u.scheme == "https"
+        self.host = u.hostname or "127.0.0.1"
+        self.port = u.port or (443 if self.https else 80)
+        self.base = u.path.rstrip("/")
+        self.timeout = timeout
+        self.keepalive = keepalive
+        self._tl = threading.local()
+
+    def _conn(self):
+        cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        return cls(self.host, self.port, timeout=self.timeout)
+
+    def request(self, method, path, body=None, headers=None):
+        """-> (status, body bytes). Без --keepalive — нове з'єднання на запит, як у TradingView."""
+        c = getattr(self._tl, "c", None) if self.keepalive else None
+        if c is None:
+            c = self._conn()
+        try:
+            c.request(method, self.base + path, body=body, headers=headers or {})
+            resp = c.getresponse()
+            data = resp.read()
+            if self.keepalive and not resp.will_close:
+                self._tl.c = c
+            else:
+                c.close(); self._tl.c = None
+            return resp.status, data
+        except Exception:
+            c.close(); self._tl.c = None
+            raise
+
+def trading_enabled(target):
+    """-> trading_enabled з /healthz цілі (True/False) або None, якщо його не вдалося прочитати."""
+    try:
+        _, data = target.request("GET", "/healthz")
+        health = json.loads(data)
+    except (OSError, http.client.HTTPException, ValueError):
+        return None
+    v = health.get("trading_enabled") if isinstance(health, dict) else None
+    return v if isinstance(v, bool) else None
+
+def _classify(status, data) -> str:
+    msg = ""
+    try:
+        msg = str(json.loads(data).get("msg") or "")
+    except (ValueError, AttributeError):
+        pass
+    msg = re.sub(r"\d+", "N", msg)[:40]
+    return f"{status}:{msg}" if msg else str(status)
+
+def _client_error(e) -> str:
+    if isinstance(e, TimeoutError) or "timed out" in str(e):
+        return "timeout"
+    return f"conn_error:{type(e).__name__}"
+
+# ====== SERVER-SIDE RESOURCES ======
+_CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+_PAGE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+def _proc_tree(root_pids):
+    """root pid-и + усі нащадки (воркери gunicorn) за /proc/*/stat."""
+    parents = {}
+    for d in os.listdir("/proc"):
+        if d.isdigit():
+            try:
+                with open(f"/proc/{d}/stat", "rb") as f:
+                    parents[int(d)] = int(f.read().rsplit(b")", 1)[1].split()[1])
+            except (OSError, ValueError, IndexError):
+                pass
+    out = set(root_pids)
+    changed = True
+    while changed:
+        changed = False
+        for p, pp in parents.items():
+            if pp in out and p not in out:
+                out.add(p); changed = True
+    return out
+
+def _proc_usage(pids):
+    """-> (cpu ticks utime+stime, rss bytes) сумарно по процесах."""
+    ticks = rss = 0
+    for p in pids:
+        try:
+            with open(f"/proc/{p}/stat", "rb") as f:
+                fields = f.read().rsplit(b")", 1)[1].split()
+            ticks += int(fields[11]) + int(fields[12])
+            with open(f"/proc/{p}/statm", "rb") as f:
+                rss += int(f.read().split()[1]) * _PAGE
+        except (OSError, ValueError, IndexError):
+            pass
+    return ticks, rss
+
+class ResourceSampler:
+    """CPU% і пік RSS серверних процесів за крок; семплює раз на interval."""
+    def __init__(self, pids, interval=0.5):
+        self.roots = [int(p) for p in pids]
+        self.interval = interval
+        self._stop = threading.Event()
+        self.peak_rss = 0
+        self._t0 = self._ticks0 = None
+
+    def start(self):
+        self.pids = _proc_tree(self.roots)
+        self._t0 = time.monotonic()
+        self._ticks0, self.peak_rss = _proc_usage(self.pids)
+        self._stop.clear()
+        self._th = threading.Thread(target=self._run, daemon=True)
+        self._th.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.pids = _proc_tree(self.roots)
+            self.peak_rss = max(self.peak_rss, _proc_usage(self.pids)[1])
+
+    def stop(self) -> dict:
+        self._stop.set(); self._th.join()
+        ticks, rss = _proc_usage(self.pids)
+        wall = max(1e-9, time.monotonic() - self._t0)
+        return {"processes": len(self.pids), "cpu_pct": round((ticks - self._ticks0) / _CLK_TCK / wall * 100.0, 1),
+                "rss_mb": round(rss / 1048576, 1), "peak_rss_mb": round(max(self.peak_rss, rss) / 1048576, 1)}
+
+_METRIC_LINE = re.compile(r'^(bot_webhook_requests_total|bot_webhook_duration_seconds_(?:sum|count)|bot_threads)(\{[^}]*\})?\s+([0-9.eE+-]+)$')
+
+def scrape_metrics(target: Target, token):
+    """{series: value} з /metrics; None, якщо недоступно."""
+    try:
+        status, data = target.request("GET", "/metrics", headers={"X-Admin-Token": token} if token else {})
+    except Exception:
+        return None
+    if status != 200:
+        return None
+    out = {}
+    for line in data.decode("utf-8", "replace").splitlines():
+        m = _METRIC_LINE.match(line)
+        if m:
+            out[m.group(1) + (m.group(2) or "")] = float(m.group(3))
+    return out
+
+def _metrics_delta(a, b) -> dict:
+    if a is None or b is None:
+        return {}
+    out = {}
+    for k, v in b.items():
+        if k.startswith("bot_webhook_requests_total"):
+            d = v - a.get(k, 0.0)
+            if d:
+                out[re.sub(r'.*outcome="([^"]*)".*', r"\1", k)] = int(d)
+    n = b.get("bot_webhook_duration_seconds_count", 0.0) - a.get("bot_webhook_duration_seconds_count", 0.0)
+    s = b.get("bot_webhook_duration_seconds_sum", 0.0) - a.get("bot_webhook_duration_seconds_sum", 0.0)
+    res = {"outcomes": out}
+    if n > 0:
+        res["server_mean_ms"] = round(s / n * 1000.0, 3)
+    if "bot_threads" in b:
+        res["threads"] = int(b["bot_threads"])
+    return res
+
+# ====== RUN ======
+def _pct(vals, p):
+    if not vals:
+        return None
+    s = sorted(vals)
+    k = min(len(s) - 1, max(0, int(round(p / 100.0 * (len(s) - 1)))))
+    return s[k]
+
+def _summary(vals):
+    return {"count": len(vals), "p50": _pct(vals, 50), "p90": _pct(vals, 90),
+            "p99": _pct(vals, 99), "max": max(vals) if vals else None}
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.lat = []                       # мс від запланованого моменту (open) / від відправки (closed)
+        self.service = []                   # мс від відправки до відповіді
+        self.by_class = defaultdict(list)
+        self.kinds = defaultdict(int)
+        self.sent = 0
+
+    def add(self, kind, cls, lat_ms, service_ms):
+        with self.lock:
+            self.lat.append(lat_ms); self.service.append(service_ms)
+            self.by_class[cls].append(lat_ms)
+            self.kinds[kind] += 1
+
+def _fire(target, factory, rec, scheduled):
+    kind, raw, headers = factory.next()
+    t_send = time.perf_counter()
+    try:
+        status, data = target.request("POST", "/webhook", raw, headers)
+        cls = _classify(status, data)
+    except Exception as e:
+        cls = _client_error(e)
+    t_end = time.perf_counter()
+    rec.add(kind, cls, (t_end - (scheduled or t_send)) * 1000.0, (t_end - t_send) * 1000.0)
+
+def run_open(target, factory, rps, seconds, max_inflight, poisson, seed):
+    rec = Recorder()
+    rnd = random.Random(seed)
+    pool = ThreadPoolExecutor(max_workers=max_inflight, thread_name_prefix="load")
+    t0 = time.perf_counter(); nxt = t0
+    lag_max = 0.0
+    while nxt < t0 + seconds:
+        now = time.perf_counter()
+        if nxt > now:
+            time.sleep(nxt - now)
+        lag_max = max(lag_max, time.perf_counter() - nxt)
+        pool.submit(_fire, target, factory, rec, nxt)
+        rec.sent += 1
+        nxt += rnd.expovariate(rps) if poisson else 1.0 / rps
+    pool.shutdown(wait=True)
+    return rec, time.perf_counter() - t0, lag_max
+
+def run_closed(target, factory, concurrency, seconds, think_ms):
+    rec = Recorder()
+    t0 = time.perf_counter(); deadline = t0 + seconds
+
+    def client():
+        while time.perf_counter() < deadline:
+            _fire(target, factory, rec, None)
+            with rec.lock:
+                rec.sent += 1
+            if think_ms:
+                time.sleep(think_ms / 1000.0)
+
+    ths = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    for th in ths: th.start()
+    for th in ths: th.join()
+    return rec, time.perf_counter() - t0, 0.0
+
+_ERROR = re.compile(r"^(429|5\d\d)|^timeout|^conn_error")
+
+def _step_report(label, rec, wall, lag_max, resources, server):
+    done = len(rec.lat)
+    errors = sum(len(v) for k, v in rec.by_class.items() if _ERROR.match(k))
+    return {"step": label, "sent": rec.sent, "done": done, "wall_sec": round(wall, 3),
+            "achieved_rps": round(done / wall, 2) if wall else None,
+            "error_rate": round(errors / done, 4) if done else None,
+            "latency_ms": _summary(rec.lat), "service_ms": _summary(rec.service),
+            "by_response": {k: _summary(v) for k, v in sorted(rec.by_class.items(), key=lambda kv: -len(kv[1]))},
+            "payload_kinds": dict(rec.kinds), "client_lag_max_ms": round(lag_max * 1000.0, 2),
+            "resources": resources, "server": server}
+
+def _fmt(v):
+    return f"{v:9.2f}" if v is not None else f"{'-':>9s}"
+
+def _print_step(r):
+    l = r["latency_ms"]
+    print(f"\n== {r['step']}: sent={r['sent']} done={r['done']} achieved={r['achieved_rps']}/s "
+          f"errors={r['error_rate']} client_lag_max={r['client_lag_max_ms']}ms")
+    print(f"latency ms: p50={_fmt(l['p50'])} p90={_fmt(l['p90'])} p99={_fmt(l['p99'])} max={_fmt(l['max'])}")
+    print(f"{'response':44s} {'count':>7s} {'p50':>9s} {'p99':>9s} {'max':>9s}")
+    for k, s in r["by_response"].items():
+        print(f"{k:44s} {s['count']:7d} {_fmt(s['p50'])} {_fmt(s['p99'])} {_fmt(s['max'])}")
+    if r["resources"]:
+        x = r["resources"]
+        print(f"server: processes={x['processes']} cpu={x['cpu_pct']}% rss={x['rss_mb']}MB peak_rss={x['peak_rss_mb']}MB")
+    if r["server"]:
+        x = r["server"]
+        print(f"/metrics: mean_handling={x.get('server_mean_ms')}ms threads={x.get('threads')} outcomes={x.get('outcomes')}")
+
+def main():
+    ap = argparse.ArgumentParser(description="Навантаження на /webhook підписаними сигналами")
+    ap.add_argument("--url", required=True, help="База сервісу, напр. http://127.0.0.1:8000")
+    ap.add_argument("--secret", default=os.environ.get("WEBHOOK_SECRET", ""), help="WEBHOOK_SECRET (за замовчуванням з ENV)")
+    ap.add_argument("--pattern", default=os.environ.get("ALLOW_PATTERN", "inside"))
+    ap.add_argument("--symbols", default="10", help="Кількість синтетичних символів або список через кому (BTCUSDT.P,ETHUSDT.P)")
+    mode = ap.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--rps", default=None, help="Відкритий цикл: частота або сходинки через кому (10,20,50)")
+    mode.add_argument("--concurrency", default=None, help="Закритий цикл: кількість клієнтів або сходинки через кому")
+    ap.add_argument("--step-sec", type=float, default=20.0, help="Тривалість кожної сходинки, с")
+    ap.add_argument("--poisson", action="store_true", help="Пуассонівські прибуття замість рівномірних (--rps)")
+    ap.add_argument("--max-inflight", type=int, default=256, help="Макс. одночасних запитів у відкритому циклі")
+    ap.add_argument("--think-ms", type=float, default=0.0, help="Пауза клієнта між запитами (--concurrency)")
+    ap.add_argument("--dup-ratio", type=float, default=0.0, help="Частка дублів (повтор попереднього тіла)")
+    ap.add_argument("--stale-ratio", type=float, default=0.0, help="Частка сигналів зі старою міткою часу")
+    ap.add_argument("--stale-age-sec", type=float, default=3600.0)
+    ap.add_argument("--bad-sig-ratio", type=float, default=0.0, help="Частка запитів із невалідним X-Signature")
+    ap.add_argument("--no-ext-id", action="store_true", help="Без поля id: бот будує id з time/entry/tp/sl")
+    ap.add_argument("--timeout", type=float, default=10.0, help="Таймаут запиту, с")
+    ap.add_argument("--keepalive", action="store_true", help="Перевикористовувати з'єднання")
+    ap.add_argument("--max-error-rate", type=float, default=None,
+                    help="Зупинити сходинки, щойно частка 429/5xx/таймаутів перевищить поріг")
+    ap.add_argument("--pid", action="append", default=[], help="PID сервера (master gunicorn) для CPU/RSS; можна кілька")
+    ap.add_argument("--admin-token", default=os.environ.get("ADMIN_TOKEN", ""), help="Для /metrics")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--json", default=None, help="Зберегти звіт у JSON")
+    ap.add_argument("--allow-live", action="store_true",
+                    help="Дозволити навантаження на інстанс з увімкненою торгівлею (реальні ордери!)")
+    args = ap.parse_args()
+    if not args.secret:
+        ap.error("--secret або WEBHOOK_SECRET обов'язковий")
+
+    syms = ([s.strip() for s in args.symbols.split(",") if s.strip()] if not args.symbols.isdigit()
+            else [f"SYN{i:03d}USDT.P" for i in range(int(args.symbols))])
+    factory = SignalFactory(args.secret, args.pattern, syms, args.dup_ratio, args.stale_ratio, args.bad_sig_ratio,
+                            args.stale_age_sec, not args.no_ext_id, args.seed)
+    target = Target(args.url, args.timeout, args.keepalive)
+    live = trading_enabled(target)
+    if live is not False:
+        why = "trading_enabled=true" if live else "не вдалося прочитати trading_enabled з /healthz"
+        if not args.allow_live:
+            ap.error(f"{args.url}: {why} — сигнали можуть стати реальними ордерами; відмова (свідомо — --allow-live)")
+        print(f"[WARN] {args.url}: {why}, --allow-live — навантаження піде на живу торгівлю")
+    sampler = ResourceSampler(args.pid) if args.pid and os.path.isdir("/proc") else None
+    levels = [float(x) for x in (args.rps or args.concurrency).split(",") if x.strip()]
+
+    steps = []
+    for lv in levels:
+        label = f"rps={lv:g}" if args.rps else f"concurrency={int(lv)}"
+        m0 = scrape_metrics(target, args.admin_token)
+        if sampler: sampler.start()
+        if args.rps:
+            rec, wall, lag = run_open(target, factory, lv, args.step_sec, args.max_inflight, args.poisson, args.seed)
+        else:
+            rec, wall, lag = run_closed(target, factory, int(lv), args.step_sec, args.think_ms)
+        res = sampler.stop() if sampler else None
+        r = _step_report(label, rec, wall, lag, res, _metrics_delta(m0, scrape_metrics(target, args.admin_token)))
+        steps.append(r)
+        _print_step(r)
+        if args.max_error_rate is not None and (r["error_rate"] or 0.0) > args.max_error_rate:
+            print(f"\nerror rate {r['error_rate']} > {args.max_error_rate} — зупинка на {label}")
+            break
+
+    ok = [s for s in steps if args.max_error_rate is None or (s["error_rate"] or 0.0) <= args.max_error_rate]
+    if len(levels) > 1:
+        print("\nstep                     achieved/s  err_rate   p50 ms    p99 ms")
+        for s in steps:
+            l = s["latency_ms"]
+            print(f"{s['step']:24s} {s['achieved_rps']:10.2f} {s['error_rate'] or 0.0:9.4f} {_fmt(l['p50'])} {_fmt(l['p99'])}")
+        if ok and args.max_error_rate is not None:
+            print(f"capacity (error_rate <= {args.max_error_rate}): {ok[-1]['step']} -> {ok[-1]['achieved_rps']}/s")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"url": args.url, "mode": "open" if args.rps else "closed", "steps": steps}, f, indent=2)
+        print(f"Saved: {args.json}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+logindex.py
+
+Інкрементальний on-disk індекс логів бота (tech.jsonl, inside.csv, executions.csv
+усіх акаунтів, включно з ротаціями .gz): signal id / символ / час -> (файл, offset).
+Дозволяє за мілісекунди дістати весь життєвий цикл сигналу, не грепаючи логи.
+
+Індекс — SQLite-файл; кожен прохід catch_up() дочитує лише нові байти кожного файлу.
+Ротацію бот повідомляє через moved()/dropped(), тож offsets лишаються валідними
+(для .gz offset рахується у розпакованому потоці).
+
+CLI:
+  python logindex.py --log-dir logs --id "ext|abc123"
+  python logindex.py --log-dir logs --symbol BTCUSDT --since 2024-05-01T00:00:00Z --until 2024-05-02T00:00:00Z
+"""
+
+import argparse
+import csv
+import glob
+import gzip
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+from datetime import datetime, timezone
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY, path TEXT UNIQUE, kind TEXT, inode INTEGER,
+    pos INTEGER NOT NULL DEFAULT 0, header TEXT, gz INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS ev (file INTEGER, off INTEGER, len INTEGER, ts REAL, sig TEXT, sym TEXT);
+CREATE INDEX IF NOT EXISTS ev_sig ON ev(sig) WHERE sig IS NOT NULL;
+CREATE INDEX IF NOT EXISTS ev_sym ON ev(sym, ts) WHERE sym IS NOT NULL;
+CREATE INDEX IF NOT EXISTS ev_ts ON ev(ts);
+"""
+
+_SYM_CLEAN = re.compile(r"[^A-Z0-9]")
+
+def norm_symbol(s) -> str:
+    """BINANCE:BTCUSDT.P -> BTCUSDT (як tv_to_binance_symbol у bot.py)."""
+    s = str(s or "").upper().split(":")[-1]
+    if s.endswith(".P"):
+        s = s[:-2]
+    return _SYM_CLEAN.sub("", s)
+
+def parse_ts(v):
+    if v is None or v == "":
+        return None
+    try:
+        return datetime.fromisoformat(str(v).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        pass
+    try:
+        x = float(v)
+        return x / 1000.0 if x > 1e11 else x
+    except ValueError:
+        return None
+
+def _rotations(path) -> list:
+    rolled = [f for f in glob.glob(glob.escape(path) + ".*") if not f.endswith(".tmp")]
+    rolled.sort(key=os.path.getmtime)
+    return rolled
+
+class LogIndex:
+    """logs: [(kind, base_path)], kind = tech | signals | exec."""
+
+    def __init__(self, db_path, logs):
+        self.db_path = db_path
+        self.logs = list(logs)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=10.0, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    # ---------- індексація ----------
+    def _extract(self, kind, line: bytes, header):
+        """-> (ts, sig, sym) для одного рядка."""
+        text = line.decode("utf-8", "replace")
+        if kind == "tech":
+            try:
+                e = json.loads(text)
+            except ValueError:
+                return None, None, None
+            sig = e.get("signal_id") or e.get("id")
+            return parse_ts(e.get("ts")), (sig if isinstance(sig, str) else None), (norm_symbol(e["symbol"]) if e.get("symbol") else None)
+        row = next(csv.reader([text]), [])
+        rec = dict(zip(header or [], row))
+        if kind == "signals":
+            return parse_ts(rec.get("time_iso") or rec.get("time_raw")), rec.get("id") or None, norm_symbol(rec.get("symbol")) or None
+        return parse_ts(rec.get("time")), rec.get("signal_id") or None, norm_symbol(rec.get("symbol")) or None
+
+    def _open(self, path, gz):
+        return gzip.open(path, "rb") if gz else open(path, "rb")
+
+    def _index_file(self, path, kind):
+        """Дочитує файл від збереженої позиції. Викликати під self._lock у транзакції."""
+        st = os.stat(path)
+        gz = path.endswith(".gz")
+        row = self._db.execute("SELECT id, inode, pos, header FROM files WHERE path=?", (path,)).fetchone()
+        if row is not None and not gz and row[1] != st.st_ino:
+            # файл підмінили поза ботом (стара ротація / ручне видалення) — переіндексуємо
+            self._db.execute("DELETE FROM ev WHERE file=?", (row[0],))
+            self._db.execute("DELETE FROM files WHERE id=?", (row[0],))
+            row = None
+        if row is None:
+            cur = self._db.execute("INSERT INTO files(path, kind, inode, pos, gz) VALUES(?,?,?,0,?)",
+                                   (path, kind, st.st_ino, int(gz)))
+            fid, pos, header = cur.lastrowid, 0, None
+        else:
+            fid, pos, header = row[0], row[2], row[3]
+            header = json.loads(header) if header else None
+            if gz and pos > 0:
+                return 0        # стиснуті ротації незмінні
+            if not gz and st.st_size <= pos:
+                return 0
+        with self._open(path, gz) as f:
+            f.seek(pos)
+            buf = f.read()
+        end = buf.rfind(b"\n") + 1
+        if end <= 0:
+            return 0
+        rows = []
+        off = pos
+        for line in buf[:end].split(b"\n")[:-1]:
+            ln = len(line) + 1
+            if kind != "tech" and header is None:
+                header = next(csv.reader([line.decode("utf-8", "replace")]), [])
+            elif line.strip():
+                ts, sig, sym = self._extract(kind, line, header)
+                rows.append((fid, off, len(line), ts, sig, sym))
+            off += ln
+        self._db.executemany("INSERT INTO ev(file, off, len, ts, sig, sym) VALUES(?,?,?,?,?,?)", rows)
+        self._db.execute("UPDATE files SET pos=?, inode=?, header=? WHERE id=?",
+                         (pos + end, st.st_ino, json.dumps(header) if header else None, fid))
+        return len(rows)
+
+    def catch_up(self, paths=None) -> int:
+        """Один прохід: основні файли + ротації; зниклі файли вичищаються. -> к-сть нових подій."""
+        n = 0
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                seen = set()
+                for kind, base in self.logs:
+                    for p in (_rotations(base) + [base]):
+                        if paths is not None and p not in paths:
+                            continue
+                        if not os.path.exists(p):
+                            continue
+                        seen.add(p)
+                        n += self._index_file(p, kind)
+                if paths is None:
+                    for fid, p in self._db.execute("SELECT id, path FROM files").fetchall():
+                        if p not in seen and not os.path.exists(p):
+                            self._db.execute("DELETE FROM ev WHERE file=?", (fid,))
+                            self._db.execute("DELETE FROM files WHERE id=?", (fid,))
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return n
+
+    def moved(self, src, dst):
+        """Ротація/стиснення: src -> dst; ще не проіндексований хвіст дочитається вже з dst."""
+        with self._lock:
+            row = self._db.execute("SELECT id FROM files WHERE path=?", (src,)).fetchone()
+            if row is None:
+                return
+            self._db.execute("UPDATE files SET path=?, gz=? WHERE id=?", (dst, int(dst.endswith(".gz")), row[0]))
+
+    def dropped(self, path):
+        with self._lock:
+            row = self._db.execute("SELECT id FROM files WHERE path=?", (path,)).fetchone()
+            if row is not None:
+                self._db.execute("DELETE FROM ev WHERE file=?", (row[0],))
+                self._db.execute("DELETE FROM files WHERE id=?", (row[0],))
+
+    # ---------- пошук ----------
+    def lookup(self, sig=None, symbol=None, since=None, until=None, limit=1000) -> list:
+        where, args = [], []
+        if sig:
+            where.append("ev.sig=?"); args.append(sig)
+        if symbol:
+            where.append("ev.sym=?"); args.append(norm_symbol(symbol))
+        if since is not None:
+            where.append("ev.ts>=?"); args.append(since)
+        if until is not None:
+            where.append("ev.ts<?"); args.append(until)
+        if not where:
+            raise ValueError("id, symbol or time range required")
+        q = ("SELECT files.path, files.kind, files.header, files.gz, ev.off, ev.len, ev.ts FROM ev "
+             "JOIN files ON files.id=ev.file WHERE " + " AND ".join(where) +
+             " ORDER BY ev.ts, files.path, ev.off LIMIT ?")
+        with self._lock:
+            hits = self._db.execute(q, args + [int(limit)]).fetchall()
+        out = []
+        handles = {}
+        try:
+            for path, kind, header, gz, off, ln, ts in hits:
+                f = handles.get(path)
+                if f is None:
+                    f = handles[path] = self._open(path, gz)
+                f.seek(off)
+                text = f.read(ln).decode("utf-8", "replace")
+                if kind == "tech":
+                    try:
+                        rec = json.loads(text)
+                    except ValueError:
+                        rec = {"raw": text}
+                else:
+                    rec = dict(zip(json.loads(header) if header else [], next(csv.reader([text]), [])))
+                out.append({"log": kind, "file": os.path.basename(path), "ts": ts, "event": rec})
+        finally:
+            for f in handles.values():
+                f.close()
+        return out
+
+    def stats(self) -> dict:
+        with self._lock:
+            files = self._db.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+            events = self._db.execute("SELECT COUNT(*) FROM ev").fetchone()[0]
+        return {"files": files, "events": events, "path": self.db_path}
+
+def default_logs(log_dir, signals="inside.csv", tech="tech.jsonl", execs="executions.csv") -> list:
+    logs = [("signals", os.path.join(log_dir, signals)), ("tech", os.path.join(log_dir, tech)),
+            ("exec", os.path.join(log_dir, execs))]
+    for p in sorted(glob.glob(os.path.join(log_dir, "accounts", "*", execs))):
+        logs.append(("exec", p))
+    return logs
+
+def main():
+    ap = argparse.ArgumentParser(description="Життєвий цикл сигналу з логів бота")
+    ap.add_argument("--log-dir", default=os.environ.get("LOG_DIR", "logs"))
+    ap.add_argument("--db", default=None, help="Файл індексу (за замовчуванням <log-dir>/logindex.sqlite)")
+    ap.add_argument("--id", default=None, help="signal id")
+    ap.add_argument("--symbol", default=None)
+    ap.add_argument("--since", default=None, help="ISO або epoch")
+    ap.add_argument("--until", default=None, help="ISO або epoch")
+    ap.add_argument("--limit", type=int, default=1000)
+    ap.add_argument("--json", action="store_true", help="JSON замість рядків")
+    args = ap.parse_args()
+
+    idx = LogIndex(args.db or os.path.join(args.log_dir, "logindex.sqlite"),
+                   default_logs(args.log_dir, os.environ.get("LOG_FILE", "inside.csv"),
+                                os.environ.get("TECH_LOG", "tech.jsonl"), os.environ.get("EXEC_LOG", "executions.csv")))
+    idx.catch_up()
+    try:
+        events = idx.lookup(args.id, args.symbol, parse_ts(args.since), parse_ts(args.until), args.limit)
+    except ValueError as e:
+        ap.error(str(e))
+    if args.json:
+        json.dump(events, sys.stdout, ensure_ascii=False, indent=2); print()
+        return
+    for e in events:
+        ts = datetime.fromtimestamp(e["ts"], timezone.utc).isoformat().replace("+00:00", "Z") if e["ts"] else "-"
+        print(f"{ts}  {e['log']:7s}  {e['file']:28s}  {json.dumps(e['event'], ensure_ascii=False)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+metrics.py
+
+Легкі лічильники/гістограми у форматі Prometheus text exposition (0.0.4).
+
+Запис без глобального локу: кожен потік пише у власний шард (dict),
+а render() підсумовує шарди. Шарди завершених потоків згортаються у базовий
+шард під час render(), тож пам'ять не росте від потоків на запит.
+"""
+
+import threading
+from bisect import bisect_left
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _esc(v) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _fmt(v) -> str:
+    if isinstance(v, float):
+        if v == float("inf"): return "+Inf"
+        return repr(v)
+    return str(v)
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._tl = threading.local()
+        self._lock = threading.Lock()
+        self._shards = []      # [(thread, dict)]
+        self._base = {}
+
+    def _shard(self) -> dict:
+        try:
+            return self._tl.d
+        except AttributeError:
+            d = self._tl.d = {}
+            with self._lock:
+                self._shards.append((threading.current_thread(), d))
+            return d
+
+    def _lbl(self, key, extra=()) -> str:
+        pairs = list(zip(self.labels, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{_esc(v)}"' for k, v in pairs) + "}"
+
+    def _collect(self) -> dict:
+        with self._lock:
+            live = []
+            merged = {}
+            for th, d in self._shards:
+                snap = dict(d)
+                if th.is_alive():
+                    live.append((th, d))
+                    self._merge(merged, snap)
+                else:
+                    self._merge(self._base, snap)
+            self._shards = live
+            self._merge(merged, self._base)
+        return merged
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labelvalues, n=1):
+        d = self._shard()
+        d[labelvalues] = d.get(labelvalues, 0) + n
+
+    @staticmethod
+    def _merge(dst, src):
+        for k, v in src.items():
+            dst[k] = dst.get(k, 0) + v
+
+    def render(self, out: list):
+        out.append(f"# HELP {self.name} {self.help}")
+        out.append(f"# TYPE {self.name} counter")
+        for k, v in sorted(self._collect().items()):
+            out.append(f"{self.name}{self._lbl(k)} {_fmt(v)}")
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labelvalues):
+        d = self._shard()
+        h = d.get(labelvalues)
+        if h is None:
+            h = d[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+        h[bisect_left(self.buckets, value)] += 1
+        h[-1] += value
+
+    def _merge(self, dst, src):
+        for k, v in src.items():
+            cur = dst.get(k)
+            if cur is None:
+                dst[k] = list(v)
+            else:
+                for i, x in enumerate(v):
+                    cur[i] += x
+
+    def render(self, out: list):
+        out.append(f"# HELP {self.name} {self.help}")
+        out.append(f"# TYPE {self.name} histogram")
+        for k, h in sorted(self._collect().items()):
+            acc = 0
+            for i, le in enumerate(self.buckets):
+                acc += h[i]
+                out.append(f"{self.name}_bucket{self._lbl(k, [('le', _fmt(float(le)))])} {acc}")
+            acc += h[len(self.buckets)]
+            out.append(f'{self.name}_bucket{self._lbl(k, [("le", "+Inf")])} {acc}')
+            out.append(f"{self.name}_sum{self._lbl(k)} {_fmt(h[-1])}")
+            out.append(f"{self.name}_count{self._lbl(k)} {acc}")
+
+class GaugeFn:
+    """Gauge, значення якого обчислюється під час render(): fn() -> число або {labelvalue: число}."""
+    kind = "gauge"
+
+    def __init__(self, name, help, fn, label=None):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.label = label
+
+    def render(self, out: list):
+        try:
+            v = self.fn()
+        except Exception:
+            return
+        out.append(f"# HELP {self.name} {self.help}")
+        out.append(f"# TYPE {self.name} gauge")
+        if isinstance(v, dict):
+            for k, x in sorted(v.items()):
+                out.append(f'{self.name}{{{self.label}="{_esc(k)}"}} {_fmt(x)}')
+        else:
+            out.append(f"{self.name} {_fmt(v)}")
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, help, labels=()):
+        m = Counter(name, help, labels); self._metrics.append(m); return m
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        m = Histogram(name, help, labels, buckets); self._metrics.append(m); return m
+
+    def gauge_fn(self, name, help, fn, label=None):
+        m = GaugeFn(name, help, fn, label); self._metrics.append(m); return m
+
+    def render(self) -> str:
+        out = []
+        for m in self._metrics:
+            m.render(out)
+        out.append("")
+        return "\n".join(out)
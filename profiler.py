@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+profiler.py
+
+Профілювання живого процесу без редеплою.
+
+sample(): семплер стеків усіх потоків через sys._current_frames() на N секунд ->
+collapsed stacks ("потік;файл:функція;... кількість"), які напряму читають
+flamegraph.pl / speedscope / inferno. Поки семплер не запущено, накладних витрат немає:
+окремий потік живе лише під час семплування.
+
+BackgroundSampler: sample() у фоновому потоці — HTTP-запит лише запускає семплер і потім
+забирає результат, тож воркер gunicorn не блокується на весь час профілювання.
+
+OneShotProfile: cProfile для одного наступного запиту з заданим шляхом.
+"""
+
+import io, os, re, sys, time, threading, cProfile, pstats, marshal
+from collections import Counter
+
+_SAMPLE_LOCK = threading.Lock()
+_POOL_SUFFIX = re.compile(r"[_-]\d+$")
+
+def _frame_label(code) -> str:
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+def _thread_label(th) -> str:
+    # потоки пулів (acct_0, batch_3, ...) зводимо до імені пулу, інакше стеки розсипаються
+    name = th.name if th is not None else "unknown"
+    return _POOL_SUFFIX.sub("", name).replace(";", "_").replace(" ", "_")
+
+def sample(seconds: float, interval: float = 0.005, max_depth: int = 128):
+    """
+    -> (Counter{collapsed_stack: samples}, meta). Повертає None, якщо семплер уже працює.
+    Потік самого семплера зі стеків виключено.
+    """
+    if not _SAMPLE_LOCK.acquire(blocking=False):
+        return None
+    try:
+        me = threading.get_ident()
+        stacks = Counter()
+        names = {}
+        n = 0
+        t0 = time.perf_counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            threads = {th.ident: th for th in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                label = names.get(ident)
+                if label is None or ident not in threads:
+                    label = names[ident] = _thread_label(threads.get(ident))
+                parts = []
+                f = frame; depth = 0
+                while f is not None and depth < max_depth:
+                    parts.append(_frame_label(f.f_code))
+                    f = f.f_back; depth += 1
+                parts.append(label)
+                stacks[";".join(reversed(parts))] += 1
+            n += 1
+            time.sleep(interval)
+        meta = {"samples": n, "seconds": round(time.perf_counter() - t0, 3),
+                "interval_ms": interval * 1000.0, "stacks": len(stacks)}
+        return stacks, meta
+    finally:
+        _SAMPLE_LOCK.release()
+
+def collapsed(stacks: Counter) -> str:
+    return "".join(f"{k} {v}\n" for k, v in stacks.most_common())
+
+class BackgroundSampler:
+    """start() одразу повертається; status()/result — опитування. on_done(meta) — після завершення."""
+    def __init__(self, on_done=None):
+        self.on_done = on_done
+        self.thread = None
+        self.started = None        # wall-час старту
+        self.seconds = None
+        self.result = None         # (stacks, meta) останнього завершеного семплування
+        self.error = None
+        self._lock = threading.Lock()
+
+    def running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, seconds: float, interval: float) -> bool:
+        with self._lock:
+            if self.running() or _SAMPLE_LOCK.locked():
+                return False
+            self.result = None; self.error = None
+            self.started = time.time(); self.seconds = seconds
+            self.thread = threading.Thread(target=self._run, args=(seconds, interval), name="profiler", daemon=True)
+            self.thread.start()
+            return True
+
+    def _run(self, seconds, interval):
+        try:
+            res = sample(seconds, interval)
+        except Exception as e:
+            self.error = str(e)
+            return
+        if res is None:
+            self.error = "profiler busy"
+            return
+        self.result = res
+        if self.on_done is not None:
+            try: self.on_done(res[1])
+            except Exception: pass
+
+    def status(self) -> dict:
+        return {"running": self.running(), "seconds": self.seconds,
+                "elapsed_sec": round(time.time() - self.started, 3) if self.started else None,
+                "error": self.error, "ready": self.result is not None}
+
+class _Loaded:
+    """Обгортка збережених stats для pstats.Stats (той вимагає create_stats())."""
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+class OneShotProfile:
+    """
+    arm(path) -> наступний запит із цим шляхом виконується під cProfile.
+    Гачки в bot.py перевіряють лише armed/active, тож без зарядженого профілю витрат немає.
+    """
+    def __init__(self):
+        self.armed = None          # шлях, що очікує профілювання
+        self.active = 0            # запитів під профілем просто зараз
+        self.result = None         # {"path", "at", "sec", "stats"(marshal-дамп)}
+        self._lock = threading.Lock()
+        self._tl = threading.local()
+
+    def arm(self, path: str):
+        with self._lock:
+            self.armed = path
+
+    def begin(self, path: str):
+        if self.armed is None or path != self.armed:
+            return
+        with self._lock:
+            if self.armed != path:
+                return
+            self.armed = None
+            self.active += 1
+        pr = cProfile.Profile()
+        self._tl.pr = (pr, time.perf_counter(), path)
+        pr.enable()
+
+    def end(self):
+        st = getattr(self._tl, "pr", None)
+        if st is None:
+            return
+        self._tl.pr = None
+        pr, t0, path = st
+        pr.disable()
+        with self._lock:
+            self.active -= 1
+        pr.create_stats()
+        self.result = {"path": path, "at": time.time(), "sec": round(time.perf_counter() - t0, 6),
+                       "stats": marshal.dumps(pr.stats)}
+
+    def text(self, sort="cumulative", limit=60) -> str:
+        r = self.result
+        if r is None:
+            return ""
+        buf = io.StringIO()
+        buf.write(f"# path={r['path']} wall_sec={r['sec']}\n")
+        pstats.Stats(_Loaded(marshal.loads(r["stats"])), stream=buf).sort_stats(sort).print_stats(limit)
+        return buf.getvalue()
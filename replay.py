@@ -0,0 +1,489 @@
+#!/usr/bin/env python3
+"""
+replay.py
+
+Проганяє записані сигнали (inside.csv) або синтетичний потік через справжній
+ланцюжок bot.webhook() -> place_orders_oneway проти підставної біржі (StandInExchange).
+
+Запуск:
+  python replay.py --csv logs/inside.csv --speed 1        # у реальному темпі
+  python replay.py --csv logs/inside.csv --speed 20       # у 20 разів швидше
+  python replay.py --csv logs/inside.csv --speed max --workers 8
+  python replay.py --synthetic 500 --symbols 20 --rate 50 --speed max
+
+Звіт: пропускна здатність, перцентилі end-to-end та по етапах,
+кількість REST-викликів на сигнал (загалом і по методах).
+"""
+
+import argparse
+import atexit
+import contextlib
+import csv
+import json
+import os
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+# ====== STAND-IN EXCHANGE ======
+class StandInExchange:
+    """
+    Підставний UMFutures: тримає позиції/ордери в пам'яті, MARKET виконується одразу,
+    LIMIT (GTC/GTX) — після fill_after_polls перевірок статусу, TP/SL лишаються NEW.
+    Кожен виклик рахується по методах і (опційно) затримується на latency_ms ± jitter_ms.
+    """
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, fill_after_polls=1, balance=10_000.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.fill_after_polls = max(0, fill_after_polls)
+        self.balance_usdt = balance
+        self.lock = threading.RLock()
+        self.calls = defaultdict(int)
+        self.prices = {}
+        self.positions = defaultdict(float)
+        self.orders = {}
+        self.trades = defaultdict(list)
+        self._next_id = 1_000_000
+
+    # ---- службове ----
+    def _call(self, name):
+        with self.lock:
+            self.calls[name] += 1
+        if self.latency_ms or self.jitter_ms:
+            d = self.latency_ms + (random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0)
+            if d > 0:
+                time.sleep(d / 1000.0)
+
+    def total_calls(self):
+        with self.lock:
+            return sum(self.calls.values())
+
+    def set_price(self, symbol, price):
+        with self.lock:
+            self.prices[symbol.upper()] = float(price)
+
+    def close_position(self, symbol):
+        """Імітує спрацювання виходу поза ботом: позиція = 0, виходи зняті."""
+        symbol = symbol.upper()
+        with self.lock:
+            self.positions[symbol] = 0.0
+            for od in self.orders.values():
+                if od["symbol"] == symbol and od["status"] == "NEW":
+                    od["status"] = "CANCELED"
+
+    def _fill(self, od, qty):
+        sign = 1.0 if od["side"] == "BUY" else -1.0
+        px = float(od.get("price") or self.prices.get(od["symbol"], 1.0))
+        od["executedQty"] = str(float(od["executedQty"]) + qty)
+        od["status"] = "FILLED" if float(od["executedQty"]) >= float(od["origQty"]) - 1e-12 else "PARTIALLY_FILLED"
+        self.positions[od["symbol"]] += sign * qty
+        tl = self.trades[od["symbol"]]
+        tl.append({"orderId": od["orderId"], "price": str(px), "qty": str(qty),
+                   "commission": str(px * qty * 0.0004), "commissionAsset": "USDT",
+                   "realizedPnl": "0"})
+        if len(tl) > 500:
+            del tl[:-500]
+
+    def _public(self, od):
+        return {k: v for k, v in od.items() if not k.startswith("_")}
+
+    # ---- market data / account ----
+    def exchange_info(self):
+        self._call("exchange_info")
+        with self.lock:
+            syms = list(self.prices)
+        return {"symbols": [{"symbol": s, "filters": [
+            {"filterType": "LOT_SIZE", "stepSize": "0.001", "minQty": "0.001"},
+            {"filterType": "PRICE_FILTER", "tickSize": "0.01"},
+            {"filterType": "MIN_NOTIONAL", "notional": "5"},
+        ]} for s in syms]}
+
+    def balance(self):
+        self._call("balance")
+        return [{"asset": "USDT", "availableBalance": str(self.balance_usdt)}]
+
+    def time(self):
+        self._call("time")
+        return {"serverTime": int(time.time() * 1000)}
+
+    def mark_price(self, symbol=None):
+        self._call("mark_price")
+        if symbol is None:
+            return [{"symbol": s, "markPrice": str(p)} for s, p in self.prices.items()]
+        return {"symbol": symbol, "markPrice": str(self.prices.get(symbol.upper(), 1.0))}
+
+    def book_ticker(self, symbol):
+        self._call("book_ticker")
+        p = self.prices.get(symbol.upper(), 1.0)
+        return {"symbol": symbol, "bidPrice": str(p * 0.9999), "askPrice": str(p * 1.0001)}
+
+    def get_position_mode(self):
+        self._call("get_position_mode")
+        return {"dualSidePosition": False}
+
+    def change_position_mode(self, **kw):
+        self._call("change_position_mode")
+        return {}
+
+    def change_leverage(self, symbol, leverage):
+        self._call("change_leverage")
+        return {"symbol": symbol, "leverage": leverage}
+
+    def position_risk(self, symbol=None):
+        self._call("position_risk")
+        with self.lock:
+            if symbol:
+                return [{"symbol": symbol.upper(), "positionAmt": str(self.positions[symbol.upper()])}]
+            return [{"symbol": s, "positionAmt": str(a)} for s, a in self.positions.items()]
+
+    def user_trades(self, symbol, **kw):
+        self._call("user_trades")
+        with self.lock:
+            return list(self.trades[symbol.upper()])
+
+    # ---- orders ----
+    def new_order(self, symbol, side, type, quantity=None, price=None, stopPrice=None,
+                  timeInForce=None, reduceOnly=None, closePosition=None, **kw):
+        self._call("new_order")
+        symbol = symbol.upper()
+        with self.lock:
+            cid = kw.get("newClientOrderId")
+            if cid and any(o.get("clientOrderId") == cid and o["status"] in ("NEW", "PARTIALLY_FILLED")
+                           for o in self.orders.values()):
+                raise RuntimeError("(-4116) ClientOrderId is duplicated.")
+            self._next_id += 1
+            oid = self._next_id
+            qty = float(quantity or 0.0)
+            if str(closePosition).lower() == "true":
+                qty = abs(self.positions[symbol])
+            if str(reduceOnly).lower() == "true":
+                qty = min(qty, abs(self.positions[symbol]))
+            od = {"orderId": oid, "symbol": symbol, "side": side, "type": type,
+                  "price": str(price or 0), "stopPrice": str(stopPrice or 0),
+                  "origQty": str(qty), "executedQty": "0", "status": "NEW",
+                  "timeInForce": timeInForce or "GTC",
+                  "reduceOnly": str(reduceOnly).lower() == "true",
+                  "closePosition": str(closePosition).lower() == "true",
+                  "_polls": 0}
+            for k in ("newClientOrderId",):
+                if k in kw:
+                    od["clientOrderId"] = kw[k]
+            self.orders[oid] = od
+            if type == "MARKET" or (type == "LIMIT" and timeInForce == "IOC"):
+                if qty > 0:
+                    self._fill(od, qty)
+                if od["status"] == "NEW":
+                    od["status"] = "EXPIRED" if type == "LIMIT" else "FILLED"
+            elif type == "LIMIT" and self.fill_after_polls == 0:
+                self._fill(od, qty)
+            return self._public(od)
+
+    def get_order(self, symbol, orderId=None, origClientOrderId=None):
+        self._call("get_order")
+        with self.lock:
+            if orderId is None:
+                # останній ордер із цим clientOrderId, як на біржі
+                od = next((o for o in reversed(list(self.orders.values()))
+                           if o["symbol"] == symbol.upper() and o.get("clientOrderId") == origClientOrderId), None)
+            else:
+                od = self.orders.get(int(orderId))
+            if od is None:
+                raise RuntimeError("(-2013) Order does not exist.")
+            if od["type"] == "LIMIT" and od["status"] in ("NEW", "PARTIALLY_FILLED"):
+                od["_polls"] += 1
+                if od["_polls"] >= self.fill_after_polls:
+                    self._fill(od, float(od["origQty"]) - float(od["executedQty"]))
+            return self._public(od)
+
+    query_order = get_order
+
+    def get_open_orders(self, symbol=None):
+        self._call("get_open_orders")
+        with self.lock:
+            return [self._public(od) for od in self.orders.values()
+                    if od["status"] in ("NEW", "PARTIALLY_FILLED") and (symbol is None or od["symbol"] == symbol.upper())]
+
+    def cancel_order(self, symbol, orderId):
+        self._call("cancel_order")
+        with self.lock:
+            od = self.orders.get(int(orderId))
+            if od is None or od["status"] not in ("NEW", "PARTIALLY_FILLED"):
+                raise RuntimeError("(-2011) Unknown order sent.")
+            od["status"] = "CANCELED"
+            return self._public(od)
+
+    def cancel_all_open_orders(self, symbol):
+        self._call("cancel_all_open_orders")
+        with self.lock:
+            for od in self.orders.values():
+                if od["symbol"] == symbol.upper() and od["status"] in ("NEW", "PARTIALLY_FILLED"):
+                    od["status"] = "CANCELED"
+        return {"code": 200}
+
+# ====== SIGNAL SOURCES ======
+def _parse_any_time(row):
+    for k in ("time_iso", "time_raw"):
+        v = row.get(k)
+        if not v:
+            continue
+        try:
+            f = float(v)
+            return f / 1000.0 if f > 10_000_000_000 else f
+        except ValueError:
+            pass
+        try:
+            s = v[:-1] + "+00:00" if v.endswith("Z") else v
+            return datetime.fromisoformat(s).timestamp()
+        except ValueError:
+            pass
+    return None
+
+def load_csv_signals(path):
+    """Рядки inside.csv -> [(offset_sec, payload)], відсортовані за часом сигналу."""
+    out = []
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            t = _parse_any_time(row)
+            if t is None:
+                continue
+            out.append((t, {"signal": "entry", "symbol": row.get("symbol", ""),
+                            "side": row.get("side", ""), "pattern": row.get("pattern", ""),
+                            "entry": row.get("entry", ""), "tp": row.get("tp", ""), "sl": row.get("sl", "")}))
+    out.sort(key=lambda x: x[0])
+    if not out:
+        return []
+    t0 = out[0][0]
+    return [(t - t0, p) for t, p in out]
+
+def synthetic_signals(n, symbols, rate, pattern, seed=0):
+    """Пуассонівський потік n сигналів із середньою частотою rate/с по symbols символах."""
+    rnd = random.Random(seed)
+    syms = [f"SYN{i:03d}USDT" for i in range(symbols)]
+    out, t = [], 0.0
+    for _ in range(n):
+        t += rnd.expovariate(rate) if rate > 0 else 0.0
+        sym = rnd.choice(syms)
+        side = rnd.choice(("long", "short"))
+        px = 100.0 + rnd.random() * 10.0
+        tp, sl = (px * 1.01, px * 0.99) if side == "long" else (px * 0.99, px * 1.01)
+        out.append((t, {"signal": "entry", "symbol": sym, "side": side, "pattern": pattern,
+                        "entry": f"{px:.2f}", "tp": f"{tp:.2f}", "sl": f"{sl:.2f}"}))
+    return out
+
+# ====== INSTRUMENTATION ======
+STAGES = ["normalize_signal", "_check_freshness", "_rate_limit_check", "signal_id", "dedup_seen",
+          "place_orders_oneway", "_close_position_reduce_only", "compute_qty", "_entry_market",
+          "_entry_limit", "_entry_maker_chase", "_place_exits", "_fetch_trades_for_order",
+          "exec_log", "techlog"]
+
+class StageTimer:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)
+
+    def wrap(self, mod, name):
+        fn = getattr(mod, name, None)
+        if fn is None:
+            return
+        samples = self.samples; lock = self.lock
+        def timed(*a, **kw):
+            t0 = time.perf_counter()
+            try:
+                return fn(*a, **kw)
+            finally:
+                dt = (time.perf_counter() - t0) * 1000.0
+                with lock:
+                    samples[name].append(dt)
+        setattr(mod, name, timed)
+
+def _pct(vals, p):
+    if not vals:
+        return None
+    s = sorted(vals)
+    k = min(len(s) - 1, max(0, int(round(p / 100.0 * (len(s) - 1)))))
+    return s[k]
+
+def _summary(vals):
+    return {"count": len(vals), "p50": _pct(vals, 50), "p90": _pct(vals, 90),
+            "p99": _pct(vals, 99), "max": max(vals) if vals else None}
+
+# ====== RUN ======
+def run(args):
+    log_dir = args.log_dir or tempfile.mkdtemp(prefix="replay_logs_")
+    if not args.log_dir:
+        atexit.register(shutil.rmtree, log_dir, True)
+    os.environ["LOG_DIR"] = log_dir
+    os.environ["TRADING_ENABLED"] = "false"
+    os.environ.setdefault("WEBHOOK_SECRET", "replay-secret")
+    if args.entry_mode:
+        os.environ["ENTRY_MODE"] = args.entry_mode
+
+    with open(os.devnull, "w") as null, contextlib.redirect_stdout(null):
+        import bot
+
+    if args.csv:
+        signals = load_csv_signals(args.csv)
+    else:
+        signals = synthetic_signals(args.synthetic, args.symbols, args.rate, bot.ALLOW_PATTERN, args.seed)
+    if args.limit:
+        signals = signals[:args.limit]
+    if not signals:
+        raise SystemExit("Немає сигналів для відтворення")
+
+    exchanges = [StandInExchange(latency_ms=args.rest_latency_ms, jitter_ms=args.rest_jitter_ms,
+                                 fill_after_polls=args.fill_after_polls) for _ in range(max(1, args.accounts))]
+    for ex in exchanges:
+        for _, p in signals:
+            ex.set_price(bot.tv_to_binance_symbol(p["symbol"]), float(p["entry"] or 1.0))
+    if len(exchanges) > 1:
+        # кожен акаунт — окрема підставна біржа; сигнал розсилається паралельно
+        for i, ex in enumerate(exchanges):
+            acct = bot.MAIN_ACCOUNT if i == 0 else bot.Account(f"acct{i}")
+            acct.client = bot._MeteredClient(ex)
+            bot.ACCOUNTS[acct.name] = acct
+        bot.BINANCE = bot._AccountClient()
+        bot.ACCOUNT_POOL = ThreadPoolExecutor(max_workers=len(exchanges), thread_name_prefix="acct")
+    else:
+        bot.BINANCE = bot._MeteredClient(exchanges[0])
+    bot.BINANCE_ENABLED = True
+    bot._init_journal()         # з TRADING_ENABLED=false журнал при імпорті не відкривається
+    bot.CHASE_INTERVAL_MS = args.chase_ms if args.chase_ms is not None else bot.CHASE_INTERVAL_MS
+    # профілі (і дефолтний) будуються з глобальних значень — перебудувати після перевизначень
+    bot.EXEC_PROFILES = bot.ExecProfileTable(json.loads(args.exec_profiles) if args.exec_profiles else bot.EXEC_PROFILES.specs)
+    if args.no_rate_limit:
+        bot.MAX_WEBHOOKS_PER_MIN = 0
+        bot.MIN_SEC_BETWEEN_TRADES_PER_SYMBOL = 0
+
+    timer = StageTimer()
+    for name in STAGES:
+        timer.wrap(bot, name)
+
+    client = bot.app.test_client()
+    speed = None if args.speed == "max" else float(args.speed)
+    e2e, lag, statuses = [], [], defaultdict(int)
+    res_lock = threading.Lock()
+
+    def fire(sched_offset, payload, t_start):
+        if speed:
+            due = t_start + sched_offset / speed
+            d = due - time.perf_counter()
+            if d > 0:
+                time.sleep(d)
+        sym = bot.tv_to_binance_symbol(payload["symbol"])
+        body = dict(payload, time=str(int(time.time() * 1000)))
+        raw = json.dumps(body).encode()
+        t0 = time.perf_counter()
+        r = client.post("/webhook", data=raw, content_type="application/json",
+                        headers={"X-Signature": bot.calc_sig(raw)})
+        dt = (time.perf_counter() - t0) * 1000.0
+        try:
+            msg = (r.get_json(silent=True) or {}).get("msg", "")
+        except Exception:
+            msg = ""
+        if not args.hold:
+            for ex in exchanges:
+                ex.close_position(sym)
+        with res_lock:
+            e2e.append(dt)
+            if speed:
+                lag.append(max(0.0, (t0 - (t_start + sched_offset / speed)) * 1000.0))
+            statuses[f"{r.status_code}:{re.sub(r'[0-9.]+', 'N', msg)}"] += 1
+
+    calls_before = sum(ex.total_calls() for ex in exchanges)
+    with open(os.devnull, "w") as null, contextlib.redirect_stdout(null):
+        t_start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+            futs = [pool.submit(fire, off, p, t_start) for off, p in signals]
+            for f in futs:
+                f.result()
+        wall = time.perf_counter() - t_start
+
+    n = len(signals)
+    accepted = sum(v for k, v in statuses.items() if k.startswith("200:logged"))
+    rest_total = sum(ex.total_calls() for ex in exchanges) - calls_before
+    by_method = defaultdict(int)
+    for ex in exchanges:
+        for m, c in ex.calls.items():
+            by_method[m] += c
+    report = {
+        "signals": n,
+        "accepted": accepted,
+        "wall_sec": wall,
+        "throughput_sps": n / wall if wall > 0 else None,
+        "speed": args.speed,
+        "workers": args.workers,
+        "entry_mode": bot.ENTRY_MODE,
+        "rest_latency_ms": args.rest_latency_ms,
+        "e2e_ms": _summary(e2e),
+        "schedule_lag_ms": _summary(lag) if lag else None,
+        "stages_ms": {k: _summary(v) for k, v in timer.samples.items()},
+        "rest_calls_total": rest_total,
+        "rest_calls_per_signal": rest_total / n,
+        "rest_calls_per_accepted": (rest_total / accepted) if accepted else None,
+        "rest_calls_by_method": dict(sorted(by_method.items())),
+        "accounts": len(exchanges),
+        "outcomes": dict(statuses),
+    }
+    return report
+
+def _print_report(rep):
+    print(f"signals={rep['signals']} accepted={rep['accepted']} wall={rep['wall_sec']:.3f}s "
+          f"throughput={rep['throughput_sps']:.1f}/s entry_mode={rep['entry_mode']}")
+    e = rep["e2e_ms"]
+    print(f"e2e ms: p50={e['p50']:.2f} p90={e['p90']:.2f} p99={e['p99']:.2f} max={e['max']:.2f}")
+    if rep["schedule_lag_ms"]:
+        l = rep["schedule_lag_ms"]
+        print(f"schedule lag ms: p50={l['p50']:.2f} p99={l['p99']:.2f} max={l['max']:.2f}")
+    print(f"{'stage':32s} {'count':>7s} {'p50':>9s} {'p90':>9s} {'p99':>9s} {'max':>9s}")
+    for k, s in sorted(rep["stages_ms"].items(), key=lambda kv: -(kv[1]["p50"] or 0)):
+        print(f"{k:32s} {s['count']:7d} {s['p50']:9.3f} {s['p90']:9.3f} {s['p99']:9.3f} {s['max']:9.3f}")
+    pa = rep["rest_calls_per_accepted"]
+    print(f"REST calls: total={rep['rest_calls_total']} per_signal={rep['rest_calls_per_signal']:.2f}"
+          + (f" per_accepted={pa:.2f}" if pa is not None else ""))
+    for m, c in rep["rest_calls_by_method"].items():
+        print(f"  {m:28s} {c}")
+    print("outcomes:")
+    for k, c in sorted(rep["outcomes"].items(), key=lambda kv: -kv[1]):
+        print(f"  {k:40s} {c}")
+
+def main():
+    ap = argparse.ArgumentParser()
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--csv", help="Файл сигналів бота (inside.csv)")
+    src.add_argument("--synthetic", type=int, help="Згенерувати N синтетичних сигналів")
+    ap.add_argument("--symbols", type=int, default=10, help="Кількість символів для --synthetic")
+    ap.add_argument("--rate", type=float, default=5.0, help="Середня частота синтетичних сигналів, 1/с")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--limit", type=int, default=0, help="Відтворити лише перші N сигналів")
+    ap.add_argument("--speed", default="max", help="1 | N (прискорення) | max")
+    ap.add_argument("--workers", type=int, default=4, help="Паралельні запити до webhook")
+    ap.add_argument("--entry-mode", default=None, choices=["market", "limit", "maker_chase"])
+    ap.add_argument("--chase-ms", type=int, default=None, help="Перевизначити CHASE_INTERVAL_MS")
+    ap.add_argument("--exec-profiles", default=None, help='JSON профілів виконання, напр. \'[{"match":"SYN00*","entry_mode":"market"}]\'')
+    ap.add_argument("--rest-latency-ms", type=float, default=0.0, help="Затримка кожного REST-виклику")
+    ap.add_argument("--rest-jitter-ms", type=float, default=0.0)
+    ap.add_argument("--fill-after-polls", type=int, default=1, help="Після скількох get_order LIMIT виконується")
+    ap.add_argument("--accounts", type=int, default=1, help="Кількість акаунтів для fan-out (кожен — своя біржа)")
+    ap.add_argument("--no-rate-limit", action="store_true", help="Вимкнути анти-флуд бота")
+    ap.add_argument("--hold", action="store_true", help="Не закривати позицію після сигналу")
+    ap.add_argument("--log-dir", default=None, help="Куди писати логи бота (за замовчуванням — тимчасова тека)")
+    ap.add_argument("--json", default=None, help="Зберегти звіт у JSON")
+    args = ap.parse_args()
+    if args.speed != "max":
+        float(args.speed)
+
+    rep = run(args)
+    _print_report(rep)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rep, f, indent=2)
+        print(f"Saved: {args.json}")
+
+if __name__ == "__main__":
+    main()
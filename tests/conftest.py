@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# bot читає ENV при імпорті: логи — у тимчасову теку, без торгівлі
+os.environ.setdefault("LOG_DIR", tempfile.mkdtemp(prefix="bot_tests_"))
+os.environ["TRADING_ENABLED"] = "false"
+os.environ.setdefault("WEBHOOK_SECRET", "test-secret")
@@ -0,0 +1,52 @@
+import threading
+import time
+
+import bot
+
+
+def _sig(sid, symbol="BTCUSDT", side="long"):
+    return bot.Signal(symbol + ".P", symbol, side, "inside", 100.0, 101.0, 99.0, "", 0.0, "", id=sid)
+
+
+def test_newer_signal_supersedes_waiting_one():
+    c = bot.SignalCoalescer(300)
+    ran, bodies, res = [], {}, {}
+
+    def go(sid, side):
+        bodies[sid] = {}
+        res[sid] = c.run(_sig(sid, side=side), bodies[sid], lambda: ran.append(sid))
+
+    a = threading.Thread(target=go, args=("A", "long")); a.start()
+    time.sleep(0.05)
+    b = threading.Thread(target=go, args=("B", "short")); b.start()
+    a.join(2); b.join(2)
+    assert ran == ["B"]
+    assert res == {"A": False, "B": True}
+    assert bodies["A"]["msg"] == "superseded" and bodies["A"]["superseded_by"] == "B"
+    assert c.pending() == 0
+
+
+def test_other_symbols_are_independent():
+    c = bot.SignalCoalescer(100)
+    ran = []
+    ts = [threading.Thread(target=c.run, args=(_sig(s, symbol=s), {}, lambda s=s: ran.append(s)))
+          for s in ("BTCUSDT", "ETHUSDT")]
+    for t in ts: t.start()
+    for t in ts: t.join(2)
+    assert sorted(ran) == ["BTCUSDT", "ETHUSDT"]
+
+
+def test_signal_waits_for_running_execution_of_same_symbol():
+    c = bot.SignalCoalescer(10)
+    release, order = threading.Event(), []
+
+    def slow():
+        order.append("A-start"); release.wait(2); order.append("A-end")
+
+    a = threading.Thread(target=c.run, args=(_sig("A"), {}, slow)); a.start()
+    time.sleep(0.05)
+    b = threading.Thread(target=c.run, args=(_sig("B"), {}, lambda: order.append("B"))); b.start()
+    time.sleep(0.1)
+    assert order == ["A-start"]
+    release.set(); a.join(2); b.join(2)
+    assert order == ["A-start", "A-end", "B"]
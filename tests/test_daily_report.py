@@ -0,0 +1,75 @@
+import pandas as pd
+import pytest
+
+import daily_report as DR
+
+HEADER = "signal_id,event,time,price,qty,commission,commission_asset,realized_pnl,symbol,side,order_id\n"
+DAY = "2024-05-10"
+
+
+@pytest.fixture
+def logs(tmp_path):
+    (tmp_path / "inside.csv").write_text(
+        "time_raw,time_iso,symbol,pattern,side,entry,tp,sl,id\n"
+        "0,2024-05-10T10:00:00Z,BTCUSDT,inside,long,100,110,90,S1\n"
+        "0,2024-05-10T10:05:00Z,ETHUSDT,inside,short,50,45,55,S2\n"
+        "0,2024-05-10T10:10:00Z,XRPUSDT,inside,long,1,2,0.5,S3\n",
+        encoding="utf-8")
+    # події — як їх пише bot.exec_log
+    (tmp_path / "executions.csv").write_text(
+        HEADER +
+        "S1,OPEN_MARKET,2024-05-10T10:00:01Z,100,1,0.1,USDT,,BTCUSDT,long,1\n"
+        "S1,CLOSE_TP,2024-05-10T11:00:00Z,110,1,0.1,USDT,10,BTCUSDT,long,2\n"
+        "S2,OPEN_MAKER_CHASE,2024-05-10T10:05:02Z,50,2,0.05,USDT,,ETHUSDT,short,3\n"
+        "S2,CLOSE_SL,2024-05-10T10:30:00Z,55,2,0.05,USDT,-10,ETHUSDT,short,4\n"
+        "S3,OPEN_FALLBACK_MARKET,2024-05-10T10:10:01Z,1,10,0.01,USDT,,XRPUSDT,long,5\n",
+        encoding="utf-8")
+    acct = tmp_path / "accounts" / "b"
+    acct.mkdir(parents=True)
+    (acct / "executions.csv").write_text(
+        HEADER +
+        "S1,OPEN_LIMIT,2024-05-10T10:00:02Z,101,2,0.2,USDT,,BTCUSDT,long,7\n"
+        "S1,CLOSE_MANUAL,2024-05-10T12:00:00Z,99,2,0.2,USDT,-4,BTCUSDT,long,8\n",
+        encoding="utf-8")
+    return tmp_path
+
+
+def _load(logs):
+    signals = DR.load_signals(str(logs / "inside.csv"))
+    execs = DR.load_execs([f"main={logs / 'executions.csv'}", f"b={logs / 'accounts' / 'b' / 'executions.csv'}"])
+    return signals, execs
+
+
+def test_build_daily_matches_bot_event_names(logs):
+    daily = DR.build_daily(*_load(logs), DAY)
+    got = {(r.signal_id, r.account): (r.executed_entry_price, r.executed_close_price, r.pnl)
+           for r in daily.itertuples(index=False)}
+    assert got == {("S1", "main"): (100.0, 110.0, 10.0),
+                   ("S1", "b"): (101.0, 99.0, -4.0),
+                   ("S2", "main"): (50.0, 55.0, -10.0)}
+
+
+def test_day_aggregate_counts_open_trades_and_is_not_final(logs):
+    signals, execs = _load(logs)
+    agg = DR.build_day_aggregate(signals, execs, DAY, now=pd.Timestamp("2024-05-12", tz=DR.KYIV))
+    assert agg["trades"] == 3
+    assert agg["open"] == 1          # S3 без CLOSE_*
+    assert agg["pnl"] == pytest.approx(-4.0)
+    assert agg["final"] is False
+    late = DR.build_day_aggregate(signals, execs, DAY, now=pd.Timestamp("2024-05-20", tz=DR.KYIV))
+    assert late["final"] is True
+
+
+def test_build_range_rebuilds_stale_cached_aggregate(logs, tmp_path):
+    cache = tmp_path / "agg"
+    DR.save_day_aggregate(str(cache), {"v": DR.AGG_VERSION - 1, "day": DAY, "final": True, "trades": 0})
+    rep = DR.build_range(DAY, DAY, "day", str(logs / "inside.csv"), [f"main={logs / 'executions.csv'}"],
+                         str(cache), final_after_days=0)
+    assert rep["days_built"] == 1
+    assert rep["total"]["trades"] == 2
+    assert DR.load_day_aggregate(str(cache), DAY)["v"] == DR.AGG_VERSION
+
+
+def test_exec_sources():
+    assert DR.exec_sources("logs/executions.csv") == [("main", "logs/executions.csv")]
+    assert DR.exec_sources(["a=x.csv", "y.csv"]) == [("a", "x.csv"), ("main", "y.csv")]
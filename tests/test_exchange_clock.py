@@ -0,0 +1,42 @@
+import time
+
+import pytest
+
+import bot
+
+
+class FakeExchange:
+    def __init__(self, skew_ms, fail=False):
+        self.skew_ms = skew_ms; self.fail = fail; self.calls = 0
+
+    def time(self):
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError("down")
+        return {"serverTime": int(time.time() * 1000 + self.skew_ms)}
+
+
+def test_sync_tracks_exchange_offset():
+    clock = bot.ExchangeClock()
+    assert clock.sync(FakeExchange(5000), reason="startup")
+    assert clock.offset_ms == pytest.approx(5000, abs=50)
+    assert clock.now_ms() - time.time() * 1000 == pytest.approx(5000, abs=50)
+    assert clock.now() - time.time() == pytest.approx(5.0, abs=0.05)
+    assert clock.status()["syncs"] == 1
+
+
+def test_failed_sync_keeps_previous_offset():
+    clock = bot.ExchangeClock()
+    clock.sync(FakeExchange(-2000), reason="startup")
+    assert not clock.sync(FakeExchange(0, fail=True), reason="periodic")
+    assert clock.offset_ms == pytest.approx(-2000, abs=50)
+    assert clock.fails == 1
+
+
+def test_min_gap_coalesces_resyncs():
+    clock = bot.ExchangeClock()
+    ex = FakeExchange(1000)
+    assert clock.sync(ex, reason="recv_window", min_gap=60)
+    calls = ex.calls
+    assert clock.sync(ex, reason="recv_window", min_gap=60)
+    assert ex.calls == calls
@@ -0,0 +1,38 @@
+import pytest
+
+import bot
+
+
+def test_exact_symbol_beats_later_glob_and_first_glob_wins():
+    t = bot.ExecProfileTable([
+        {"name": "btc", "match": "BTCUSDT", "entry_mode": "maker_chase", "chase_steps": "3"},
+        {"name": "majors", "match": ["*USDT"], "entry_mode": "limit"},
+        {"name": "eth", "match": "ETHUSDT", "entry_mode": "market"},
+    ])
+    assert t.get("BTCUSDT").name == "btc"
+    assert t.get("BTCUSDT").chase_steps == 3
+    # glob описаний раніше за точний ETHUSDT — перший збіг у порядку специфікації
+    assert t.get("ETHUSDT").name == "majors"
+    assert t.get("SOLUSDC") is t.default
+
+
+def test_match_is_split_and_upper_cased():
+    [(pats, prof)] = bot._parse_exec_profiles([{"match": " btc*, eth* ", "post_only": "true"}])
+    assert pats == ["BTC*", "ETH*"]
+    assert prof.post_only is True
+    assert prof.entry_mode == bot.ENTRY_MODE
+
+
+@pytest.mark.parametrize("specs", [
+    {"match": "X"},
+    [{"entry_mode": "limit"}],
+    [{"match": [1]}],
+    [{"match": 5}],
+    [{"match": "X", "nope": 1}],
+    [{"match": "X", "chase_ms": "soon"}],
+    [{"match": "X", "entry_mode": "twap"}],
+    [{"match": "X", "fallback": "cancel"}],
+])
+def test_invalid_specs_raise_value_error(specs):
+    with pytest.raises(ValueError):
+        bot.ExecProfileTable(specs)
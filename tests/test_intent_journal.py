@@ -0,0 +1,51 @@
+import json
+
+import bot
+
+
+def _write(path, recs, tail=""):
+    path.write_text("".join(json.dumps(r) + "\n" for r in recs) + tail, encoding="utf-8")
+
+
+def test_load_keeps_last_record_per_account_and_symbol(tmp_path):
+    p = tmp_path / "journal.jsonl"
+    _write(p, [
+        {"a": "main", "s": "BTCUSDT", "e": "accepted", "id": "S1"},
+        {"a": "main", "s": "BTCUSDT", "e": "exits_acked", "id": "S1", "tp_id": 7},
+        {"a": "main", "s": "ETHUSDT", "e": "accepted", "id": "S2"},
+        {"a": "main", "s": "ETHUSDT", "e": "closed", "id": "S2"},
+        {"s": "XRPUSDT", "e": "entry_sent", "id": "S3"},
+        {"a": "b", "s": "BTCUSDT", "e": "entry_acked", "id": "S1"},
+    ], tail='{"a":"main","s":"SOLUSDT","e":"acc')   # обірваний хвіст після краху
+    j = bot.IntentJournal(str(p), fsync=False)
+    assert j.load() == 6
+    assert j.existed
+    live = j.live("main")
+    assert set(live) == {"BTCUSDT", "XRPUSDT"}
+    assert live["BTCUSDT"]["tp_id"] == 7
+    assert set(j.live("b")) == {"BTCUSDT"}
+    assert not j.is_live("main", "ETHUSDT")
+    assert j.live_count() == 3
+
+
+def test_start_compacts_and_appends_replay_after_restart(tmp_path):
+    p = tmp_path / "journal.jsonl"
+    _write(p, [
+        {"a": "main", "s": "BTCUSDT", "e": "accepted", "id": "S1"},
+        {"a": "main", "s": "ETHUSDT", "e": "closed", "id": "S2"},
+    ])
+    j = bot.IntentJournal(str(p), fsync=False)
+    j.load()
+    assert j.acquire(1.0)
+    j.start()
+    assert [json.loads(x)["s"] for x in p.read_text().splitlines()] == ["BTCUSDT"]
+    j.append({"a": "main", "s": "BTCUSDT", "e": "closed", "id": "S1"})
+    j.append({"a": "main", "s": "SOLUSDT", "e": "entry_sent", "id": "S4"}, sync=True)
+    j.seal()
+
+    again = bot.IntentJournal(str(p), fsync=False)
+    again.load()
+    assert set(again.live("main")) == {"SOLUSDT"}
+    # після seal lock вільний — наступник його бере
+    assert again.acquire(0.5)
+    again.seal()
@@ -0,0 +1,40 @@
+import pytest
+
+import bot
+
+W = 60.0
+
+
+def test_estimate_weights_previous_window():
+    w = bot._SlidingWindow(0.0, W)
+    w.cur = 30
+    assert w.estimate(59.0, W) == 30
+    # нове вікно: 30 з попереднього, з вагою 1 - 15/60
+    assert w.estimate(75.0, W) == pytest.approx(30 * 0.75)
+    assert w.prev == 30 and w.cur == 0
+
+
+def test_estimate_drops_history_after_two_windows():
+    w = bot._SlidingWindow(0.0, W)
+    w.cur = 30
+    assert w.estimate(125.0, W) == 0
+    assert w.start == 120.0
+
+
+def test_retry_after_until_one_more_fits():
+    w = bot._SlidingWindow(0.0, W)
+    w.cur = 10
+    now = 60.0 + 30.0               # prev=10 з вагою 0.5 -> 5
+    assert w.estimate(now, W) == pytest.approx(5.0)
+    w.cur = 5                       # estimate 10 при ліміті 10
+    t = w.retry_after(now, W, 10)
+    assert t == pytest.approx(6.0)
+    assert w.estimate(now + t, W) + 1 <= 10 + 1e-9
+
+
+def test_rate_limiter_per_ip():
+    rl = bot.RateLimiter(100)
+    assert all(rl.check_ip(0.0, "1.2.3.4", 3)[0] for _ in range(3))
+    ok, detail, retry = rl.check_ip(1.0, "1.2.3.4", 3)
+    assert not ok and "ip rate limit" in detail and retry > 0
+    assert rl.check_ip(1.0, "5.6.7.8", 3)[0]